@@ -7,6 +7,7 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import CallbackQuery, Message
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from app.bot.notifications import NotificationDispatcher
 
 
 LEXICON: dict[str, str] = {
@@ -48,6 +49,11 @@ config = load_config()
 storage = MemoryStorage()
 bot = Bot(token=config.tg_bot.token)
 dp = Dispatcher(storage=storage)
+# Уведомления исполнителям уходят через очередь с ограничением скорости (без БД)
+notifier = NotificationDispatcher(bot, None)
+dp.startup.register(notifier.start)
+dp.shutdown.register(notifier.stop)
+dp['notifier'] = notifier
 
 
 # Создаем "базу данных" пользователей
@@ -195,7 +201,9 @@ async def process_save_task_text(message: Message, state: FSMContext):
 
 # функция для назначения ответственного за задачу
 @dp.callback_query(StateFilter(FSM.create_task_person))  # , F.data.as_('nick'))
-async def process_save_task_person(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def process_save_task_person(
+    callback: CallbackQuery, state: FSMContext, notifier: NotificationDispatcher
+):
     # Cохраняем введенное имя в хранилище по ключу "name"
     task_person = callback.data
     await state.update_data(task_person=task_person)
@@ -208,7 +216,7 @@ async def process_save_task_person(callback: CallbackQuery, state: FSMContext, b
     else:
         name_ex = temp_executors[data["task_person"]]
         # высылаем уведомление пользователю о задаче
-        await bot.send_message(
+        await notifier.notify(
             chat_id=task_person,
             text=f'<b>Вам назначена новая задача</b>:\n<i>{data["task_text"]}</i>',
             parse_mode='HTML'
@@ -1,87 +1,367 @@
+import asyncio
 import logging
+from contextlib import suppress
+from datetime import timedelta
+from functools import partial
 
 import psycopg_pool
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.redis import RedisStorage
+from app.bot.executor import ShardedUpdateExecutor
 from app.bot.handlers.admin import admin_router
 from app.bot.handlers.others import others_router
 from app.bot.handlers.settings import settings_router
+from app.bot.handlers.tasks import tasks_router
 from app.bot.handlers.user import user_router
-from app.bot.i18n.translator import get_translations
+from app.bot.keyboards.memo import KeyboardCache
+from app.bot.menus import ChatMenus
 from app.bot.middlewares.database import DataBaseMiddleware
+from app.bot.middlewares.fsm_session import FSMSessionMiddleware
 from app.bot.middlewares.i18n import TranslatorMiddleware
 from app.bot.middlewares.lang_settings import LangSettingsMiddleware
+from app.bot.middlewares.metrics import install_metrics
+from app.bot.middlewares.query_budget import QueryBudgetMiddleware
 from app.bot.middlewares.shadow_ban import ShadowBanMiddleware
 from app.bot.middlewares.statistics import ActivityCounterMiddleware
-from app.infrastructure.database.connection import get_pg_pool
-from config.config import Config
+from app.bot.middlewares.user_context import UserContextMiddleware
+from app.bot.notifications import NotificationDispatcher
+from app.bot.reminders import TaskReminder
+from app.bot.warmup import WarmUp
+from app.bot.webhook import run_webhook
+from app.i18n.translator import get_translations
+from app.infrastructure.cache.active_users import DailyActiveUsers
+from app.infrastructure.cache.fsm import BufferedRedisStorage
+from app.infrastructure.cache.profiles import user_profile_cache
+from app.infrastructure.cache.user_registry import user_registry
+from app.infrastructure.database.activity import ActivityBuffer
+from app.infrastructure.database.connection import (
+    collect_pool_metrics,
+    get_pg_pool,
+    report_pool_stats,
+)
+from app.infrastructure.database.partitions import PartitionMaintainer
+from app.infrastructure.database.queries import query_registry
+from app.infrastructure.database.scheduler import TaskMaterializer
+from app.infrastructure.health import Readiness
+from app.infrastructure.metrics import MetricsServer, metrics
+from config_data.config import Config
 from redis.asyncio import Redis
 
 logger = logging.getLogger(__name__)
 
 
+def build_dispatcher(
+    config: Config,
+    *,
+    storage: BufferedRedisStorage,
+    redis: Redis,
+    db_pool: psycopg_pool.AsyncConnectionPool,
+    activity_buffer: ActivityBuffer,
+    active_users: DailyActiveUsers,
+) -> Dispatcher:
+    '''
+    Функция сборки диспетчера: роутеры, middleware и данные, доступные хэндлерам.
+    Используется `main()` и бенчмарком пропускной способности. Роутеры - объекты
+    уровня модуля, поэтому в одном процессе диспетчер собирается один раз
+    '''
+    dp = Dispatcher(storage=storage)
+
+    # Получаем словарь с переводами
+    translations = get_translations()
+    # формируем список локалей из ключей словаря с переводами
+    locales = list(translations.keys())
+    # Клавиатуры и меню команд зависят только от локали и роли - собираем их один раз
+    keyboards = KeyboardCache(translations)
+    logger.info("Keyboard cache built: %d entries", len(keyboards))
+    # Меню команд отправляется в чат, только если отличается от уже установленного
+    menus = ChatMenus(keyboards, redis=redis, ttl=config.cache.menu_fingerprint_ttl)
+
+    # Подключаем роутеры в нужном порядке
+    logger.info("Including routers...")
+    dp.include_routers(settings_router, admin_router, user_router, tasks_router, others_router)
+
+    # Подключаем миддлвари в нужном порядке
+    logger.info("Including middlewares...")
+    dp.update.middleware(ShadowBanMiddleware(user_registry))
+    dp.update.middleware(DataBaseMiddleware())
+    dp.update.middleware(UserContextMiddleware())
+    dp.update.middleware(ActivityCounterMiddleware(activity_buffer))
+    dp.update.middleware(LangSettingsMiddleware())
+    dp.update.middleware(TranslatorMiddleware())
+    FSMSessionMiddleware(storage).install(dp)
+    # Предупреждение о числе запросов за апдейт сверх бюджета (ловит N+1 в хэндлерах)
+    if config.db.query_budget > 0:
+        QueryBudgetMiddleware(query_registry, budget=config.db.query_budget).install(dp)
+
+    # Данные, доступные в хэндлерах и middleware при любом способе получения апдейтов
+    dp.workflow_data.update(
+        db_pool=db_pool,
+        translations=translations,
+        locales=locales,
+        keyboards=keyboards,
+        menus=menus,
+        active_users=active_users,
+        admin_ids=config.bot.admin_ids,
+    )
+    return dp
+
+
 async def main(config: Config) -> None:
     '''
     Функция конфигурирования и запуска бота
     '''
     logger.info("Starting bot...")
-    # Инициализируем хранилище
-    storage = RedisStorage(
-        redis=Redis(
-            host=config.redis.host,
-            port=config.redis.port,
-            db=config.redis.db,
-            password=config.redis.password,
-            username=config.redis.username,
-        )
+    # Готовность поднимается только после прогрева и запуска приема апдейтов
+    readiness = Readiness()
+    # Инициализируем клиент Redis и хранилище
+    redis = Redis(
+        host=config.redis.host,
+        port=config.redis.port,
+        db=config.redis.db,
+        password=config.redis.password,
+        username=config.redis.username,
+    )
+    # Чтения FSM за апдейт объединяются в один запрос, записи - в одну транзакцию
+    storage = BufferedRedisStorage(
+        redis,
+        state_ttl=config.fsm.state_ttl,
+        data_ttl=config.fsm.data_ttl,
+        serializer=config.fsm.serializer,
+    )
+
+    # Настраиваем кэш профилей пользователей и подписку на инвалидации от других процессов
+    user_profile_cache.configure(
+        maxsize=config.cache.user_profile_maxsize,
+        ttl=config.cache.user_profile_ttl,
+        redis=redis,
     )
+    cache_listener = asyncio.create_task(user_profile_cache.listen())
+    # Реестр пользователей и банов в Redis: по нему апдейты отсеиваются без обращения к БД
+    user_registry.configure(redis=redis)
 
-    # Инициализируем бот и диспетчер
+    # Инициализируем бот
+    # Свой Bot API сервер (например, локальный фейковый для тестов) задается через BOT_API_URL
+    session = None
+    if config.bot.api_url:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.bot.api_url))
     bot = Bot(
         token=config.bot.token,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    dp = Dispatcher(storage=storage)
 
     # Создаём пул соединений с Postgres
     db_pool: psycopg_pool.AsyncConnectionPool = await get_pg_pool(
         db_name=config.db.name,
         host=config.db.host,
         port=config.db.port,
-        user=config.db.user,
+        user=config.db.username,
         password=config.db.password,
+        min_size=config.db.pool_min_size,
+        max_size=config.db.pool_max_size,
+        timeout=config.db.pool_timeout,
+        max_idle=config.db.pool_max_idle,
+        max_lifetime=config.db.pool_max_lifetime,
+        max_waiting=config.db.pool_max_waiting,
+        reconnect_timeout=config.db.pool_reconnect_timeout,
+        open_attempts=config.db.pool_open_attempts,
+        open_backoff=config.db.pool_open_backoff,
+        # Каждое новое соединение пула заранее подготавливает горячие запросы `db.py`
+        configure=query_registry.prepare,
+    )
+    # Медленные запросы логируются с формой параметров и, в фоне, планом EXPLAIN
+    query_registry.configure(
+        slow_threshold=config.db.slow_query_threshold,
+        explain_pool=db_pool if config.db.slow_query_explain else None,
+        explain_interval=config.db.slow_query_explain_interval,
     )
+    # Заполняем реестр одним запросом, если его еще не собрал другой процесс
+    async with db_pool.connection() as connection:
+        await user_registry.build(connection)
 
-    # Получаем словарь с переводами
-    translations = get_translations()
-    # формируем список локалей из ключей словаря с переводами
-    locales = list(translations.keys())
+    pool_reporter: asyncio.Task | None = None
+    if config.db.pool_stats_interval > 0:
+        pool_reporter = asyncio.create_task(
+            report_pool_stats(db_pool, interval=config.db.pool_stats_interval)
+        )
 
-    # Подключаем роутеры в нужном порядке
-    logger.info("Including routers...")
-    dp.include_routers(settings_router, admin_router, user_router, others_router)
+    # Буфер счетчиков активности пишет в БД пачками в фоне
+    active_users = DailyActiveUsers(
+        redis, retention_days=config.statistics.active_users_retention_days
+    )
+    activity_buffer = ActivityBuffer(
+        db_pool,
+        flush_interval=config.statistics.flush_interval,
+        max_batch_size=config.statistics.max_batch_size,
+        active_users=active_users,
+    )
+    activity_flusher = asyncio.create_task(activity_buffer.run())
 
-    # Подключаем миддлвари в нужном порядке
-    logger.info("Including middlewares...")
-    dp.update.middleware(DataBaseMiddleware())
-    dp.update.middleware(ShadowBanMiddleware())
-    dp.update.middleware(ActivityCounterMiddleware())
-    dp.update.middleware(LangSettingsMiddleware())
-    dp.update.middleware(TranslatorMiddleware())
+    # Повторяющиеся задачи разворачиваются в `task_process` на горизонт вперед
+    task_scheduler: asyncio.Task | None = None
+    partition_maintainer: asyncio.Task | None = None
+    if config.scheduler.enabled:
+        # Секции `task_process` должны существовать до того, как в них начнут писать:
+        # первый проход выполняется до запуска материализатора, следующие - в фоне
+        maintainer = PartitionMaintainer(
+            db_pool,
+            months_ahead=config.scheduler.partitions_ahead,
+            retention_months=config.scheduler.retention_months,
+            archive_dir=config.scheduler.archive_dir,
+            interval=config.scheduler.maintenance_interval,
+        )
+        await maintainer.maintain()
+        partition_maintainer = asyncio.create_task(maintainer.run(delay=maintainer.interval))
+        task_materializer = TaskMaterializer(
+            db_pool,
+            horizon=timedelta(days=config.scheduler.horizon_days),
+            interval=config.scheduler.interval,
+            batch_size=config.scheduler.batch_size,
+            max_occurrences=config.scheduler.max_occurrences,
+            status_key=config.scheduler.status_key,
+        )
+        task_scheduler = asyncio.create_task(task_materializer.run())
 
-    # Запускаем поллинг
-    try:
-        await dp.start_polling(
-            bot, db_pool=db_pool,
-            translations=translations,
-            locales=locales,
-            admin_ids=config.bot.admin_ids
+    dp = build_dispatcher(
+        config,
+        storage=storage,
+        redis=redis,
+        db_pool=db_pool,
+        activity_buffer=activity_buffer,
+        active_users=active_users,
+    )
+
+    # Гистограммы задержек по слоям; ставятся до исполнителя, чтобы время апдейта
+    # считалось в воркере, а не до постановки в очередь
+    metrics_server: MetricsServer | None = None
+    if config.metrics.enabled:
+        metrics.configure(enabled=True)
+        install_metrics(dp, bot)
+        metrics.add_collector(partial(collect_pool_metrics, db_pool))
+        metrics_server = MetricsServer(
+            metrics,
+            host=config.metrics.host,
+            port=config.metrics.port,
+            path=config.metrics.path,
+            readiness=readiness,
+            ready_path=config.metrics.ready_path,
+        )
+        await metrics_server.start()
+
+    # Апдейты одного чата обрабатываются по порядку, разных чатов - параллельно
+    executor = ShardedUpdateExecutor(
+        shards=config.executor.shards,
+        queue_size=config.executor.queue_size,
+        shutdown_timeout=config.executor.shutdown_timeout,
+    )
+    executor.install(dp)
+    executor_reporter: asyncio.Task | None = None
+    if config.executor.stats_interval > 0:
+        executor_reporter = asyncio.create_task(
+            executor.report(interval=config.executor.stats_interval)
         )
+
+    # Исходящие уведомления отправляются через очередь с ограничением скорости
+    notifier = NotificationDispatcher(
+        bot,
+        db_pool,
+        workers=config.notifications.workers,
+        global_rate=config.notifications.global_rate,
+        chat_rate=config.notifications.chat_rate,
+        chat_burst=config.notifications.chat_burst,
+        queue_size=config.notifications.queue_size,
+        max_retries=config.notifications.max_retries,
+        flush_interval=config.notifications.flush_interval,
+        shutdown_timeout=config.notifications.shutdown_timeout,
+    )
+    # Напоминания о наступивших задачах идут через ту же очередь; останавливаются
+    # раньше очереди, чтобы все поставленные напоминания успели уйти
+    if config.notifications.reminders_enabled:
+        reminder = TaskReminder(
+            db_pool,
+            notifier,
+            dp.workflow_data["translations"],
+            interval=config.notifications.reminder_interval,
+            lookback=timedelta(seconds=config.notifications.reminder_lookback),
+            batch_size=config.notifications.reminder_batch_size,
+            status_key=config.scheduler.status_key,
+        )
+        dp.startup.register(reminder.start)
+        dp.shutdown.register(reminder.stop)
+    dp.startup.register(notifier.start)
+    dp.shutdown.register(notifier.stop)
+
+    dp.workflow_data["notifier"] = notifier
+
+    # Прогреваем соединения, запросы и кэш профилей до того, как пойдут апдейты
+    if config.warmup.enabled:
+        await WarmUp(
+            db_pool,
+            redis,
+            pool_size=config.warmup.pool_size,
+            profiles_limit=min(config.warmup.profiles_limit, config.cache.user_profile_maxsize),
+            profiles_days=config.warmup.profiles_days,
+        ).run()
+    # Последний хэндлер запуска: исполнитель и уведомления уже работают
+    dp.startup.register(readiness.on_startup)
+
+    # Запускаем прием апдейтов: вебхук или поллинг
+    try:
+        if config.webhook.enabled:
+            await run_webhook(
+                dp,
+                bot,
+                executor,
+                host=config.webhook.host,
+                port=config.webhook.port,
+                path=config.webhook.path,
+                base_url=config.webhook.base_url,
+                secret_token=config.webhook.secret_token,
+                shutdown_timeout=config.webhook.shutdown_timeout,
+            )
+        else:
+            await bot.delete_webhook()
+            # Поллинг только раскладывает апдейты по очередям исполнителя и ждет,
+            # если они переполнены - так задачи не копятся без ограничений
+            await dp.start_polling(bot, handle_as_tasks=False)
     except Exception as e:
         logger.exception(e)
     finally:
+        readiness.set_ready(False)
+        for task in (
+            cache_listener,
+            pool_reporter,
+            activity_flusher,
+            executor_reporter,
+            task_scheduler,
+            partition_maintainer,
+        ):
+            if task is None:
+                continue
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        logger.info("User profile cache stats: %s", user_profile_cache.stats())
+        for middleware in dp.update.middleware:
+            if hasattr(middleware, "stats"):
+                # Под метриками middleware обернуты в `TimedMiddleware`
+                name = type(getattr(middleware, "middleware", middleware)).__name__
+                logger.info("%s stats: %s", name, middleware.stats())
+        logger.info("FSM storage round trips: %s", storage.stats())
+        logger.info("Query call counts: %s", query_registry.stats())
+        if query_registry.slow_calls:
+            logger.info("Slow query counts: %s", dict(query_registry.slow_calls))
+        if metrics_server is not None:
+            await metrics_server.stop()
+        # Дописываем накопленные счетчики активности до закрытия пула
+        await activity_buffer.close()
+        await query_registry.close()
         # Закрываем пул соединений
         await db_pool.close()
         logger.info("Connection to Postgres closed")
+        # Клиент Redis закрывается последним: им пользуются фоновые задачи и буфер активности
+        await redis.aclose(close_connection_pool=True)
+        logger.info("Connection to Redis closed")
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+from contextlib import suppress
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.methods import TelegramMethod
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+UpdateHandler = Callable[[Update, dict[str, Any]], Awaitable[Any]]
+
+# Ключ данных апдейта: не ждать места в очереди, а сразу бросить `asyncio.QueueFull`.
+# Так вебхук отвечает Telegram ошибкой, и апдейт приходит повторно
+SUBMIT_NOWAIT = "executor_nowait"
+
+
+class ShardedUpdateExecutor(BaseMiddleware):
+    '''
+    Раскладывает апдейты по `shards` очередям по id чата (или пользователя)
+    и обрабатывает каждую очередь отдельным воркером: апдейты одного чата
+    идут строго по порядку, разные чаты не ждут друг друга.
+    Очереди ограничены `queue_size` - при переполнении поллинг ждет, пока воркер
+    освободит место, а апдейт с `SUBMIT_NOWAIT` (вебхук) отклоняется сразу
+    '''
+    def __init__(self, shards: int, queue_size: int, shutdown_timeout: float = 30.0) -> None:
+        self.shards = max(shards, 1)
+        self.shutdown_timeout = shutdown_timeout
+        self._queues: list[asyncio.Queue[tuple[UpdateHandler, Update, dict[str, Any]]]] = [
+            asyncio.Queue(maxsize=queue_size) for _ in range(self.shards)
+        ]
+        self._workers: list[asyncio.Task] = []
+        self._running = False
+        self.max_depths = [0] * self.shards
+        self.submitted = 0
+        self.processed = 0
+        self.failed = 0
+        self.blocked = 0
+        self.rejected = 0
+
+    def install(self, dp: Dispatcher) -> None:
+        '''
+        Ставит исполнитель первым outer-middleware апдейтов - раньше встроенных
+        middleware aiogram, чтобы состояние FSM читалось уже в воркере,
+        после обработки предыдущих апдейтов того же чата
+        '''
+        builtin = list(dp.update.outer_middleware)
+        for middleware in builtin:
+            dp.update.outer_middleware.unregister(middleware)
+        dp.update.outer_middleware(self)
+        for middleware in builtin:
+            dp.update.outer_middleware(middleware)
+
+        dp.startup.register(self.start)
+        dp.shutdown.register(self.stop)
+
+    def shard_for(self, event: Update) -> int:
+        context = UserContextMiddleware.resolve_event_context(event)
+        if context.chat is not None:
+            key = context.chat.id
+        elif context.user is not None:
+            key = context.user.id
+        else:
+            # Апдейты без чата и пользователя (например, опросы) упорядочивать не нужно
+            key = event.update_id
+        return key % self.shards
+
+    async def __call__(
+        self,
+        handler: UpdateHandler,
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        nowait = data.pop(SUBMIT_NOWAIT, False)
+        if not self._running:
+            return await handler(event, data)
+
+        shard = self.shard_for(event)
+        queue = self._queues[shard]
+        if queue.full():
+            if nowait:
+                self.rejected += 1
+                raise asyncio.QueueFull
+            self.blocked += 1
+        await queue.put((handler, event, data))
+        self.submitted += 1
+        self.max_depths[shard] = max(self.max_depths[shard], queue.qsize())
+
+    async def _work(self, shard: int) -> None:
+        queue = self._queues[shard]
+        while True:
+            handler, event, data = await queue.get()
+            try:
+                result = await handler(event, data)
+                if isinstance(result, TelegramMethod):
+                    await data["dispatcher"].silent_call_request(bot=data["bot"], result=result)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.exception("Failed to process update %s in shard %d: %s", event.update_id, shard, e)
+            finally:
+                queue.task_done()
+
+    async def start(self) -> None:
+        if self._running:
+            return
+        self._workers = [
+            asyncio.create_task(self._work(shard), name=f"update-shard-{shard}")
+            for shard in range(self.shards)
+        ]
+        self._running = True
+        logger.info("Update executor started with %d shards", self.shards)
+
+    async def drain(self, timeout: float) -> int:
+        '''
+        Дожидается обработки уже поставленных в очереди апдейтов, но не дольше
+        `timeout`. Возвращает число апдейтов, оставшихся в очередях
+        '''
+        pending = sum(queue.qsize() for queue in self._queues)
+        if pending:
+            logger.info("Waiting for %d queued updates...", pending)
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            return sum(queue.qsize() for queue in self._queues)
+        return 0
+
+    async def stop(self) -> None:
+        '''
+        Дожидается обработки уже поставленных в очереди апдейтов,
+        но не дольше `shutdown_timeout`
+        '''
+        if not self._running:
+            return
+        self._running = False
+        dropped = await self.drain(self.shutdown_timeout)
+        if dropped:
+            logger.warning("%d queued updates were dropped on shutdown", dropped)
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            with suppress(asyncio.CancelledError):
+                await worker
+        self._workers = []
+        logger.info("Update executor stats: %s", self.stats())
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "shards": self.shards,
+            "depths": [queue.qsize() for queue in self._queues],
+            "max_depths": list(self.max_depths),
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "rejected": self.rejected,
+        }
+
+    async def report(self, interval: float) -> None:
+        '''
+        Периодически пишет в лог глубину очередей
+        '''
+        while True:
+            await asyncio.sleep(interval)
+            logger.info("Update executor stats: %s", self.stats())
@@ -1,9 +1,8 @@
 from aiogram.filters import BaseFilter
 from aiogram.types import CallbackQuery, Message
-from psycopg import AsyncConnection
 
 from app.bot.enums.roles import UserRole
-# from app.infrastructure.database.db import get_user_role
+from app.infrastructure.database.models import UserContext
 
 
 class LocaleFilter(BaseFilter):
@@ -29,13 +28,17 @@ class UserRoleFilter(BaseFilter):
         if not self.roles:
             raise ValueError("No valid roles provided to `UserRoleFilter`.")
 
-    async def __call__(self, event: Message | CallbackQuery, conn: AsyncConnection) -> bool:
+    async def __call__(
+        self,
+        event: Message | CallbackQuery,
+        user_context: UserContext | None = None,
+    ) -> bool:
         user = event.from_user
         if not user:
             return False
 
-        role = await get_user_role(conn, user_id=user.id)
-        if role is None:
+        # Роль берем из строки пользователя, загруженной `UserContextMiddleware`
+        if user_context is None:
             return False
 
-        return role in self.roles
\ No newline at end of file
+        return UserRole(user_context.role) in self.roles
\ No newline at end of file
@@ -1,10 +1,12 @@
 import logging
+from datetime import datetime, timezone
 
 from aiogram import Router
 from aiogram.filters import Command, CommandObject
 from aiogram.types import Message
 from app.bot.enums.roles import UserRole
 from app.bot.filters.filters import UserRoleFilter
+from app.infrastructure.cache.active_users import DailyActiveUsers
 from app.infrastructure.database.db import (
     change_user_banned_status_by_id,
     change_user_banned_status_by_username,
@@ -29,8 +31,14 @@ async def process_admin_help_command(message: Message, i18n: dict):
 
 # Этот хэндлер будет срабатывать на команду /statistics для пользователя с ролью `UserRole.ADMIN`
 @admin_router.message(Command('statistics'))
-async def process_admin_statistics_command(message: Message, conn: AsyncConnection, i18n: dict[str, str]):
+async def process_admin_statistics_command(
+    message: Message,
+    conn: AsyncConnection,
+    i18n: dict[str, str],
+    active_users: DailyActiveUsers,
+):
     statistics = await get_statistics(conn)
+    today = datetime.now(timezone.utc).date()
     await message.answer(
         text=i18n.get("statistics").format(
             "\n".join(
@@ -38,6 +46,12 @@ async def process_admin_statistics_command(message: Message, conn: AsyncConnecti
                 for i, stat in enumerate(statistics, 1)
             )
         )
+        + "\n\n"
+        + i18n.get("statistics_active_users").format(
+            await active_users.count(today),
+            await active_users.count(today, days=7),
+            await active_users.count(today, days=30),
+        )
     )
 
 
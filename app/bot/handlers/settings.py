@@ -2,21 +2,19 @@ import logging
 from contextlib import suppress
 
 from aiogram import Bot, F, Router
-from aiogram.enums import BotCommandScopeType
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command, CommandStart, StateFilter
 from aiogram.fsm.context import FSMContext
-from aiogram.types import BotCommandScopeChat, CallbackQuery, Message
+from aiogram.types import CallbackQuery, Message
 
+from app.bot.enums.roles import UserRole
 from app.bot.filters.filters import LocaleFilter
-from app.bot.keyboards.keyboards import get_lang_settings_kb
-from app.bot.keyboards.menu_button import get_main_menu_commands
+from app.bot.keyboards.memo import KeyboardCache
+from app.bot.menus import ChatMenus
 from app.bot.states.states import LangSG
-from app.infrastructure.database.db import (
-    get_user_lang,
-    get_user_role,
-    update_user_lang,
-)
+from app.infrastructure.database.db import update_user_lang
+from app.infrastructure.database.models import UserContext
+from app.infrastructure.database.pipeline import run_batch
 from psycopg import AsyncConnection
 
 logger = logging.getLogger(__name__)
@@ -31,7 +29,8 @@ async def process_any_message_when_lang(
     bot: Bot,
     i18n: dict[str, str],
     state: FSMContext,
-    locales: list[str],
+    keyboards: KeyboardCache,
+    locale: str,
 ):
     user_id = message.from_user.id
     data = await state.get_data()
@@ -44,7 +43,7 @@ async def process_any_message_when_lang(
 
     msg = await message.answer(
         text=i18n.get("/lang"),
-        reply_markup=get_lang_settings_kb(i18n=i18n, locales=locales, checked=user_lang),
+        reply_markup=keyboards.lang_settings_kb(locale, checked=user_lang),
     )
 
     await state.update_data(lang_settings_msg_id=msg.message_id)
@@ -54,17 +53,18 @@ async def process_any_message_when_lang(
 @settings_router.message(Command(commands="lang"))
 async def process_lang_command(
     message: Message,
-    conn: AsyncConnection,
     i18n: dict[str, str],
     state: FSMContext,
-    locales: list[str],
+    keyboards: KeyboardCache,
+    locale: str,
+    user_context: UserContext | None,
 ):
     await state.set_state(LangSG.lang)
-    user_lang = await get_user_lang(conn, user_id=message.from_user.id)
+    user_lang = user_context.language if user_context else None
 
     msg = await message.answer(
         text=i18n.get("/lang"),
-        reply_markup=get_lang_settings_kb(i18n=i18n, locales=locales, checked=user_lang),
+        reply_markup=keyboards.lang_settings_kb(locale, checked=user_lang),
     )
 
     await state.update_data(lang_settings_msg_id=msg.message_id, user_lang=user_lang)
@@ -73,22 +73,33 @@ async def process_lang_command(
 # Этот хэндлер будет срабатывать на нажатие кнопки "Сохранить" в режиме настроек языка
 @settings_router.callback_query(F.data == "save_lang_button_data")
 async def process_save_click(
-    callback: CallbackQuery, bot: Bot, conn: AsyncConnection, i18n: dict[str, str], state: FSMContext
+    callback: CallbackQuery,
+    bot: Bot,
+    conn: AsyncConnection,
+    i18n: dict[str, str],
+    state: FSMContext,
+    menus: ChatMenus,
+    locale: str,
+    admin_ids: list[int],
+    user_context: UserContext | None,
 ):
     data = await state.get_data()
-    await update_user_lang(
-        conn, language=data.get("user_lang"), user_id=callback.from_user.id
+    # BEGIN и UPDATE уходят одним пакетом; ошибка всплывет до ответа пользователю
+    await run_batch(
+        conn,
+        update_user_lang(conn, language=data.get("user_lang"), user_id=callback.from_user.id),
     )
     await callback.message.edit_text(text=i18n.get("lang_saved"))
 
-    user_role = await get_user_role(conn, user_id=callback.from_user.id)
-    await bot.set_my_commands(
-        commands=get_main_menu_commands(i18n=i18n, role=user_role),
-        scope=BotCommandScopeChat(
-            type=BotCommandScopeType.CHAT,
-            chat_id=callback.from_user.id
-        )
-    )
+    if user_context is not None:
+        user_role = UserRole(user_context.role)
+    elif callback.from_user.id in admin_ids:
+        user_role = UserRole.ADMIN
+    else:
+        user_role = UserRole.USER
+
+    # Если язык не изменился, меню в чате уже актуально и запрос не отправится
+    await menus.apply(bot, callback.from_user.id, locale, user_role)
     await state.update_data(lang_settings_msg_id=None, user_lang=None)
     await state.set_state()
 
@@ -96,10 +107,17 @@ async def process_save_click(
 # Этот хэнлер будет срабатывать на нажатие кнопки "Отмена" в режиме настроек языка
 @settings_router.callback_query(F.data == "cancel_lang_button_data")
 async def process_cancel_click(
-    callback: CallbackQuery, conn: AsyncConnection, i18n: dict[str, str], state: FSMContext
+    callback: CallbackQuery,
+    i18n: dict[str, str],
+    state: FSMContext,
+    locale: str,
+    user_context: UserContext | None,
 ):
-    user_lang = await get_user_lang(conn, user_id=callback.from_user.id)
-    await callback.message.edit_text(text=i18n.get("lang_cancelled").format(i18n.get(user_lang)))
+    # Пользователя нет в БД - язык остается тем, на котором с ним говорит бот
+    user_lang = user_context.language if user_context else locale
+    await callback.message.edit_text(
+        text=i18n.get("lang_cancelled").format(i18n.get(user_lang))
+    )
     await state.update_data(lang_settings_msg_id=None, user_lang=None)
     await state.set_state()
 
@@ -108,12 +126,12 @@ async def process_cancel_click(
 # в режиме настроек языка интерфейса
 @settings_router.callback_query(LocaleFilter())
 async def process_lang_click(
-    callback: CallbackQuery, i18n: dict[str, str], locales: list[str]
+    callback: CallbackQuery, i18n: dict[str, str], keyboards: KeyboardCache, locale: str
 ):
     try:
         await callback.message.edit_text(
             text=i18n.get("/lang"),
-            reply_markup=get_lang_settings_kb(i18n=i18n, locales=locales, checked=callback.data),
+            reply_markup=keyboards.lang_settings_kb(locale, checked=callback.data),
         )
     except TelegramBadRequest:
         await callback.answer()
\ No newline at end of file
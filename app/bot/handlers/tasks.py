@@ -0,0 +1,80 @@
+import logging
+from contextlib import suppress
+from html import escape
+
+from aiogram import F, Router
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command
+from aiogram.types import CallbackQuery, Message
+
+from app.bot.keyboards.pagination import (
+    SCOPES_BY_CODE,
+    TasksPageCallback,
+    decode_cursor,
+    get_tasks_page_kb,
+)
+from app.infrastructure.database.db import list_tasks_page
+from app.infrastructure.database.models import TasksPage
+from psycopg import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+tasks_router = Router()
+
+TASKS_PAGE_SIZE = 10
+
+
+def _render_page(i18n: dict[str, str], page: TasksPage) -> str:
+    if not page.items:
+        return i18n.get("tasks_empty")
+    lines = [
+        f"• {escape(task.name)} <i>({task.created_at:%d.%m.%Y})</i>"
+        for task in page.items
+    ]
+    return i18n.get("tasks_title") + "\n\n" + "\n".join(lines)
+
+
+# Этот хэндлер будет срабатывать на команду /tasks и показывать первую страницу
+# задач, назначенных пользователю
+@tasks_router.message(Command("tasks"))
+async def process_tasks_command(message: Message, conn: AsyncConnection, i18n: dict[str, str]):
+    page = await list_tasks_page(
+        conn, scope="executor", owner_id=message.from_user.id, limit=TASKS_PAGE_SIZE
+    )
+    await message.answer(
+        text=_render_page(i18n, page),
+        reply_markup=get_tasks_page_kb(i18n, page, scope="executor"),
+    )
+
+
+# Этот хэндлер будет срабатывать на кнопки перелистывания списка задач
+@tasks_router.callback_query(TasksPageCallback.filter(F.scope.in_({"c", "e"})))
+async def process_tasks_page_press(
+    callback: CallbackQuery,
+    callback_data: TasksPageCallback,
+    conn: AsyncConnection,
+    i18n: dict[str, str],
+):
+    try:
+        cursor = decode_cursor(callback_data.cursor)
+    except ValueError:
+        logger.warning("User %d sent a broken task list cursor", callback.from_user.id)
+        await callback.answer()
+        return
+
+    # Владельца списка берем из апдейта, а не из callback_data: чужой список так не открыть
+    scope = SCOPES_BY_CODE[callback_data.scope]
+    page = await list_tasks_page(
+        conn,
+        scope=scope,
+        owner_id=callback.from_user.id,
+        cursor=cursor,
+        backward=callback_data.back,
+        limit=TASKS_PAGE_SIZE,
+    )
+    with suppress(TelegramBadRequest):
+        await callback.message.edit_text(
+            text=_render_page(i18n, page),
+            reply_markup=get_tasks_page_kb(i18n, page, scope=scope),
+        )
+    await callback.answer()
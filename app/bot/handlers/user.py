@@ -2,21 +2,21 @@ import logging
 from contextlib import suppress
 
 from aiogram import Bot, Router
-from aiogram.enums import BotCommandScopeType
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import KICKED, ChatMemberUpdatedFilter, Command, CommandStart
 from aiogram.fsm.context import FSMContext
-from aiogram.types import BotCommandScopeChat, ChatMemberUpdated, Message
+from aiogram.types import ChatMemberUpdated, Message
 
 from app.bot.enums.roles import UserRole
-from app.bot.keyboards.menu_button import get_main_menu_commands
+from app.bot.menus import ChatMenus
 from app.bot.states.states import LangSG
+from app.infrastructure.cache.user_registry import user_registry
 from app.infrastructure.database.db import (
     add_user,
     change_user_alive_status,
-    get_user,
-    get_user_lang,
 )
+from app.infrastructure.database.models import UserContext
+from app.infrastructure.database.pipeline import run_batch
 from psycopg.connection_async import AsyncConnection
 
 logger = logging.getLogger(__name__)
@@ -34,29 +34,43 @@ async def process_start_command(
     i18n: dict[str, str],
     state: FSMContext,
     admin_ids: list[int],
-    translations: dict
+    translations: dict,
+    menus: ChatMenus,
+    locale: str,
+    user_context: UserContext | None,
 ):
-    user_row = await get_user(conn, user_id=message.from_user.id)
-    if user_row is None:
+    # Записи уходят одним пакетом вместе с BEGIN; ошибка всплывет до ответа пользователю
+    statements = []
+    if user_context is None:
         if message.from_user.id in admin_ids:
             user_role = UserRole.ADMIN
         else:
             user_role = UserRole.USER
 
-        await add_user(
+        statements.append(add_user(
             conn,
             user_id=message.from_user.id,
             username=message.from_user.username,
+            firstname=message.from_user.first_name,
+            lastname=message.from_user.last_name or "",
             language=message.from_user.language_code,
             role=user_role
-        )
+        ))
     else:
-        user_role = UserRole(user_row[4])
-        await change_user_alive_status(
-            conn,
-            is_alive=True,
-            user_id=message.from_user.id,
-        )
+        user_role = UserRole(user_context.role)
+        # Статус из профиля уже загружен - лишний UPDATE не отправляем
+        if not user_context.is_alive:
+            statements.append(change_user_alive_status(
+                conn,
+                is_alive=True,
+                user_id=message.from_user.id,
+            ))
+    if statements:
+        await run_batch(conn, *statements)
+    if user_context is not None:
+        # Известный пользователь мог не попасть в реестр, пока Redis был недоступен:
+        # HSETNX вернет его туда, не меняя уже записанный статус
+        await user_registry.add((message.from_user.id,), banned=user_context.banned)
 
     if await state.get_state() == LangSG.lang:
         data = await state.get_data()
@@ -64,16 +78,13 @@ async def process_start_command(
             msg_id = data.get("lang_settings_msg_id")
             if msg_id:
                 await bot.edit_message_reply_markup(chat_id=message.from_user.id, message_id=msg_id)
-        user_lang = await get_user_lang(conn, user_id=message.from_user.id)
-        i18n = translations.get(user_lang)
+        # В режиме настроек язык мог быть подменен на несохраненный - возвращаем язык из профиля
+        if user_context is not None and user_context.language in menus.keyboards.locales:
+            locale = user_context.language
+            i18n = translations[locale]
 
-    await bot.set_my_commands(
-        commands=get_main_menu_commands(i18n=i18n, role=user_role),
-        scope=BotCommandScopeChat(
-            type=BotCommandScopeType.CHAT,
-            chat_id=message.from_user.id
-        )
-    )
+    # Повторный /start с той же ролью и языком не отправляет меню заново
+    await menus.apply(bot, message.from_user.id, locale, user_role)
 
     await message.answer(text=i18n.get("/start"))
     await state.clear()
@@ -0,0 +1,95 @@
+import hashlib
+
+from aiogram.types import BotCommand, InlineKeyboardButton, InlineKeyboardMarkup
+from app.bot.enums.roles import UserRole
+from app.bot.keyboards.keyboards import get_lang_settings_kb
+from app.bot.keyboards.menu_button import get_main_menu_commands
+from pydantic import ConfigDict
+
+
+# Модели aiogram изменяемы, поэтому общие для всех апдейтов объекты хранятся
+# в замороженных подклассах: присваивание полю бросает ValidationError,
+# а ряды клавиатуры - кортежи. Сериализуются они так же, как исходные модели
+class _FrozenButton(InlineKeyboardButton):
+    model_config = ConfigDict(frozen=True)
+
+
+class _FrozenMarkup(InlineKeyboardMarkup):
+    model_config = ConfigDict(frozen=True)
+
+    inline_keyboard: tuple[tuple[_FrozenButton, ...], ...]
+
+
+class _FrozenCommand(BotCommand):
+    model_config = ConfigDict(frozen=True)
+
+
+def _freeze_markup(markup: InlineKeyboardMarkup) -> _FrozenMarkup:
+    return _FrozenMarkup(
+        inline_keyboard=tuple(
+            tuple(_FrozenButton(**button.model_dump(exclude_unset=True)) for button in row)
+            for row in markup.inline_keyboard
+        )
+    )
+
+
+def _fingerprint(commands: list[BotCommand]) -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    for command in commands:
+        digest.update(f"{command.command}\0{command.description}\0".encode())
+    return digest.hexdigest()
+
+
+class KeyboardCache:
+    '''
+    Клавиатуры и меню команд, которые зависят только от локали, выбранного
+    языка и роли. Все варианты строятся один раз при старте из словаря переводов,
+    хэндлеры получают общие замороженные объекты вместо сборки новых на каждый апдейт
+    '''
+    def __init__(self, translations: dict[str, str | dict[str, str]]) -> None:
+        self.locales = [locale for locale in translations if locale != "default"]
+        self.default_locale: str = translations["default"]
+        self._lang_settings: dict[tuple[str, str | None], InlineKeyboardMarkup] = {}
+        self._main_menu: dict[tuple[str, UserRole], tuple[BotCommand, ...]] = {}
+        self._main_menu_fingerprints: dict[tuple[str, UserRole], str] = {}
+
+        for locale in self.locales:
+            i18n = translations[locale]
+            for checked in (None, *self.locales):
+                self._lang_settings[(locale, checked)] = _freeze_markup(
+                    get_lang_settings_kb(i18n=i18n, locales=self.locales, checked=checked)
+                )
+            for role in UserRole:
+                commands = get_main_menu_commands(i18n=i18n, role=role)
+                if commands is not None:
+                    self._main_menu[(locale, role)] = tuple(
+                        _FrozenCommand(**command.model_dump(exclude_unset=True))
+                        for command in commands
+                    )
+                    self._main_menu_fingerprints[(locale, role)] = _fingerprint(commands)
+
+    def lang_settings_kb(self, locale: str, checked: str | None) -> InlineKeyboardMarkup:
+        '''
+        Клавиатура выбора языка на языке `locale` с отмеченным `checked`.
+        Объект общий и заморожен: для правок нужна копия `model_copy(update=...)`
+        '''
+        if checked not in self.locales:
+            checked = None
+        return self._lang_settings[(locale, checked)]
+
+    def main_menu_commands(self, locale: str, role: UserRole) -> list[BotCommand]:
+        '''
+        Меню команд для роли `role` на языке `locale`. Список новый,
+        команды в нем общие и заморожены - `set_my_commands` только сериализует их
+        '''
+        return list(self._main_menu.get((locale, role), ()))
+
+    def main_menu_fingerprint(self, locale: str, role: UserRole) -> str:
+        '''
+        Отпечаток меню команд: меняется вместе с набором команд или их описаниями,
+        поэтому сохраненный для чата отпечаток устаревает сам после правки меню
+        '''
+        return self._main_menu_fingerprints.get((locale, role), "")
+
+    def __len__(self) -> int:
+        return len(self._lang_settings) + len(self._main_menu)
\ No newline at end of file
@@ -17,6 +17,10 @@ def get_main_menu_commands(i18n: dict[str, str], role: UserRole):
                 command='/help',
                 description=i18n.get('/help_description')
             ),
+            BotCommand(
+                command='/tasks',
+                description=i18n.get('/tasks_description')
+            ),
         ]
     elif role == UserRole.ADMIN:
         return [
@@ -32,6 +36,10 @@ def get_main_menu_commands(i18n: dict[str, str], role: UserRole):
                 command='/help',
                 description=i18n.get('/help_description')
             ),
+            BotCommand(
+                command='/tasks',
+                description=i18n.get('/tasks_description')
+            ),
             BotCommand(
                 command='/ban',
                 description=i18n.get('/ban_description')
@@ -0,0 +1,71 @@
+import base64
+import struct
+from datetime import datetime, timedelta, timezone
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from app.infrastructure.database.models import TaskCursor, TasksPage
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# created_at в микросекундах от эпохи + id задачи: 12 байт, 16 символов base64url
+_CURSOR_FORMAT = struct.Struct(">qI")
+
+# Короткие коды видов списка, чтобы уложиться в 64 байта callback_data
+SCOPE_CODES = {"creator": "c", "executor": "e", "group": "g"}
+SCOPES_BY_CODE = {code: scope for scope, code in SCOPE_CODES.items()}
+
+
+class TasksPageCallback(CallbackData, prefix="tp"):
+    scope: str      # код вида списка из `SCOPE_CODES`
+    back: bool      # листать к более новым задачам
+    cursor: str     # курсор из `encode_cursor`
+
+
+def encode_cursor(cursor: TaskCursor) -> str:
+    micros = (cursor.created_at - _EPOCH) // timedelta(microseconds=1)
+    packed = _CURSOR_FORMAT.pack(micros, cursor.id)
+    return base64.urlsafe_b64encode(packed).rstrip(b"=").decode()
+
+
+def decode_cursor(value: str) -> TaskCursor:
+    '''
+    Обратное `encode_cursor`; на испорченном значении поднимает `ValueError`
+    '''
+    try:
+        micros, task_id = _CURSOR_FORMAT.unpack(base64.urlsafe_b64decode(value + "=="))
+    except (struct.error, ValueError) as e:
+        raise ValueError(f"Invalid task list cursor `{value}`") from e
+    return TaskCursor(created_at=_EPOCH + timedelta(microseconds=micros), id=task_id)
+
+
+def get_tasks_page_kb(
+    i18n: dict[str, str],
+    page: TasksPage,
+    scope: str,
+) -> InlineKeyboardMarkup | None:
+    buttons = []
+    if page.prev_cursor is not None:
+        buttons.append(
+            InlineKeyboardButton(
+                text=i18n.get("tasks_prev_button"),
+                callback_data=TasksPageCallback(
+                    scope=SCOPE_CODES[scope],
+                    back=True,
+                    cursor=encode_cursor(page.prev_cursor),
+                ).pack(),
+            )
+        )
+    if page.next_cursor is not None:
+        buttons.append(
+            InlineKeyboardButton(
+                text=i18n.get("tasks_next_button"),
+                callback_data=TasksPageCallback(
+                    scope=SCOPE_CODES[scope],
+                    back=False,
+                    cursor=encode_cursor(page.next_cursor),
+                ).pack(),
+            )
+        )
+    if not buttons:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+from aiogram.types import BotCommandScopeChat
+from app.bot.enums.roles import UserRole
+from app.bot.keyboards.memo import KeyboardCache
+from app.bot.notifications import TokenBucket
+from app.infrastructure.database.db import change_user_alive_status_bulk, get_menu_users_page
+from psycopg import AsyncConnection
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+MENU_KEY_PREFIX = "menu:chat:"
+
+
+class ChatMenus:
+    '''
+    Меню команд в чатах пользователей (`set_my_commands` с областью чата).
+    В Redis для каждого чата хранится отпечаток последнего примененного меню,
+    и установка того же меню повторно - лишний запрос к Bot API в счет лимитов - пропускается.
+    Без Redis или при его ошибке меню устанавливается всегда
+    '''
+    def __init__(
+        self,
+        keyboards: KeyboardCache,
+        redis: Redis | None = None,
+        ttl: float = 30 * 24 * 3600,
+    ) -> None:
+        self.keyboards = keyboards
+        self.ttl = ttl
+        self.applied = 0
+        self.skipped = 0
+        self._redis = redis
+
+    async def is_current(self, chat_id: int, locale: str, role: UserRole) -> bool:
+        '''
+        Проверяет, установлено ли в чате именно это меню
+        '''
+        if self._redis is None:
+            return False
+        try:
+            stored = await self._redis.get(f"{MENU_KEY_PREFIX}{chat_id}")
+        except Exception as e:
+            logger.warning("Failed to read menu fingerprint for chat %d: %s", chat_id, e)
+            return False
+        if isinstance(stored, bytes):
+            stored = stored.decode()
+        return stored == self.keyboards.main_menu_fingerprint(locale, role)
+
+    async def apply(
+        self,
+        bot: Bot,
+        chat_id: int,
+        locale: str,
+        role: UserRole,
+        *,
+        force: bool = False,
+    ) -> bool:
+        '''
+        Устанавливает меню команд для чата, если оно отличается от уже установленного.
+        Возвращает `True`, если запрос к Bot API был отправлен
+        '''
+        if not force and await self.is_current(chat_id, locale, role):
+            self.skipped += 1
+            return False
+
+        await bot.set_my_commands(
+            commands=self.keyboards.main_menu_commands(locale, role=role),
+            scope=BotCommandScopeChat(chat_id=chat_id),
+        )
+        self.applied += 1
+
+        if self._redis is not None:
+            try:
+                await self._redis.set(
+                    f"{MENU_KEY_PREFIX}{chat_id}",
+                    self.keyboards.main_menu_fingerprint(locale, role),
+                    ex=int(self.ttl),
+                )
+            except Exception as e:
+                # Без отпечатка следующий /start просто отправит меню еще раз
+                logger.warning("Failed to store menu fingerprint for chat %d: %s", chat_id, e)
+        return True
+
+    async def resync_all(
+        self,
+        bot: Bot,
+        conn: AsyncConnection,
+        *,
+        rate: float = 25.0,
+        batch_size: int = 1000,
+        max_retries: int = 5,
+        force: bool = False,
+    ) -> dict[str, int]:
+        '''
+        Пересылает меню всем активным пользователям не быстрее `rate` запросов в секунду.
+        Чаты с актуальным отпечатком пропускаются, поэтому после правки набора команд
+        отправляются только затронутые меню, а прерванный запуск можно просто повторить.
+        `conn` должен быть в режиме autocommit: между страницами идут долгие паузы
+        '''
+        bucket = TokenBucket(rate=rate, capacity=1)
+        stats = {"users": 0, "applied": 0, "skipped": 0, "failed": 0, "deactivated": 0}
+        dead_ids: list[int] = []
+        after_user_id = 0
+
+        while True:
+            users = await get_menu_users_page(conn, after_user_id=after_user_id, limit=batch_size)
+            if not users:
+                break
+            after_user_id = users[-1].user_id
+
+            for user in users:
+                stats["users"] += 1
+                locale = user.language
+                if locale not in self.keyboards.locales:
+                    locale = self.keyboards.default_locale
+                role = UserRole(user.role)
+                if not force and await self.is_current(user.user_id, locale, role):
+                    stats["skipped"] += 1
+                    continue
+
+                for attempt in range(1, max_retries + 1):
+                    await asyncio.sleep(bucket.reserve())
+                    try:
+                        await self.apply(bot, user.user_id, locale, role, force=True)
+                        stats["applied"] += 1
+                        break
+                    except TelegramRetryAfter as e:
+                        logger.warning("Menu resync hit flood control, waiting %ds", e.retry_after)
+                        bucket.penalize(e.retry_after)
+                        if attempt == max_retries:
+                            stats["failed"] += 1
+                    except TelegramForbiddenError:
+                        dead_ids.append(user.user_id)
+                        break
+                    except TelegramAPIError as e:
+                        logger.warning("Failed to set menu for chat %d: %s", user.user_id, e)
+                        stats["failed"] += 1
+                        break
+
+            logger.info(
+                "Menu resync progress: users=%d, applied=%d, skipped=%d, failed=%d",
+                stats["users"], stats["applied"], stats["skipped"], stats["failed"],
+            )
+
+        if dead_ids:
+            changed = await change_user_alive_status_bulk(conn, is_alive=False, user_ids=dead_ids)
+            stats["deactivated"] = len(changed)
+        return stats
@@ -3,12 +3,23 @@ from typing import Any, Awaitable, Callable
 
 from aiogram import BaseMiddleware
 from aiogram.types import Update
+from app.infrastructure.database.lazy import LazyConnection
 from psycopg_pool import AsyncConnectionPool
 
 logger = logging.getLogger(__name__)
 
 
 class DataBaseMiddleware(BaseMiddleware):
+    '''
+    Кладет в `data["conn"]` ленивое соединение: апдейты, хэндлеры которых не ходят в БД,
+    не занимают соединение из пула. Копит статистику ожидания соединений
+    '''
+    def __init__(self) -> None:
+        self.updates = 0
+        self.checkouts = 0
+        self.pool_wait_total = 0.0
+        self.pool_wait_max = 0.0
+
     async def __call__(
         self,
         handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
@@ -21,15 +32,42 @@ class DataBaseMiddleware(BaseMiddleware):
             logger.error("Database pool is not provided in middleware data.")
             raise RuntimeError("Missing db_pool in middleware context.")
 
-        async with db_pool.connection() as connection:
-            try:
-                async with connection.transaction():
-                    data["conn"] = connection
-                    result = await handler(event, data)
-            except Exception as e:
+        connection = LazyConnection(db_pool)
+        data["conn"] = connection
+        error: BaseException | None = None
+        try:
+            result = await handler(event, data)
+        except BaseException as e:
+            # Отмена (остановка вебхука, исполнителя) тоже должна вернуть соединение в пул
+            error = e
+            if connection.in_transaction:
                 logger.exception("Transaction rolled back due to error: %s", e)
-                raise
+            raise
+        finally:
+            try:
+                await connection.close(error)
+            finally:
+                self._account(connection)
 
         # Здесь может быть какой-то код, который выполнится в случае успешного завершения транзакции
 
-        return result
\ No newline at end of file
+        return result
+
+    def _account(self, connection: LazyConnection) -> None:
+        self.updates += 1
+        if connection.wait_time is None:
+            return
+        self.checkouts += 1
+        self.pool_wait_total += connection.wait_time
+        self.pool_wait_max = max(self.pool_wait_max, connection.wait_time)
+        logger.debug("Waited %.2f ms for a pool connection", connection.wait_time * 1000)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "updates": self.updates,
+            "checkouts": self.checkouts,
+            "pool_wait_avg_ms": (
+                self.pool_wait_total / self.checkouts * 1000 if self.checkouts else 0.0
+            ),
+            "pool_wait_max_ms": self.pool_wait_max * 1000,
+        }
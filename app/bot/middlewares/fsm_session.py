@@ -0,0 +1,47 @@
+import logging
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.fsm.middleware import FSMContextMiddleware
+from aiogram.types import Update
+from app.infrastructure.cache.fsm import BufferedRedisStorage
+
+logger = logging.getLogger(__name__)
+
+
+class FSMSessionMiddleware(BaseMiddleware):
+    '''
+    Открывает сессию `BufferedRedisStorage` на время обработки апдейта:
+    состояние и данные FSM читаются одним запросом, а изменения
+    записываются одной транзакцией после хэндлера
+    '''
+    def __init__(self, storage: BufferedRedisStorage) -> None:
+        self.storage = storage
+
+    def install(self, dp: Dispatcher) -> None:
+        '''
+        Ставит middleware прямо перед встроенным `FSMContextMiddleware`:
+        тот читает состояние еще до хэндлера, и это чтение должно попасть в сессию
+        '''
+        middlewares = list(dp.update.outer_middleware)
+        position = next(
+            (
+                i for i, middleware in enumerate(middlewares)
+                if isinstance(middleware, FSMContextMiddleware)
+            ),
+            len(middlewares),
+        )
+        for middleware in middlewares[position:]:
+            dp.update.outer_middleware.unregister(middleware)
+        dp.update.outer_middleware(self)
+        for middleware in middlewares[position:]:
+            dp.update.outer_middleware(middleware)
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        async with self.storage.session():
+            return await handler(event, data)
@@ -0,0 +1,37 @@
+import logging
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update, User
+from app.infrastructure.database.models import UserContext
+
+logger = logging.getLogger(__name__)
+
+
+class TranslatorMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get("event_from_user")
+
+        if user is None:
+            return await handler(event, data)
+
+        # Язык, выбранный в режиме настроек, приоритетнее сохраненного в БД
+        user_lang: str | None = data.get("user_lang")
+        if user_lang is None:
+            user_context: UserContext | None = data.get("user_context")
+            user_lang = user_context.language if user_context else user.language_code
+
+        translations: dict = data.get("translations")
+        if user_lang not in translations or user_lang == "default":
+            user_lang = translations["default"]
+
+        # Имя локали нужно хэндлерам для поиска готовых клавиатур в `KeyboardCache`
+        data["locale"] = user_lang
+        data["i18n"] = translations[user_lang]
+
+        return await handler(event, data)
@@ -0,0 +1,39 @@
+import logging
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Update, User
+from app.bot.states.states import LangSG
+
+logger = logging.getLogger(__name__)
+
+
+class LangSettingsMiddleware(BaseMiddleware):
+    '''
+    В режиме настроек языка подменяет язык интерфейса на выбранный пользователем,
+    но еще не сохраненный в БД
+    '''
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get("event_from_user")
+
+        if user is None or event.callback_query is None:
+            return await handler(event, data)
+
+        locales: list[str] = data.get("locales")
+        state: FSMContext = data.get("state")
+        user_state = await state.get_state()
+
+        if event.callback_query.data == "save_lang_button_data":
+            user_lang = (await state.get_data()).get("user_lang")
+            data["user_lang"] = user_lang
+        elif event.callback_query.data in locales and user_state == LangSG.lang:
+            data["user_lang"] = event.callback_query.data
+            await state.update_data(user_lang=event.callback_query.data)
+
+        return await handler(event, data)
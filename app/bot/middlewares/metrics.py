@@ -0,0 +1,139 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+from app.infrastructure.metrics import (
+    bot_api_errors,
+    bot_api_seconds,
+    handler_seconds,
+    middleware_seconds,
+    update_seconds,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateTimingMiddleware(BaseMiddleware):
+    '''
+    Полное время обработки апдейта по типу события
+    '''
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            update_seconds.observe(time.perf_counter() - started, event.event_type)
+
+
+class TimedMiddleware(BaseMiddleware):
+    '''
+    Обертка middleware апдейтов: записывает время в самой middleware, без времени
+    следующих middleware и хэндлера. Остальные атрибуты (например, `stats()`)
+    берутся у обернутой middleware
+    '''
+    def __init__(self, middleware: Callable[..., Awaitable[Any]], name: str | None = None) -> None:
+        self.middleware = middleware
+        self.name = name or type(middleware).__name__
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self.middleware, item)
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        downstream = 0.0
+
+        async def timed_handler(event: Update, data: dict[str, Any]) -> Any:
+            nonlocal downstream
+            started = time.perf_counter()
+            try:
+                return await handler(event, data)
+            finally:
+                downstream += time.perf_counter() - started
+
+        started = time.perf_counter()
+        try:
+            return await self.middleware(timed_handler, event, data)
+        finally:
+            middleware_seconds.observe(time.perf_counter() - started - downstream, self.name)
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    '''
+    Внутренняя middleware событий: время хэндлера под именем его функции
+    '''
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_seconds.observe(
+                time.perf_counter() - started, data["handler"].callback.__name__
+            )
+
+
+class BotApiTimingMiddleware(BaseRequestMiddleware):
+    '''
+    Middleware сессии бота: время запросов к Bot API и ошибки по методам
+    '''
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            bot_api_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            bot_api_seconds.observe(time.perf_counter() - started, name)
+
+
+def install_metrics(dp: Dispatcher, bot: Bot) -> None:
+    '''
+    Оборачивает middleware апдейтов в `TimedMiddleware`, ставит замер полного времени
+    апдейта первым outer-middleware, замер хэндлеров - на все события, а замер
+    запросов - в сессию бота. Вызывается после подключения всех middleware, но до
+    `ShardedUpdateExecutor.install`: иначе время апдейта закончится на постановке в очередь
+    '''
+    for prefix, manager in (("outer", dp.update.outer_middleware), ("inner", dp.update.middleware)):
+        middlewares = list(manager)
+        for middleware in middlewares:
+            manager.unregister(middleware)
+        if prefix == "outer":
+            manager(UpdateTimingMiddleware())
+        for middleware in middlewares:
+            manager(TimedMiddleware(middleware, f"{prefix}:{type(middleware).__name__}"))
+
+    handler_timing = HandlerTimingMiddleware()
+    # Внутренние middleware диспетчера действуют на хэндлеры всех вложенных роутеров
+    for event_name, observer in dp.observers.items():
+        if event_name not in ("update", "error"):
+            observer.middleware(handler_timing)
+
+    bot.session.middleware(BotApiTimingMiddleware())
@@ -0,0 +1,86 @@
+import logging
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject, Update
+from app.infrastructure.database.queries import QueryRegistry, QueryTrace
+from app.infrastructure.metrics import queries_per_update
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetMiddleware(BaseMiddleware):
+    '''
+    Считает запросы `db.py` за апдейт и предупреждает, если их больше `budget`:
+    так видно N+1 в хэндлере еще до продакшена. В предупреждение попадают
+    хэндлер и число вызовов каждого запроса
+    '''
+    def __init__(self, registry: QueryRegistry, budget: int) -> None:
+        self.registry = registry
+        self.budget = budget
+        self.updates = 0
+        self.over_budget = 0
+        self.max_queries = 0
+
+    def install(self, dp: Dispatcher) -> None:
+        '''
+        Ставит middleware первой внутренней middleware апдейтов, чтобы в счет попали
+        и запросы остальных middleware, а на события - отметку хэндлера
+        '''
+        middlewares = list(dp.update.middleware)
+        for middleware in middlewares:
+            dp.update.middleware.unregister(middleware)
+        dp.update.middleware(self)
+        for middleware in middlewares:
+            dp.update.middleware(middleware)
+
+        for event_name, observer in dp.observers.items():
+            if event_name not in ("update", "error"):
+                observer.middleware(self._mark_handler)
+
+    async def _mark_handler(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        trace = self.registry.current_trace()
+        if trace is not None:
+            trace.handler = data["handler"].callback.__name__
+        return await handler(event, data)
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        with self.registry.trace() as trace:
+            try:
+                return await handler(event, data)
+            finally:
+                self._account(event, trace)
+
+    def _account(self, event: Update, trace: QueryTrace) -> None:
+        total = trace.total
+        self.updates += 1
+        self.max_queries = max(self.max_queries, total)
+        queries_per_update.observe(total)
+        if total > self.budget:
+            self.over_budget += 1
+            logger.warning(
+                "Update %d (%s, handler %s) ran %d queries, budget is %d: %s",
+                event.update_id,
+                event.event_type,
+                trace.handler or "-",
+                total,
+                self.budget,
+                dict(trace.counts.most_common()),
+            )
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "updates": self.updates,
+            "over_budget": self.over_budget,
+            "max_queries": self.max_queries,
+        }
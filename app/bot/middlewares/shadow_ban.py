@@ -0,0 +1,73 @@
+import logging
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update, User
+from app.infrastructure.cache.user_registry import BANNED, UNAVAILABLE, UserRegistry
+from app.infrastructure.database.db import load_user_context
+from app.infrastructure.database.lazy import LazyConnection
+
+logger = logging.getLogger(__name__)
+
+
+def _is_start_command(event: Update) -> bool:
+    text = event.message.text if event.message else None
+    return bool(text) and text.split(maxsplit=1)[0].split("@", 1)[0] == "/start"
+
+
+class ShadowBanMiddleware(BaseMiddleware):
+    '''
+    Отбрасывает апдейты забаненных и незарегистрированных пользователей
+    (незарегистрированным доступна только команда /start) до того, как
+    апдейт займет соединение с БД: статус берется из `UserRegistry` в Redis.
+    Если реестр недоступен, бан проверяется по профилю пользователя, как раньше
+    '''
+    def __init__(self, registry: UserRegistry) -> None:
+        self.registry = registry
+        self.dropped_banned = 0
+        self.dropped_unknown = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get("event_from_user")
+
+        if user is None:
+            return await handler(event, data)
+
+        status = await self.registry.status(user.id)
+        if status is UNAVAILABLE:
+            banned = await self._load_banned(user.id, data)
+        else:
+            banned = status == BANNED
+            if status is None and not _is_start_command(event):
+                self.dropped_unknown += 1
+                logger.debug("Dropped update from unregistered user %d", user.id)
+                if event.callback_query:
+                    await event.callback_query.answer()
+                return
+
+        if banned:
+            self.dropped_banned += 1
+            logger.warning("Shadow-banned user tried to interact: %d", user.id)
+            if event.callback_query:
+                await event.callback_query.answer()
+            return
+
+        return await handler(event, data)
+
+    @staticmethod
+    async def _load_banned(user_id: int, data: dict[str, Any]) -> bool:
+        # Профиль попадает в кэш процесса, и `UserContextMiddleware` повторно в БД не пойдет
+        conn = LazyConnection(data["db_pool"])
+        try:
+            user_context = await load_user_context(conn, user_id=user_id)
+        finally:
+            await conn.close()
+        return user_context is not None and user_context.banned
+
+    def stats(self) -> dict[str, int]:
+        return {"dropped_banned": self.dropped_banned, "dropped_unknown": self.dropped_unknown}
@@ -0,0 +1,31 @@
+import logging
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update, User
+from app.infrastructure.database.activity import ActivityBuffer
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityCounterMiddleware(BaseMiddleware):
+    '''
+    Учитывает апдейт в буфере активности, не занимая соединение с БД
+    '''
+    def __init__(self, activity_buffer: ActivityBuffer) -> None:
+        self.activity_buffer = activity_buffer
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get("event_from_user")
+
+        result = await handler(event, data)
+
+        if user is not None:
+            self.activity_buffer.record(user.id)
+
+        return result
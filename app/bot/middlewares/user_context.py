@@ -0,0 +1,36 @@
+import logging
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update, User
+from app.infrastructure.database.db import load_user_context
+from psycopg import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+
+class UserContextMiddleware(BaseMiddleware):
+    '''
+    Загружает строку пользователя из `users` один раз на апдейт и кладет ее
+    в `data["user_context"]` для остальных middleware, фильтров и хэндлеров
+    '''
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get("event_from_user")
+
+        if user is None:
+            data["user_context"] = None
+            return await handler(event, data)
+
+        conn: AsyncConnection = data.get("conn")
+        if conn is None:
+            logger.error("Database connection not found in middleware data.")
+            raise RuntimeError("Missing database connection for user context.")
+
+        data["user_context"] = await load_user_context(conn, user_id=user.id)
+
+        return await handler(event, data)
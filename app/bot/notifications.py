@@ -0,0 +1,305 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from app.infrastructure.database.db import change_user_alive_status_bulk
+from app.infrastructure.database.lazy import LazyConnection
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    '''
+    Ведро токенов с резервированием: `reserve` всегда выдает токен, но возвращает,
+    сколько секунд нужно подождать до его появления. Так несколько отправок подряд
+    получают последовательные слоты, а не соревнуются за один и тот же токен
+    '''
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def reserve(self, now: float | None = None) -> float:
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+    def penalize(self, delay: float, now: float | None = None) -> None:
+        '''
+        Откладывает следующий свободный токен минимум на `delay` секунд (после 429)
+        '''
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self._tokens = min(self._tokens, -delay * self.rate)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self._tokens >= self.capacity
+
+
+@dataclass(slots=True)
+class Notification:
+    chat_id: int
+    text: str
+    kwargs: dict[str, Any] = field(default_factory=dict)
+    attempts: int = 0
+    chat_slot_reserved: bool = False    # слот в лимите чата уже занят, повторно не резервируем
+
+
+class NotificationDispatcher:
+    '''
+    Очередь исходящих уведомлений (напоминания о задачах, рассылки).
+    Отправку выполняют `workers` воркеров с ограничением скорости глобально
+    и для каждого чата, повтором после 429 через `retry_after` и пакетной
+    пометкой заблокировавших бота пользователей как `is_alive=False`
+    (без `pool` такие чаты только считаются).
+    Не больше `queue_size` уведомлений одновременно: `notify` ждет, если очередь полна
+    '''
+    def __init__(
+        self,
+        bot: Bot,
+        pool: AsyncConnectionPool | None,
+        *,
+        workers: int = 4,
+        global_rate: float = 25.0,
+        chat_rate: float = 1.0,
+        chat_burst: int = 1,
+        queue_size: int = 10_000,
+        max_retries: int = 5,
+        flush_interval: float = 5.0,
+        shutdown_timeout: float = 30.0,
+    ) -> None:
+        self.bot = bot
+        self._pool = pool
+        self.workers = max(workers, 1)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.flush_interval = flush_interval
+        self.shutdown_timeout = shutdown_timeout
+        self._global_bucket = TokenBucket(rate=global_rate, capacity=global_rate)
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        # Очереди чатов: в отправке участвует только первое уведомление чата,
+        # поэтому повтор после 429 не обгоняется следующими сообщениями
+        self._chat_queues: dict[int, deque[Notification]] = {}
+        self._ready: asyncio.Queue[Notification] = asyncio.Queue()
+        self._slots = asyncio.Semaphore(queue_size)
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._paused_until = 0.0
+        self._dead_chat_ids: set[int] = set()
+        self._workers: list[asyncio.Task] = []
+        self._flusher: asyncio.Task | None = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.deactivated = 0
+
+    async def notify(self, chat_id: int, text: str, **kwargs: Any) -> None:
+        '''
+        Ставит сообщение в очередь; параметры `kwargs` передаются в `bot.send_message`
+        '''
+        await self._slots.acquire()
+        self._pending += 1
+        self._idle.clear()
+        notification = Notification(chat_id=chat_id, text=text, kwargs=kwargs)
+        chat_queue = self._chat_queues.get(chat_id)
+        if chat_queue is None:
+            self._chat_queues[chat_id] = deque((notification,))
+            self._schedule(notification)
+        else:
+            chat_queue.append(notification)
+
+    def _schedule(self, notification: Notification, delay: float = 0.0) -> None:
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, notification)
+        else:
+            self._ready.put_nowait(notification)
+
+    def _done(self, notification: Notification) -> None:
+        self._pending -= 1
+        self._slots.release()
+        chat_queue = self._chat_queues[notification.chat_id]
+        chat_queue.popleft()
+        if chat_queue:
+            self._schedule(chat_queue[0])
+        else:
+            del self._chat_queues[notification.chat_id]
+        if self._pending == 0:
+            self._idle.set()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _work(self) -> None:
+        while True:
+            notification = await self._ready.get()
+            now = time.monotonic()
+            if not notification.chat_slot_reserved:
+                # Лимит чата не держит воркер: уведомление возвращается в очередь к своему слоту
+                notification.chat_slot_reserved = True
+                delay = self._chat_bucket(notification.chat_id).reserve(now)
+                if delay > 0:
+                    self._schedule(notification, delay)
+                    continue
+
+            delay = max(self._global_bucket.reserve(now), self._paused_until - now)
+            if delay > 0:
+                # Слот чата занят на сейчас, а сообщение уйдет позже: следующий слот
+                # чата отсчитывается от фактической отправки
+                self._chat_bucket(notification.chat_id).penalize(delay, now)
+                await asyncio.sleep(delay)
+            await self._send(notification)
+
+    async def _send(self, notification: Notification) -> None:
+        notification.attempts += 1
+        try:
+            await self.bot.send_message(
+                chat_id=notification.chat_id, text=notification.text, **notification.kwargs
+            )
+        except TelegramRetryAfter as e:
+            # Флуд-контроль Telegram: приостанавливаем все отправки и повторяем позже
+            logger.warning("Flood wait %ds on chat %d", e.retry_after, notification.chat_id)
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            self._chat_bucket(notification.chat_id).penalize(e.retry_after)
+            self._retry(notification, e.retry_after)
+            return
+        except TelegramForbiddenError:
+            # Пользователь заблокировал бота или удалил аккаунт
+            self._dead_chat_ids.add(notification.chat_id)
+            self.failed += 1
+        except (TelegramNetworkError, TelegramServerError) as e:
+            logger.warning("Failed to send notification to %d: %s", notification.chat_id, e)
+            self._retry(notification, min(2 ** notification.attempts, 60))
+            return
+        except Exception as e:
+            logger.exception("Failed to send notification to %d: %s", notification.chat_id, e)
+            self.failed += 1
+        else:
+            self.sent += 1
+        self._done(notification)
+
+    def _retry(self, notification: Notification, delay: float) -> None:
+        if notification.attempts > self.max_retries:
+            logger.error(
+                "Notification to %d dropped after %d attempts",
+                notification.chat_id, notification.attempts,
+            )
+            self.failed += 1
+            self._done(notification)
+            return
+        self.retried += 1
+        notification.chat_slot_reserved = False
+        self._schedule(notification, delay)
+
+    async def flush_dead_users(self) -> None:
+        '''
+        Одним запросом помечает неактивными пользователей, заблокировавших бота
+        '''
+        if not self._dead_chat_ids:
+            return
+        user_ids = list(self._dead_chat_ids)
+        self._dead_chat_ids.difference_update(user_ids)
+        if self._pool is None:
+            logger.info("%d chats have blocked the bot", len(user_ids))
+            return
+        # Ленивое соединение рассылает сброс профилей только после COMMIT -
+        # иначе соседние процессы успеют перечитать и закэшировать старый `is_alive`
+        connection = LazyConnection(self._pool)
+        error: BaseException | None = None
+        try:
+            try:
+                changed = await change_user_alive_status_bulk(
+                    connection, is_alive=False, user_ids=user_ids
+                )
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                # Здесь же фиксируется транзакция: ошибка COMMIT тоже вернет чаты в очередь
+                await connection.close(error)
+        except BaseException:
+            self._dead_chat_ids.update(user_ids)
+            raise
+        self.deactivated += len(changed)
+
+    def _prune_buckets(self) -> None:
+        now = time.monotonic()
+        idle = [chat_id for chat_id, bucket in self._chat_buckets.items() if bucket.is_idle(now)]
+        for chat_id in idle:
+            del self._chat_buckets[chat_id]
+
+    async def _run_flusher(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self._prune_buckets()
+            try:
+                await self.flush_dead_users()
+            except Exception as e:
+                logger.warning("Failed to mark blocked users as inactive: %s", e)
+
+    async def start(self) -> None:
+        if self._workers:
+            return
+        self._workers = [
+            asyncio.create_task(self._work(), name=f"notifier-{i}") for i in range(self.workers)
+        ]
+        self._flusher = asyncio.create_task(self._run_flusher())
+        logger.info("Notification dispatcher started with %d workers", self.workers)
+
+    async def stop(self) -> None:
+        '''
+        Дожидается отправки поставленных уведомлений, но не дольше `shutdown_timeout`
+        '''
+        if not self._workers:
+            return
+        if self._pending:
+            logger.info("Waiting for %d notifications...", self._pending)
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%d notifications were dropped on shutdown", self._pending)
+        for task in (*self._workers, self._flusher):
+            task.cancel()
+        await asyncio.gather(*self._workers, self._flusher, return_exceptions=True)
+        self._workers = []
+        self._flusher = None
+        try:
+            await self.flush_dead_users()
+        except Exception as e:
+            logger.error("Failed to mark blocked users as inactive on shutdown: %s", e)
+        logger.info("Notification dispatcher stats: %s", self.stats())
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pending": self._pending,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "deactivated": self.deactivated,
+            "chat_buckets": len(self._chat_buckets),
+        }
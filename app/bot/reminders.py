@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from html import escape
+
+from app.bot.notifications import NotificationDispatcher
+from app.infrastructure.database.db import claim_due_task_processes
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Статус выполнения, о котором исполнителю уже отправлено напоминание
+NOTIFIED_STATUS = "notified"
+
+
+class TaskReminder:
+    '''
+    Раз в `interval` секунд забирает наступившие выполнения задач (не старше `lookback`)
+    и ставит напоминания исполнителям в очередь `NotificationDispatcher`.
+    Выполнения переводятся в статус `notified` в той же транзакции, в которой выбираются,
+    поэтому несколько копий бота не отправят одно напоминание дважды
+    '''
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        notifier: NotificationDispatcher,
+        translations: dict[str, str | dict[str, str]],
+        *,
+        interval: float = 60.0,
+        lookback: timedelta = timedelta(hours=1),
+        batch_size: int = 500,
+        status_key: str = "planned",
+    ) -> None:
+        self._pool = pool
+        self.notifier = notifier
+        self.translations = translations
+        self.locales = [locale for locale in translations if locale != "default"]
+        self.default_locale: str = translations["default"]
+        self.interval = interval
+        self.lookback = lookback
+        self.batch_size = batch_size
+        self.status_key = status_key
+        self._task: asyncio.Task | None = None
+        self.reminded = 0
+
+    async def remind(self) -> int:
+        '''
+        Отправляет напоминания пачками, пока есть наступившие выполнения.
+        Возвращает число поставленных в очередь напоминаний
+        '''
+        now = datetime.now(timezone.utc)
+        total = 0
+        while True:
+            async with self._pool.connection() as connection:
+                rows = await claim_due_task_processes(
+                    connection,
+                    since=now - self.lookback,
+                    until=now,
+                    status_key=self.status_key,
+                    claimed_status_key=NOTIFIED_STATUS,
+                    limit=self.batch_size,
+                )
+            for _, date_execute, name, executor_id, language in rows:
+                locale = language if language in self.locales else self.default_locale
+                text = self.translations[locale].get("task_reminder").format(
+                    escape(name), f"{date_execute:%d.%m.%Y %H:%M}"
+                )
+                await self.notifier.notify(executor_id, text)
+            total += len(rows)
+            if len(rows) < self.batch_size:
+                break
+        self.reminded += total
+        return total
+
+    async def run(self) -> None:
+        while True:
+            try:
+                reminded = await self.remind()
+                if reminded:
+                    logger.info("Task reminders queued: %d", reminded)
+            except Exception as e:
+                logger.exception("Failed to send task reminders: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        '''
+        Останавливается до `NotificationDispatcher`: уже поставленные напоминания
+        он успеет отправить при своей остановке
+        '''
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        logger.info("Task reminders queued since start: %d", self.reminded)
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from app.infrastructure.cache.profiles import user_profile_cache
+from app.infrastructure.database.db import get_recently_active_user_ids, get_users_by_ids
+from psycopg import AsyncConnection
+from psycopg_pool import AsyncConnectionPool
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+# Небольшие справочники, которые читают запросы задач
+REFERENCE_TABLES = ("task_frequency_varieties", "task_status_varieties", "user_status_varieties")
+
+PROFILES_CHUNK = 1000
+# Сколько ждать подписки слушателя инвалидаций перед загрузкой профилей, секунды
+SUBSCRIBE_TIMEOUT = 5.0
+
+
+class WarmUp:
+    '''
+    Прогрев процесса до начала приема апдейтов: первая волна после деплоя
+    не должна платить за открытие соединений, холодные кэши каталога и планы
+    запросов, пустой кэш профилей. Ошибка шага логируется и не мешает запуску
+    '''
+    def __init__(
+        self,
+        db_pool: AsyncConnectionPool,
+        redis: Redis,
+        *,
+        pool_size: int,
+        profiles_limit: int,
+        profiles_days: int,
+    ) -> None:
+        self.db_pool = db_pool
+        self.redis = redis
+        # 0 - открыть пул до максимума
+        self.pool_size = min(pool_size or db_pool.max_size, db_pool.max_size)
+        self.profiles_limit = profiles_limit
+        self.profiles_days = profiles_days
+        self.timings: dict[str, float] = {}
+
+    @asynccontextmanager
+    async def _step(self, name: str) -> AsyncIterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            logger.warning("Warm-up step `%s` failed: %s", name, e)
+        finally:
+            self.timings[name] = time.perf_counter() - started
+
+    async def run(self) -> dict[str, float]:
+        started = time.perf_counter()
+        async with self._step("redis"):
+            await self.redis.ping()
+        async with self._step("pool"):
+            await self._warm_connections()
+        async with self._step("profiles"):
+            loaded = await self._load_profiles()
+            logger.info("Warm-up loaded %d user profiles", loaded)
+        self.timings["total"] = time.perf_counter() - started
+        logger.info(
+            "Warm-up finished in %.2f s: %s",
+            self.timings["total"],
+            {name: round(seconds * 1000, 1) for name, seconds in self.timings.items()},
+        )
+        return self.timings
+
+    async def _warm_connections(self) -> None:
+        '''
+        Открывает `pool_size` соединений одновременно: каждое новое соединение
+        подготавливает горячие запросы в хуке `configure` пула. На каждом читаются
+        справочники - так прогреваются кэши каталога бэкенда и буферы
+        '''
+        await self.db_pool.wait()
+        connections = await asyncio.gather(
+            *(self.db_pool.getconn() for _ in range(self.pool_size)),
+            return_exceptions=True,
+        )
+        try:
+            await asyncio.gather(*(
+                self._warm_connection(connection)
+                for connection in connections
+                if isinstance(connection, AsyncConnection)
+            ))
+        finally:
+            for connection in connections:
+                if isinstance(connection, AsyncConnection):
+                    await self.db_pool.putconn(connection)
+        failed = [c for c in connections if isinstance(c, BaseException)]
+        if failed:
+            raise failed[0]
+        logger.info("Warm-up opened %d pool connections", len(connections))
+
+    async def _warm_connection(self, connection: AsyncConnection) -> None:
+        try:
+            async with connection.cursor() as cursor:
+                for table in REFERENCE_TABLES:
+                    await cursor.execute(f"SELECT * FROM {table};")
+                    await cursor.fetchall()
+        finally:
+            await connection.rollback()
+
+    async def _load_profiles(self) -> int:
+        if self.profiles_limit <= 0:
+            return 0
+        # Подписка сбрасывает кэш целиком: загружать профили до нее бесполезно
+        await asyncio.wait_for(user_profile_cache.subscribed.wait(), timeout=SUBSCRIBE_TIMEOUT)
+        loaded = 0
+        async with self.db_pool.connection() as connection:
+            user_ids = await get_recently_active_user_ids(
+                connection, days=self.profiles_days, limit=self.profiles_limit
+            )
+            for start in range(0, len(user_ids), PROFILES_CHUNK):
+                chunk = user_ids[start:start + PROFILES_CHUNK]
+                loaded += len(await get_users_by_ids(connection, user_ids=chunk))
+        return loaded
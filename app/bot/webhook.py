@@ -0,0 +1,133 @@
+import asyncio
+import hmac
+import logging
+import signal
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.types import Update
+from aiohttp import web
+from app.bot.executor import SUBMIT_NOWAIT, ShardedUpdateExecutor
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookReceiver:
+    '''
+    Принимает апдейты от Telegram по HTTP и отвечает `200 OK`, только когда апдейт
+    поставлен в очередь `ShardedUpdateExecutor`. Если очередь его чата заполнена,
+    отвечает `503` - Telegram повторит апдейт позже, а в памяти не копятся
+    принятые, но не поставленные в очередь апдейты. Порядок и число одновременно
+    обрабатываемых апдейтов определяет исполнитель
+    '''
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        executor: ShardedUpdateExecutor,
+        *,
+        secret_token: str | None,
+        retry_after: int = 1,
+    ) -> None:
+        self.dp = dp
+        self.bot = bot
+        self.executor = executor
+        self.secret_token = secret_token
+        self.retry_after = retry_after
+
+    def register(self, app: web.Application, path: str) -> None:
+        app.router.add_post(path, self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret_token and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ""), self.secret_token
+        ):
+            logger.warning("Rejected webhook request with invalid secret token from %s", request.remote)
+            return web.Response(status=401)
+
+        try:
+            raw_update: dict[str, Any] = await request.json(loads=self.bot.session.json_loads)
+            update = Update.model_validate(raw_update, context={"bot": self.bot})
+        except ValueError:
+            return web.Response(status=400)
+
+        try:
+            # Работающий исполнитель только ставит апдейт в очередь - ответ не ждет обработки.
+            # `feed_update`, а не `feed_raw_update`: тот пишет в лог трейсбек каждого отказа
+            result = await self.dp.feed_update(self.bot, update, **{SUBMIT_NOWAIT: True})
+        except asyncio.QueueFull:
+            logger.debug("Update %s is rejected, executor queue is full", update.update_id)
+            return web.Response(status=503, headers={"Retry-After": str(self.retry_after)})
+        except Exception as e:
+            logger.exception("Failed to process update %s: %s", update.update_id, e)
+            return web.Response()
+        if isinstance(result, TelegramMethod):
+            await self.dp.silent_call_request(bot=self.bot, result=result)
+        return web.Response()
+
+    async def drain(self, timeout: float) -> None:
+        '''
+        Дожидается обработки апдейтов, принятых до остановки сервера:
+        все они уже лежат в очередях исполнителя
+        '''
+        left = await self.executor.drain(timeout)
+        if left:
+            logger.warning("%d accepted updates are still queued after %.0fs", left, timeout)
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    executor: ShardedUpdateExecutor,
+    *,
+    host: str,
+    port: int,
+    path: str,
+    base_url: str | None,
+    secret_token: str | None,
+    shutdown_timeout: float,
+) -> None:
+    '''
+    Запускает aiohttp-сервер для приема вебхуков и работает до SIGINT/SIGTERM.
+    Если `base_url` не задан, вебхук в Telegram не регистрируется - так сервер
+    можно проверять локально, отправляя JSON апдейтов POST-запросом на `path`
+    '''
+    receiver = WebhookReceiver(dp, bot, executor, secret_token=secret_token)
+    app = web.Application()
+    receiver.register(app, path)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    try:
+        await site.start()
+        logger.info("Webhook server is listening on %s:%d%s", host, port, path)
+        if base_url:
+            await bot.set_webhook(
+                url=f"{base_url.rstrip('/')}{path}",
+                secret_token=secret_token,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logger.info("Webhook is set to %s%s", base_url.rstrip("/"), path)
+        await stop_event.wait()
+    finally:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+        # Сначала перестаем принимать запросы, затем дожидаемся уже принятых апдейтов
+        await site.stop()
+        await receiver.drain(timeout=shutdown_timeout)
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+        await bot.session.close()
+        logger.info("Webhook server stopped")
@@ -0,0 +1,48 @@
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import date, timedelta
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "stats:active_users:"
+
+
+class DailyActiveUsers:
+    '''
+    Число уникальных активных пользователей по дням в Redis HyperLogLog:
+    ~12 КБ на день независимо от числа пользователей, погрешность около 0.8%.
+    Счетчик за период - объединение дневных HLL в `PFCOUNT`, без пересчета по БД
+    '''
+    def __init__(self, redis: Redis, retention_days: int = 35) -> None:
+        self._redis = redis
+        self.retention_days = retention_days
+
+    @staticmethod
+    def _key(day: date) -> str:
+        return f"{KEY_PREFIX}{day.isoformat()}"
+
+    async def add(self, rows: Iterable[tuple[int, date]]) -> None:
+        '''
+        Отмечает пользователей активными в указанные дни (пары user_id, день)
+        '''
+        by_day: dict[date, list[int]] = defaultdict(list)
+        for user_id, day in rows:
+            by_day[day].append(user_id)
+        if not by_day:
+            return
+        ttl = timedelta(days=self.retention_days)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for day, user_ids in by_day.items():
+                pipe.pfadd(self._key(day), *user_ids)
+                pipe.expire(self._key(day), ttl)
+            await pipe.execute()
+
+    async def count(self, end: date, days: int = 1) -> int:
+        '''
+        Уникальные активные пользователи за `days` дней, заканчивая днем `end`
+        '''
+        keys = [self._key(end - timedelta(days=offset)) for offset in range(days)]
+        return await self._redis.pfcount(*keys)
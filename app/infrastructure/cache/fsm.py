@@ -0,0 +1,214 @@
+import copy
+import json
+import logging
+from collections.abc import AsyncIterator, Mapping
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    KeyBuilder,
+    StateType,
+    StorageKey,
+)
+from aiogram.fsm.storage.redis import RedisEventIsolation
+from redis.asyncio import Redis
+
+try:
+    import msgpack
+except ImportError:     # msgpack нужен только для FSM_SERIALIZER=msgpack
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+SERIALIZERS = ("json", "msgpack")
+
+
+@dataclass(slots=True)
+class _Entry:
+    state: str | None
+    data: dict[str, Any]
+    state_changed: bool = False
+    data_changed: bool = False
+
+
+@dataclass(slots=True)
+class _Session:
+    entries: dict[StorageKey, _Entry] = field(default_factory=dict)
+
+
+class BufferedRedisStorage(BaseStorage):
+    '''
+    FSM-хранилище в Redis, совместимое по ключам с `RedisStorage` aiogram.
+    Внутри сессии (`session()`, открывается `FSMSessionMiddleware` на время апдейта)
+    состояние и данные ключа читаются одним конвейером при первом обращении,
+    а изменения копятся в памяти и записываются одной транзакцией MULTI при выходе.
+    Вне сессии каждая операция сразу идет в Redis, как в `RedisStorage`.
+
+    Данные сериализуются компактным JSON или msgpack; при чтении формат
+    определяется по первому байту, поэтому сериализатор можно сменить без миграции
+    '''
+    def __init__(
+        self,
+        redis: Redis,
+        *,
+        key_builder: KeyBuilder | None = None,
+        state_ttl: int | None = None,
+        data_ttl: int | None = None,
+        serializer: str = "json",
+    ) -> None:
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"Unknown FSM serializer `{serializer}`, expected one of {SERIALIZERS}")
+        if serializer == "msgpack" and msgpack is None:
+            raise RuntimeError("FSM serializer `msgpack` requires the `msgpack` package")
+        self.redis = redis
+        self.key_builder = key_builder or DefaultKeyBuilder()
+        self.state_ttl = state_ttl
+        self.data_ttl = data_ttl
+        self.serializer = serializer
+        self.reads = 0
+        self.writes = 0
+        self._session: ContextVar[_Session | None] = ContextVar("fsm_session", default=None)
+
+    def create_isolation(self, **kwargs: Any) -> RedisEventIsolation:
+        return RedisEventIsolation(redis=self.redis, key_builder=self.key_builder, **kwargs)
+
+    async def close(self) -> None:
+        '''
+        Клиент Redis общий (кэш профилей, реестр пользователей, меню) и закрывается
+        в `main()` после остановки фоновых задач: если закрыть его здесь, на остановке
+        диспетчера, слушатель инвалидаций зависает на отмене
+        '''
+
+    def _dumps(self, data: dict[str, Any]) -> bytes:
+        if self.serializer == "msgpack":
+            return msgpack.packb(data, use_bin_type=True)
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+    @staticmethod
+    def _loads(value: bytes | str) -> dict[str, Any]:
+        if isinstance(value, str):
+            value = value.encode()
+        # Словарь в JSON начинается с `{`, в msgpack - с байта map (0x80-0x8f, 0xde, 0xdf)
+        if value[:1] == b"{" or msgpack is None:
+            return json.loads(value)
+        return msgpack.unpackb(value, raw=False)
+
+    @staticmethod
+    def _state_name(state: StateType) -> str | None:
+        return state.state if isinstance(state, State) else state
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[None]:
+        '''
+        Буферизует чтения и записи FSM до выхода из блока. Изменения записываются
+        и при исключении в хэндлере - как если бы каждая операция ушла в Redis сразу
+        '''
+        if self._session.get() is not None:
+            yield
+            return
+        token = self._session.set(_Session())
+        try:
+            yield
+        finally:
+            try:
+                await self.flush()
+            finally:
+                self._session.reset(token)
+
+    async def _load(self, key: StorageKey) -> _Entry:
+        session = self._session.get()
+        entry = session.entries.get(key)
+        if entry is not None:
+            return entry
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(self.key_builder.build(key, "state"))
+            pipe.get(self.key_builder.build(key, "data"))
+            state, data = await pipe.execute()
+        self.reads += 1
+        if isinstance(state, bytes):
+            state = state.decode()
+        entry = _Entry(state=state, data=self._loads(data) if data else {})
+        session.entries[key] = entry
+        return entry
+
+    async def flush(self) -> None:
+        '''
+        Записывает накопленные в сессии изменения одной транзакцией
+        '''
+        session = self._session.get()
+        if session is None:
+            return
+        changed = [
+            (key, entry)
+            for key, entry in session.entries.items()
+            if entry.state_changed or entry.data_changed
+        ]
+        if not changed:
+            return
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for key, entry in changed:
+                if entry.state_changed:
+                    self._write_state(pipe, key, entry.state)
+                    entry.state_changed = False
+                if entry.data_changed:
+                    self._write_data(pipe, key, entry.data)
+                    entry.data_changed = False
+            await pipe.execute()
+        self.writes += 1
+
+    def _write_state(self, client: Any, key: StorageKey, state: str | None) -> Any:
+        redis_key = self.key_builder.build(key, "state")
+        if state is None:
+            return client.delete(redis_key)
+        return client.set(redis_key, state, ex=self.state_ttl)
+
+    def _write_data(self, client: Any, key: StorageKey, data: dict[str, Any]) -> Any:
+        redis_key = self.key_builder.build(key, "data")
+        if not data:
+            return client.delete(redis_key)
+        return client.set(redis_key, self._dumps(data), ex=self.data_ttl)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        if self._session.get() is None:
+            value = await self.redis.get(self.key_builder.build(key, "state"))
+            self.reads += 1
+            return value.decode() if isinstance(value, bytes) else value
+        return (await self._load(key)).state
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        if self._session.get() is None:
+            await self._write_state(self.redis, key, self._state_name(state))
+            self.writes += 1
+            return
+        entry = await self._load(key)
+        entry.state = self._state_name(state)
+        entry.state_changed = True
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        if self._session.get() is None:
+            value = await self.redis.get(self.key_builder.build(key, "data"))
+            self.reads += 1
+            return self._loads(value) if value else {}
+        # Копия: изменения словаря без `set_data` не должны попасть в буфер
+        return copy.deepcopy((await self._load(key)).data)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        if self._session.get() is None:
+            await self._write_data(self.redis, key, data)
+            self.writes += 1
+            return
+        entry = await self._load(key)
+        entry.data = copy.deepcopy(data)
+        entry.data_changed = True
+
+    def stats(self) -> dict[str, int]:
+        return {"reads": self.reads, "writes": self.writes}
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Iterable
+from typing import Final
+
+from app.infrastructure.database.models import UserContext
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+# Маркер промаха: `None` в кэше - валидное значение "пользователя нет в БД"
+MISSING: Final = object()
+
+INVALIDATION_CHANNEL: Final = "cache:user_profiles:invalidate"
+
+
+class UserProfileCache:
+    '''
+    Ограниченный по размеру LRU-кэш профилей пользователей (`UserContext`) с TTL.
+    Инвалидации рассылаются через Redis Pub/Sub, чтобы несколько процессов бота
+    не отдавали устаревшие язык, роль и флаги бана.
+    Читатель берет `generation(user_id)` до запроса в БД и передает его в `set`:
+    если профиль успели сбросить, пока шел запрос, прочитанная строка могла
+    устареть, и в кэш она не попадает
+    '''
+    def __init__(self, maxsize: int = 10_000, ttl: float = 300.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_sets = 0
+        self._entries: OrderedDict[int, tuple[float, UserContext | None]] = OrderedDict()
+        # Поколения сбрасывавшихся профилей: user_id -> номер последнего сброса.
+        # Хранятся последние `maxsize` сбросов; у остальных поколение - `_floor`,
+        # не меньше номера любого вытесненного сброса
+        self._generations: OrderedDict[int, int] = OrderedDict()
+        self._last_generation = 0
+        self._floor = 0
+        self._redis: Redis | None = None
+        self._node_id = uuid.uuid4().hex
+        # Установлен, пока слушатель подписан на канал инвалидаций
+        self.subscribed = asyncio.Event()
+
+    def configure(self, *, maxsize: int, ttl: float, redis: Redis | None = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._redis = redis
+        self.clear()
+
+    def get(self, user_id: int) -> UserContext | None | object:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+
+        expires_at, user_context = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            self.misses += 1
+            return MISSING
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return user_context
+
+    def generation(self, user_id: int) -> int:
+        '''
+        Поколение профиля: меняется при каждом его сбросе
+        '''
+        return self._generations.get(user_id, self._floor)
+
+    def set(
+        self,
+        user_id: int,
+        user_context: UserContext | None,
+        generation: int | None = None,
+    ) -> None:
+        '''
+        Кладет профиль в кэш. С `generation` - только если профиль не сбрасывали
+        с момента, когда это поколение было прочитано
+        '''
+        if self.maxsize <= 0:
+            return
+        if generation is not None and self.generation(user_id) != generation:
+            self.stale_sets += 1
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl, user_context)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def drop(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+        self._last_generation += 1
+        self._generations[user_id] = self._last_generation
+        self._generations.move_to_end(user_id)
+        if len(self._generations) > max(self.maxsize, 1):
+            _, self._floor = self._generations.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        # Все прочитанные до сброса поколения перестают совпадать
+        self._generations.clear()
+        self._last_generation += 1
+        self._floor = self._last_generation
+
+    async def invalidate(self, user_id: int) -> None:
+        '''
+        Удаляет профиль из локального кэша и оповещает остальные процессы бота
+        '''
+        await self.invalidate_many((user_id,))
+
+    async def invalidate_many(self, user_ids: Iterable[int]) -> None:
+        '''
+        То же, что `invalidate`, но для пачки пользователей одним сообщением
+        '''
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        for user_id in user_ids:
+            self.drop(user_id)
+        if self._redis is None:
+            return
+        payload = ",".join(map(str, user_ids))
+        try:
+            await self._redis.publish(INVALIDATION_CHANNEL, f"{self._node_id}:{payload}")
+        except Exception as e:
+            # Потерянная инвалидация ограничена TTL записи у соседей
+            logger.warning(
+                "Failed to broadcast cache invalidation for %d users: %s", len(user_ids), e
+            )
+
+    async def listen(self, retry_delay: float = 1.0, max_retry_delay: float = 30.0) -> None:
+        '''
+        Слушает канал инвалидаций, пока задачу не отменят.
+        После переподключения кэш сбрасывается целиком - часть сообщений могла потеряться
+        '''
+        if self._redis is None:
+            raise RuntimeError("Redis client is not configured for the profile cache.")
+
+        delay = retry_delay
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                self.clear()
+                self.subscribed.set()
+                delay = retry_delay
+                logger.info("Subscribed to `%s`", INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    payload = message["data"]
+                    if isinstance(payload, bytes):
+                        payload = payload.decode()
+                    node_id, _, user_ids = payload.partition(":")
+                    if node_id != self._node_id:
+                        for user_id in user_ids.split(","):
+                            self.drop(int(user_id))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Profile cache invalidation listener failed: %s", e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_retry_delay)
+            finally:
+                self.subscribed.clear()
+                await pubsub.aclose()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "stale_sets": self.stale_sets,
+        }
+
+
+# Кэш уровня процесса: настраивается в `main()` и используется функциями `db.py`
+user_profile_cache = UserProfileCache()
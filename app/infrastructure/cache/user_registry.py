@@ -0,0 +1,154 @@
+import logging
+import time
+from collections.abc import Iterable
+from typing import Final
+
+from psycopg import AsyncConnection
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_KEY: Final = "users:status"
+# Служебное поле: реестр заполнен из БД и поддерживается записями `db.py`
+BUILT_FIELD: Final = "__built__"
+
+BANNED: Final = "1"
+ACTIVE: Final = "0"
+
+# Маркер "реестр не может ответить" - проверку нужно делать по БД
+UNAVAILABLE: Final = object()
+
+
+class UserRegistry:
+    '''
+    Реестр зарегистрированных пользователей и их бана в хэше Redis
+    (user_id -> "1" забанен / "0" нет, нет поля - пользователь неизвестен).
+    Позволяет отсеять забаненных и незарегистрированных пользователей одной командой
+    Redis, не занимая соединение с БД. Заполняется из `users` одним запросом,
+    дальше изменения вносят функции `db.py` после фиксации транзакции.
+    Записи, которые не дошли до Redis, процесс хранит у себя и повторяет не чаще
+    `retry_interval` секунд; пока они не записаны, `status()` отвечает `UNAVAILABLE`
+    '''
+    def __init__(self, *, retry_interval: float = 5.0) -> None:
+        self._redis: Redis | None = None
+        self.retry_interval = retry_interval
+        # user_id -> (значение, только если поля еще нет)
+        self._pending: dict[int, tuple[str, bool]] = {}
+        self._retry_at = 0.0
+
+    def configure(self, *, redis: Redis | None) -> None:
+        self._redis = redis
+
+    async def status(self, user_id: int) -> str | None | object:
+        '''
+        Возвращает `BANNED`, `ACTIVE`, `None` для неизвестного пользователя
+        или `UNAVAILABLE`, если реестр не заполнен или Redis недоступен
+        '''
+        if self._redis is None:
+            return UNAVAILABLE
+        # Реестр разошелся с БД, пока неудавшиеся записи не повторены
+        if self._pending and not await self._retry():
+            return UNAVAILABLE
+        try:
+            value, built = await self._redis.hmget(REGISTRY_KEY, str(user_id), BUILT_FIELD)
+        except Exception as e:
+            logger.warning("User registry lookup failed: %s", e)
+            return UNAVAILABLE
+        if built is None:
+            return UNAVAILABLE
+        return value.decode() if isinstance(value, bytes) else value
+
+    async def build(self, conn: AsyncConnection, *, batch_size: int = 10_000) -> int:
+        '''
+        Заполняет реестр из таблицы `users`, если он еще не заполнен.
+        Записи копируются серверным курсором пачками, чтобы не держать всех
+        пользователей в памяти. Возвращает число загруженных пользователей
+        '''
+        if self._redis is None:
+            return 0
+        if await self._redis.hexists(REGISTRY_KEY, BUILT_FIELD):
+            return 0
+
+        loaded = 0
+        async with conn.transaction():
+            async with conn.cursor(name="user_registry_build") as cursor:
+                await cursor.execute("SELECT user_id, banned FROM users;")
+                while rows := await cursor.fetchmany(batch_size):
+                    # HSETNX: статус, записанный параллельно функциями `db.py`, свежее снимка
+                    async with self._redis.pipeline(transaction=False) as pipe:
+                        for user_id, banned in rows:
+                            pipe.hsetnx(REGISTRY_KEY, str(user_id), BANNED if banned else ACTIVE)
+                        await pipe.execute()
+                    loaded += len(rows)
+        await self._redis.hset(REGISTRY_KEY, BUILT_FIELD, "1")
+        logger.info("User registry built: %d users", loaded)
+        return loaded
+
+    async def add(self, user_ids: Iterable[int], *, banned: bool = False) -> None:
+        '''
+        Отмечает новых пользователей известными, не трогая статус уже известных
+        '''
+        await self._write(user_ids, BANNED if banned else ACTIVE, only_new=True)
+
+    async def set_banned(self, user_ids: Iterable[int], banned: bool) -> None:
+        await self._write(user_ids, BANNED if banned else ACTIVE, only_new=False)
+
+    @staticmethod
+    def _merge(older: dict[int, tuple[str, bool]], newer: dict[int, tuple[str, bool]]) -> None:
+        '''
+        Дописывает в `older` более новые записи: HSETNX не перекрывает HSET того же поля
+        '''
+        for user_id, (value, only_new) in newer.items():
+            if only_new and user_id in older:
+                continue
+            older[user_id] = (value, only_new)
+
+    async def _write(self, user_ids: Iterable[int], value: str, *, only_new: bool) -> None:
+        if self._redis is None:
+            return
+        writes = {user_id: (value, only_new) for user_id in user_ids}
+        if not writes:
+            return
+        # Неудавшиеся раньше записи уходят вместе с новыми
+        pending, self._pending = self._pending, {}
+        self._merge(pending, writes)
+        await self._send(pending)
+
+    async def _retry(self) -> bool:
+        now = time.monotonic()
+        if now < self._retry_at:
+            return False
+        pending, self._pending = self._pending, {}
+        if await self._send(pending):
+            logger.info("User registry is consistent again: %d writes retried", len(pending))
+            return True
+        return False
+
+    async def _send(self, writes: dict[int, tuple[str, bool]]) -> bool:
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for user_id, (value, only_new) in writes.items():
+                    if only_new:
+                        pipe.hsetnx(REGISTRY_KEY, str(user_id), value)
+                    else:
+                        pipe.hset(REGISTRY_KEY, str(user_id), value)
+                await pipe.execute()
+        except Exception as e:
+            # Записи, поставленные параллельно, новее неудавшихся
+            self._merge(writes, self._pending)
+            self._pending = writes
+            self._retry_at = time.monotonic() + self.retry_interval
+            logger.error("Failed to update user registry for %d users: %s", len(writes), e)
+            # Другие процессы до пересборки реестра при старте проверяют бан по БД.
+            # Если Redis недоступен, сброс тоже не пройдет - тогда этот процесс
+            # отвечает `UNAVAILABLE` по своим неудавшимся записям
+            try:
+                await self._redis.hdel(REGISTRY_KEY, BUILT_FIELD)
+            except Exception:
+                pass
+            return False
+        return True
+
+
+# Реестр уровня процесса: настраивается в `main()` и используется функциями `db.py`
+user_registry = UserRegistry()
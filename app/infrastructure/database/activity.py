@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import date, datetime, timezone
+
+from app.infrastructure.cache.active_users import DailyActiveUsers
+from app.infrastructure.database.db import add_users_activity
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityBuffer:
+    '''
+    Копит счетчики активности пользователей в памяти и периодически сбрасывает
+    их в таблицу `activity` одним пакетным запросом вместо записи на каждый апдейт.
+    Те же пользователи отмечаются в дневных счетчиках уникальных `active_users`
+    '''
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        flush_interval: float = 5.0,
+        max_batch_size: int = 1000,
+        active_users: DailyActiveUsers | None = None,
+    ) -> None:
+        self._pool = pool
+        self._active_users = active_users
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self._counters: Counter[tuple[int, date]] = Counter()
+        self._flush_requested = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def record(self, user_id: int, actions: int = 1) -> None:
+        self._counters[(user_id, datetime.now(timezone.utc).date())] += actions
+        if len(self._counters) >= self.max_batch_size:
+            self._flush_requested.set()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            while self._counters:
+                batch: list[tuple[int, date, int]] = []
+                for (user_id, activity_date), actions in self._counters.items():
+                    batch.append((user_id, activity_date, actions))
+                    if len(batch) >= self.max_batch_size:
+                        break
+                for user_id, activity_date, _ in batch:
+                    del self._counters[(user_id, activity_date)]
+
+                try:
+                    async with self._pool.connection() as connection:
+                        await add_users_activity(connection, rows=batch)
+                except BaseException as e:
+                    # Возвращаем счетчики в буфер (в т.ч. при отмене задачи на остановке),
+                    # чтобы не потерять их до следующей попытки
+                    for user_id, activity_date, actions in batch:
+                        self._counters[(user_id, activity_date)] += actions
+                    if not isinstance(e, asyncio.CancelledError):
+                        logger.warning("Failed to flush %d activity rows: %s", len(batch), e)
+                    raise
+
+                if self._active_users is not None:
+                    try:
+                        await self._active_users.add(
+                            (user_id, activity_date) for user_id, activity_date, _ in batch
+                        )
+                    except Exception as e:
+                        # Счетчик уникальных приблизительный: пропуск пачки не повторяем
+                        logger.warning("Failed to record %d active users: %s", len(batch), e)
+
+    async def run(self) -> None:
+        '''
+        Сбрасывает буфер раз в `flush_interval` секунд или раньше, если он заполнился
+        '''
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # Ошибка уже залогирована, счетчики остались в буфере до следующей попытки
+                pass
+
+    async def close(self) -> None:
+        '''
+        Сбрасывает накопленные счетчики при остановке бота
+        '''
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Activity counters were lost on shutdown: %s", e)
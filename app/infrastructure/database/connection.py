@@ -1,8 +1,11 @@
+import asyncio
 import logging
+from collections.abc import Awaitable, Callable
 from urllib.parse import quote
 
+from app.infrastructure.metrics import pool_available, pool_requests_waiting, pool_size
 from psycopg import AsyncConnection
-from psycopg_pool import AsyncConnectionPool
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +34,10 @@ async def log_db_version(connection: AsyncConnection) -> None:
             await cursor.execute("SELECT version();")
             db_version = await cursor.fetchone()
             logger.info(f"Connected to PostgreSQL version: {db_version[0]}")
+        # Запрос открыл неявную транзакцию - закрываем ее, иначе соединение
+        # нельзя перевести в autocommit (миграции, скрипты). Именно COMMIT:
+        # ROLLBACK сбрасывает кэш подготовленных запросов psycopg, прогретый хуком пула
+        await connection.commit()
     except Exception as e:
         logger.warning("Failed to fetch DB version: %s", e)
 
@@ -67,19 +74,49 @@ async def get_pg_pool(
     min_size: int = 1,
     max_size: int = 3,
     timeout: float = 10.0,
+    max_idle: float = 600.0,
+    max_lifetime: float = 3600.0,
+    max_waiting: int = 0,
+    reconnect_timeout: float = 300.0,
+    open_attempts: int = 5,
+    open_backoff: float = 1.0,
+    configure: Callable[[AsyncConnection], Awaitable[None]] | None = None,
 ) -> AsyncConnectionPool:
     conninfo = build_pg_conninfo(db_name, host, port, user, password)
 
-    try:
-        db_pool = AsyncConnectionPool(
+    def create_pool() -> AsyncConnectionPool:
+        return AsyncConnectionPool(
             conninfo=conninfo,
             min_size=min_size,
             max_size=max_size,
             timeout=timeout,
+            max_idle=max_idle,
+            max_lifetime=max_lifetime,
+            max_waiting=max_waiting,
+            reconnect_timeout=reconnect_timeout,
+            configure=configure,
             open=False,
         )
 
-        await db_pool.open()
+    try:
+        # Ждем `min_size` соединений, делая паузы с экспоненциальным ростом между попытками:
+        # при одновременном старте с Postgres (docker compose) база может быть еще не готова.
+        # Пул, не дождавшийся соединений, закрывается сам - на каждую попытку создаем новый
+        delay = open_backoff
+        for attempt in range(1, open_attempts + 1):
+            db_pool = create_pool()
+            try:
+                await db_pool.open(wait=True, timeout=timeout)
+                break
+            except PoolTimeout as e:
+                if attempt == open_attempts:
+                    raise
+                logger.warning(
+                    "PostgreSQL pool is not ready (attempt %d/%d): %s. Retrying in %.1f s",
+                    attempt, open_attempts, e, delay,
+                )
+                await asyncio.sleep(delay)
+                delay *= 2
 
         async with db_pool.connection() as connection:
             await log_db_version(connection)
@@ -88,3 +125,35 @@ async def get_pg_pool(
     except Exception as e:
         logger.exception("Failed to initialize PostgreSQL pool: %s", e)
         raise
+
+
+# Корутина, периодически логирующая состояние пула соединений.
+# Счетчики сбрасываются после каждого отчета, поэтому значения относятся к интервалу
+async def report_pool_stats(pool: AsyncConnectionPool, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        stats = pool.pop_stats()
+        requests_num = stats.get("requests_num", 0)
+        logger.info(
+            "Pool stats: size=%d, in_use=%d, requests_waiting=%d, requests=%d, "
+            "avg_wait_ms=%.1f, requests_errors=%d, connections_errors=%d, connections_lost=%d",
+            stats.get("pool_size", 0),
+            stats.get("pool_size", 0) - stats.get("pool_available", 0),
+            stats.get("requests_waiting", 0),
+            requests_num,
+            stats.get("requests_wait_ms", 0) / requests_num if requests_num else 0.0,
+            stats.get("requests_errors", 0),
+            stats.get("connections_errors", 0),
+            stats.get("connections_lost", 0),
+        )
+
+
+def collect_pool_metrics(pool: AsyncConnectionPool) -> None:
+    '''
+    Коллектор реестра метрик: текущее состояние пула. Использует `get_stats()`,
+    чтобы не сбрасывать счетчики, которые читает `report_pool_stats`
+    '''
+    stats = pool.get_stats()
+    pool_size.set(stats.get("pool_size", 0))
+    pool_available.set(stats.get("pool_available", 0))
+    pool_requests_waiting.set(stats.get("requests_waiting", 0))
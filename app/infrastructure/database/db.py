@@ -1,12 +1,72 @@
 import logging
-from datetime import datetime, timezone
-# from app.bot.enums.roles import UserRole
+from collections.abc import Iterable, Sequence
+from datetime import date, datetime, timezone
+from functools import partial
+from app.infrastructure.cache.profiles import MISSING, user_profile_cache
+from app.infrastructure.cache.user_registry import user_registry
+from app.infrastructure.database.lazy import (
+    LazyConnection,
+    after_commit,
+    after_transaction,
+    ensure_transaction,
+)
+from app.infrastructure.database.models import (
+    NewUser,
+    TaskCursor,
+    TaskItem,
+    TasksPage,
+    UserContext,
+)
+from app.infrastructure.database.queries import query_registry
 from psycopg import AsyncConnection
+from psycopg.rows import class_row
 from typing import Any
 
 
 logger = logging.getLogger(__name__)
 
+# Несуществующие user_id (id пользователей Telegram положительны) для прогрева запросов
+# на новом соединении: id до 2^31 передается как integer, больше - как bigint, это два
+# разных подготовленных запроса. Обновления с ними не затрагивают ни одной строки
+WARM_USER_IDS = (-2**31, -2**31 - 1)
+
+
+async def _invalidate_profiles(
+    conn: AsyncConnection | LazyConnection,
+    user_ids: Iterable[int],
+) -> None:
+    '''
+    Сбрасывает профили в локальном кэше сразу, а рассылку другим процессам
+    откладывает до завершения транзакции, чтобы соседи не перечитали старые данные
+    '''
+    user_ids = list(user_ids)
+    for user_id in user_ids:
+        user_profile_cache.drop(user_id)
+    await after_transaction(conn, partial(user_profile_cache.invalidate_many, user_ids))
+
+
+async def _update_registry_bans(
+    conn: AsyncConnection | LazyConnection,
+    user_ids: Iterable[int],
+    banned: bool,
+) -> None:
+    '''
+    Переносит смену бана в реестр пользователей после успешной фиксации транзакции
+    '''
+    user_ids = list(user_ids)
+    if user_ids:
+        await after_commit(conn, partial(user_registry.set_banned, user_ids, banned))
+
+
+ADD_USER = query_registry.register(
+    "add_user",
+    """
+    INSERT INTO users(user_id, username, firstname, lastname, language, role)
+    VALUES(%s, %s, %s, %s, %s, %s)
+    ON CONFLICT DO NOTHING;
+    """,
+)
+
 
 async def add_user(
     conn: AsyncConnection,
@@ -16,40 +76,49 @@ async def add_user(
     lastname: str,
     username: str | None = None,
     language: str = "ru",
+    role: str = "user",
 ) -> None:
     '''
     Функция для добавления пользователя в систему
     '''
+    await ensure_transaction(conn)
     async with conn.cursor() as cursor:
-        await cursor.execute(
-            query="""
-                INSERT INTO users(user_id, username, firstname, lastname, language)
-                VALUES(
-                    %(user_id)s,
-                    %(username)s,
-                    %(firstname)s,
-                    %(lastname)s,
-                    %(language)s
-                ) ON CONFLICT DO NOTHING;
-            """,
-            params={
-                "user_id": user_id,
-                "username": username,
-                "firstname": firstname,
-                "lastname": lastname,
-                "language": language
-            },
+        await query_registry.execute(
+            cursor,
+            ADD_USER,
+            params=(user_id, username, firstname, lastname, language, role),
         )
-    logger.info(
+    await _invalidate_profiles(conn, (user_id,))
+    await after_commit(conn, partial(user_registry.add, (user_id,)))
+    logger.debug(
         "User added. Table=`%s`, user_id=%d, created_at='%s', "
-        "language='%s'",
+        "language='%s', role=%s",
         "users",
         user_id,
         datetime.now(timezone.utc),
         language,
+        role,
     )
 
 
+GET_USER = query_registry.register(
+    "get_user",
+    """
+    SELECT
+        id,
+        user_id,
+        username,
+        firstname,
+        lastname,
+        language,
+        is_alive,
+        banned,
+        created_at
+        FROM users WHERE user_id = %s;
+    """,
+)
+
+
 async def get_user(
     conn: AsyncConnection,
     *,
@@ -59,27 +128,73 @@ async def get_user(
     Функция для получения информации о пользователе по его user_id
     '''
     async with conn.cursor() as cursor:
-        data = await cursor.execute(
-            query="""
-                SELECT
-                    id,
-                    user_id,
-                    username,
-                    firstname,
-                    lastname,
-                    language,
-                    is_alive,
-                    banned,
-                    created_at
-                    FROM users WHERE user_id = %s;
-            """,
+        data = await query_registry.execute(
+            cursor,
+            GET_USER,
             params=(user_id,),
         )
         row = await data.fetchone()
-    logger.info("Row is %s", row)
+    logger.debug("Row is %s", row)
     return row if row else None
 
 
+LOAD_USER_CONTEXT = query_registry.register(
+    "load_user_context",
+    """
+    SELECT
+        user_id,
+        role,
+        language,
+        banned,
+        is_alive,
+        created_at
+        FROM users WHERE user_id = %s;
+    """,
+    warm=[(user_id,) for user_id in WARM_USER_IDS],
+)
+
+
+async def load_user_context(
+    conn: AsyncConnection,
+    *,
+    user_id: int,
+) -> UserContext | None:
+    '''
+    Функция для получения роли, языка и статусов пользователя одним запросом.
+    Результат кладется middleware в `data["user_context"]` и переиспользуется
+    фильтрами и хэндлерами в рамках апдейта. Ответ кэшируется в `user_profile_cache`
+    '''
+    cached = user_profile_cache.get(user_id)
+    if cached is not MISSING:
+        return cached
+
+    # Поколение читается до запроса: если профиль сбросят, пока запрос идет,
+    # прочитанная до фиксации чужой транзакции строка в кэш не попадет
+    generation = user_profile_cache.generation(user_id)
+    async with conn.cursor(row_factory=class_row(UserContext)) as cursor:
+        data = await query_registry.execute(
+            cursor,
+            LOAD_USER_CONTEXT,
+            params=(user_id,),
+        )
+        user_context = await data.fetchone()
+    if user_context is None:
+        logger.debug("No user with `user_id`=%s found in the database", user_id)
+    user_profile_cache.set(user_id, user_context, generation)
+    return user_context
+
+
+CHANGE_USER_ALIVE_STATUS = query_registry.register(
+    "change_user_alive_status",
+    """
+    UPDATE users
+    SET is_alive = %s
+    WHERE user_id = %s;
+    """,
+    warm=[(True, user_id) for user_id in WARM_USER_IDS],
+)
+
+
 async def change_user_alive_status(
     conn: AsyncConnection,
     *,
@@ -89,16 +204,27 @@ async def change_user_alive_status(
     '''
     Функция для смены статуса активности юзера user_id
     '''
+    await ensure_transaction(conn)
     async with conn.cursor() as cursor:
-        await cursor.execute(
-            query="""
-                UPDATE users
-                SET is_alive = %s
-                WHERE user_id = %s;
-            """,
+        await query_registry.execute(
+            cursor,
+            CHANGE_USER_ALIVE_STATUS,
             params=(is_alive, user_id)
         )
-    logger.info("Updated `is_alive` status to `%s` for user %d", is_alive, user_id)
+    await _invalidate_profiles(conn, (user_id,))
+    logger.debug("Updated `is_alive` status to `%s` for user %d", is_alive, user_id)
+
+
+CHANGE_USER_BANNED_STATUS_BY_ID = query_registry.register(
+    "change_user_banned_status_by_id",
+    """
+    UPDATE users
+    SET banned = %s
+    WHERE user_id = %s
+    RETURNING user_id
+    """,
+    warm=[(False, user_id) for user_id in WARM_USER_IDS],
+)
 
 
 async def change_user_banned_status_by_id(
@@ -110,16 +236,61 @@ async def change_user_banned_status_by_id(
     '''
     Функция для смены статуса юзера user_id (забанен или нет)
     '''
+    await ensure_transaction(conn)
     async with conn.cursor() as cursor:
-        await cursor.execute(
-            query="""
-                UPDATE users
-                SET banned = %s
-                WHERE user_id = %s
-            """,
+        data = await query_registry.execute(
+            cursor,
+            CHANGE_USER_BANNED_STATUS_BY_ID,
             params=(banned, user_id)
         )
-    logger.info("Updated `banned` status to `%s` for user %d", banned, user_id)
+        rows = await data.fetchall()
+    await _invalidate_profiles(conn, (user_id,))
+    await _update_registry_bans(conn, (row[0] for row in rows), banned)
+    logger.debug("Updated `banned` status to `%s` for user %d", banned, user_id)
+
+
+CHANGE_USER_BANNED_STATUS_BY_USERNAME = query_registry.register(
+    "change_user_banned_status_by_username",
+    """
+    UPDATE users
+    SET banned = %s
+    WHERE username = %s
+    RETURNING user_id
+    """,
+)
+
+
+async def change_user_banned_status_by_username(
+    conn: AsyncConnection,
+    *,
+    banned: bool,
+    username: str,
+) -> None:
+    '''
+    Функция для смены статуса юзера по его username (забанен или нет)
+    '''
+    await ensure_transaction(conn)
+    async with conn.cursor() as cursor:
+        data = await query_registry.execute(
+            cursor,
+            CHANGE_USER_BANNED_STATUS_BY_USERNAME,
+            params=(banned, username)
+        )
+        rows = await data.fetchall()
+    await _invalidate_profiles(conn, (row[0] for row in rows))
+    await _update_registry_bans(conn, (row[0] for row in rows), banned)
+    logger.debug("Updated `banned` status to `%s` for username %s", banned, username)
+
+
+UPDATE_USER_LANG = query_registry.register(
+    "update_user_lang",
+    """
+    UPDATE users
+    SET language = %s
+    WHERE user_id = %s
+    """,
+    warm=[("ru", user_id) for user_id in WARM_USER_IDS],
+)
 
 
 async def update_user_lang(
@@ -131,17 +302,16 @@ async def update_user_lang(
     '''
         Функция для изменения языка для пользователя user_id
     '''
+    await ensure_transaction(conn)
     async with conn.cursor() as cursor:
-        await cursor.execute(
-            query="""
-                UPDATE users
-                SET language = %s
-                WHERE user_id = %s
-            """,
+        await query_registry.execute(
+            cursor,
+            UPDATE_USER_LANG,
             params=(language, user_id)
         )
-    logger.info("The language `%s` is set for the user `%s`",
-                language, user_id)
+    await _invalidate_profiles(conn, (user_id,))
+    logger.debug("The language `%s` is set for the user `%s`",
+                 language, user_id)
 
 
 async def get_user_lang(
@@ -152,22 +322,14 @@ async def get_user_lang(
     '''
     Функция для получения языка пользователя
     '''
-    async with conn.cursor() as cursor:
-        data = await cursor.execute(
-            query="""
-                SELECT language FROM users WHERE user_id = %s;
-            """,
-            params=(user_id,),
+    user_context = await load_user_context(conn, user_id=user_id)
+    if user_context:
+        logger.debug(
+            "The user with `user_id`=%s has the language %s", user_id, user_context.language
         )
-        row = await data.fetchone()
-    if row:
-        logger.info("The user with `user_id`=%s has the language %s", user_id, row[0])
     else:
-        logger.warning(
-            "No user with `user_id`=%s found in the database",
-            user_id
-            )
-    return row[0] if row else None
+        logger.warning("No user with `user_id`=%s found in the database", user_id)
+    return user_context.language if user_context else None
 
 
 async def get_user_alive_status(
@@ -178,19 +340,14 @@ async def get_user_alive_status(
     '''
     Функция для получения статуса пользователя
     '''
-    async with conn.cursor() as cursor:
-        data = await cursor.execute(
-            query="""
-                SELECT is_alive FROM users WHERE user_id = %s;
-            """,
-            params=(user_id,),
+    user_context = await load_user_context(conn, user_id=user_id)
+    if user_context:
+        logger.debug(
+            "The user with `user_id`=%s has the is_alive status is %s", user_id, user_context.is_alive
         )
-        row = await data.fetchone()
-    if row:
-        logger.info("The user with `user_id`=%s has the is_alive status is %s", user_id, row[0])
     else:
         logger.warning("No user with `user_id`=%s found in the database", user_id)
-    return row[0] if row else None
+    return user_context.is_alive if user_context else None
 
 
 async def get_user_banned_status_by_id(
@@ -201,16 +358,673 @@ async def get_user_banned_status_by_id(
     '''
     Функция для получения статуса пользователя (забанен или нет)
     '''
+    user_context = await load_user_context(conn, user_id=user_id)
+    if user_context:
+        logger.debug(
+            "The user with `user_id`=%s has the banned status is %s", user_id, user_context.banned
+        )
+    else:
+        logger.warning("No user with `user_id`=%s found in the database", user_id)
+    return user_context.banned if user_context else None
+
+
+GET_USER_BANNED_STATUS_BY_USERNAME = query_registry.register(
+    "get_user_banned_status_by_username",
+    """
+    SELECT banned FROM users WHERE username = %s;
+    """,
+)
+
+
+async def get_user_banned_status_by_username(
+    conn: AsyncConnection,
+    *,
+    username: str,
+) -> bool | None:
+    '''
+    Функция для получения статуса пользователя по его username (забанен или нет)
+    '''
     async with conn.cursor() as cursor:
-        data = await cursor.execute(
-            query="""
-                SELECT banned FROM users WHERE user_id = %s;
-            """,
-            params=(user_id,),
+        data = await query_registry.execute(
+            cursor,
+            GET_USER_BANNED_STATUS_BY_USERNAME,
+            params=(username,),
         )
         row = await data.fetchone()
     if row:
-        logger.info("The user with `user_id`=%s has the banned status is %s", user_id, row[0])
+        logger.debug("The user with `username`=%s has the banned status is %s", username, row[0])
     else:
-        logger.warning("No user with `user_id`=%s found in the database", user_id)
+        logger.warning("No user with `username`=%s found in the database", username)
     return row[0] if row else None
+
+
+ADD_USERS_ACTIVITY = query_registry.register(
+    "add_users_activity",
+    """
+    WITH batch AS (
+        SELECT a.user_id, a.activity_date, a.actions
+        FROM unnest(%s::bigint[], %s::date[], %s::int[])
+            AS a(user_id, activity_date, actions)
+        JOIN users u ON u.user_id = a.user_id
+    ),
+    daily AS (
+        INSERT INTO activity(user_id, activity_date, actions)
+        SELECT user_id, activity_date, actions
+        FROM batch
+        ON CONFLICT (user_id, activity_date)
+        DO UPDATE SET actions = activity.actions + EXCLUDED.actions
+    )
+    INSERT INTO activity_totals(user_id, total_actions)
+    SELECT user_id, SUM(actions)
+    FROM batch
+    GROUP BY user_id
+    ORDER BY user_id
+    ON CONFLICT (user_id)
+    DO UPDATE SET total_actions = activity_totals.total_actions + EXCLUDED.total_actions;
+    """,
+)
+
+
+async def add_users_activity(
+    conn: AsyncConnection,
+    *,
+    rows: Sequence[tuple[int, date, int]],
+) -> None:
+    '''
+    Функция для пакетного начисления действий пользователям за день.
+    Принимает строки (user_id, activity_date, actions) и одним запросом пишет их
+    в `activity` и прибавляет к итогам в `activity_totals`.
+    Строки незарегистрированных пользователей отбрасываются
+    '''
+    if not rows:
+        return
+    user_ids, dates, actions = (list(column) for column in zip(*rows))
+    await ensure_transaction(conn)
+    async with conn.cursor() as cursor:
+        await query_registry.execute(
+            cursor,
+            ADD_USERS_ACTIVITY,
+            params=(user_ids, dates, actions),
+        )
+    logger.info("User activity flushed. Table=`%s`, rows=%d", "activity", len(rows))
+
+
+GET_STATISTICS = query_registry.register(
+    "get_statistics",
+    """
+    SELECT user_id, total_actions
+    FROM activity_totals
+    ORDER BY total_actions DESC, user_id
+    LIMIT %s;
+    """,
+    # Лимит по умолчанию `get_statistics`
+    warm=[(5,)],
+)
+
+
+async def get_statistics(
+    conn: AsyncConnection,
+    *,
+    limit: int = 5,
+) -> list[tuple[int, int]]:
+    '''
+    Функция для получения самых активных пользователей бота.
+    Читает первые строки индекса по `activity_totals`, поэтому не зависит от объема истории
+    '''
+    async with conn.cursor() as cursor:
+        data = await query_registry.execute(
+            cursor,
+            GET_STATISTICS,
+            params=(limit,),
+        )
+        rows = await data.fetchall()
+    logger.debug("Users activity statistics: %s", rows)
+    return rows
+
+
+ADD_USERS_BULK = query_registry.register(
+    "add_users_bulk",
+    """
+    INSERT INTO users(user_id, username, firstname, lastname, language, role)
+    SELECT * FROM unnest(
+        %s::bigint[],
+        %s::varchar[],
+        %s::varchar[],
+        %s::varchar[],
+        %s::varchar[],
+        %s::varchar[]
+    )
+    ON CONFLICT DO NOTHING
+    RETURNING user_id;
+    """,
+)
+
+
+async def add_users_bulk(
+    conn: AsyncConnection,
+    *,
+    users: Sequence[NewUser],
+) -> list[int]:
+    '''
+    Функция для пакетного добавления пользователей одним запросом.
+    Возвращает user_id действительно добавленных (ранее отсутствовавших) пользователей
+    '''
+    if not users:
+        return []
+    await ensure_transaction(conn)
+    async with conn.cursor() as cursor:
+        data = await query_registry.execute(
+            cursor,
+            ADD_USERS_BULK,
+            params=(
+                [user.user_id for user in users],
+                [user.username for user in users],
+                [user.firstname for user in users],
+                [user.lastname for user in users],
+                [user.language for user in users],
+                [user.role for user in users],
+            ),
+        )
+        added_ids = [row[0] for row in await data.fetchall()]
+    await _invalidate_profiles(conn, added_ids)
+    await after_commit(conn, partial(user_registry.add, added_ids))
+    logger.info(
+        "Users added. Table=`%s`, requested=%d, added=%d",
+        "users", len(users), len(added_ids),
+    )
+    return added_ids
+
+
+GET_USERS_BY_IDS = query_registry.register(
+    "get_users_by_ids",
+    """
+    SELECT
+        user_id,
+        role,
+        language,
+        banned,
+        is_alive,
+        created_at
+        FROM users WHERE user_id = ANY(%s);
+    """,
+)
+
+
+async def get_users_by_ids(
+    conn: AsyncConnection,
+    *,
+    user_ids: Sequence[int],
+) -> list[UserContext]:
+    '''
+    Функция для получения профилей нескольких пользователей одним запросом
+    '''
+    if not user_ids:
+        return []
+    generations = {user_id: user_profile_cache.generation(user_id) for user_id in user_ids}
+    async with conn.cursor(row_factory=class_row(UserContext)) as cursor:
+        data = await query_registry.execute(
+            cursor,
+            GET_USERS_BY_IDS,
+            params=(list(user_ids),),
+        )
+        user_contexts = await data.fetchall()
+    for user_context in user_contexts:
+        user_profile_cache.set(
+            user_context.user_id, user_context, generations[user_context.user_id]
+        )
+    logger.info("Fetched %d of %d requested users", len(user_contexts), len(user_ids))
+    return user_contexts
+
+
+GET_MENU_USERS_PAGE = query_registry.register(
+    "get_menu_users_page",
+    """
+    SELECT
+        user_id,
+        role,
+        language,
+        banned,
+        is_alive,
+        created_at
+        FROM users
+        WHERE user_id > %s AND is_alive AND NOT banned
+        ORDER BY user_id
+        LIMIT %s;
+    """,
+)
+
+
+async def get_menu_users_page(
+    conn: AsyncConnection,
+    *,
+    after_user_id: int = 0,
+    limit: int = 1000,
+) -> list[UserContext]:
+    '''
+    Функция для постраничного обхода активных пользователей по возрастанию user_id
+    (например, для пересылки меню команд). Следующая страница начинается
+    после последнего user_id предыдущей
+    '''
+    async with conn.cursor(row_factory=class_row(UserContext)) as cursor:
+        data = await query_registry.execute(
+            cursor,
+            GET_MENU_USERS_PAGE,
+            params=(after_user_id, limit),
+        )
+        return await data.fetchall()
+
+
+GET_RECENTLY_ACTIVE_USER_IDS = query_registry.register(
+    "get_recently_active_user_ids",
+    """
+    SELECT t.user_id
+        FROM activity_totals t
+        WHERE EXISTS (
+            SELECT 1 FROM activity a
+            WHERE a.user_id = t.user_id AND a.activity_date >= CURRENT_DATE - %s::int
+        )
+        ORDER BY t.total_actions DESC, t.user_id
+        LIMIT %s;
+    """,
+)
+
+
+async def get_recently_active_user_ids(
+    conn: AsyncConnection,
+    *,
+    days: int,
+    limit: int,
+) -> list[int]:
+    '''
+    Функция для получения самых активных пользователей из тех, кто писал боту
+    за последние `days` дней (например, для прогрева кэша профилей при старте).
+    Идет по индексу `activity_totals` и проверяет недавнюю активность по ключу `activity`
+    '''
+    async with conn.cursor() as cursor:
+        data = await query_registry.execute(
+            cursor,
+            GET_RECENTLY_ACTIVE_USER_IDS,
+            params=(days, limit),
+        )
+        return [row[0] for row in await data.fetchall()]
+
+
+CHANGE_USER_ALIVE_STATUS_BULK = query_registry.register(
+    "change_user_alive_status_bulk",
+    """
+    UPDATE users
+    SET is_alive = %s
+    WHERE user_id = ANY(%s)
+      AND is_alive IS DISTINCT FROM %s
+    RETURNING user_id;
+    """,
+)
+
+
+async def change_user_alive_status_bulk(
+    conn: AsyncConnection,
+    *,
+    is_alive: bool,
+    user_ids: Sequence[int],
+) -> list[int]:
+    '''
+    Функция для смены статуса активности у пачки пользователей.
+    Возвращает user_id тех, у кого статус действительно изменился
+    '''
+    if not user_ids:
+        return []
+    await ensure_transaction(conn)
+    async with conn.cursor() as cursor:
+        data = await query_registry.execute(
+            cursor,
+            CHANGE_USER_ALIVE_STATUS_BULK,
+            params=(is_alive, list(user_ids), is_alive),
+        )
+        changed_ids = [row[0] for row in await data.fetchall()]
+    await _invalidate_profiles(conn, changed_ids)
+    logger.info(
+        "Updated `is_alive` status to `%s` for %d of %d users",
+        is_alive, len(changed_ids), len(user_ids),
+    )
+    return changed_ids
+
+
+CHANGE_USER_BANNED_STATUS_BULK = query_registry.register(
+    "change_user_banned_status_bulk",
+    """
+    UPDATE users
+    SET banned = %s
+    WHERE user_id = ANY(%s)
+      AND banned IS DISTINCT FROM %s
+    RETURNING user_id;
+    """,
+)
+
+
+async def change_user_banned_status_bulk(
+    conn: AsyncConnection,
+    *,
+    banned: bool,
+    user_ids: Sequence[int],
+) -> list[int]:
+    '''
+    Функция для смены статуса бана у пачки пользователей.
+    Возвращает user_id тех, у кого статус действительно изменился
+    '''
+    if not user_ids:
+        return []
+    await ensure_transaction(conn)
+    async with conn.cursor() as cursor:
+        data = await query_registry.execute(
+            cursor,
+            CHANGE_USER_BANNED_STATUS_BULK,
+            params=(banned, list(user_ids), banned),
+        )
+        changed_ids = [row[0] for row in await data.fetchall()]
+    await _invalidate_profiles(conn, changed_ids)
+    await _update_registry_bans(conn, changed_ids, banned)
+    logger.info(
+        "Updated `banned` status to `%s` for %d of %d users",
+        banned, len(changed_ids), len(user_ids),
+    )
+    return changed_ids
+
+
+MATERIALIZE_TASK_BATCH = query_registry.register(
+    "materialize_task_batch",
+    """
+    WITH due AS (
+        SELECT t.id, t.starts_at, t.next_occurrence, f.period
+        FROM tasks t
+        JOIN task_frequency_varieties f ON f.id = t.frequency_id
+        WHERE t.is_active AND t.next_execute <= %s
+        ORDER BY t.next_execute
+        LIMIT %s
+        FOR UPDATE OF t SKIP LOCKED
+    ),
+    occurrences AS (
+        SELECT
+            due.id AS task_id,
+            s.n,
+            due.starts_at + COALESCE(s.n * due.period, INTERVAL '0') AS date_execute
+        FROM due
+        CROSS JOIN LATERAL generate_series(
+            due.next_occurrence,
+            CASE WHEN due.period IS NULL THEN due.next_occurrence
+                 ELSE due.next_occurrence + %s - 1 END
+        ) AS s(n)
+        WHERE due.period IS NULL OR due.starts_at + s.n * due.period <= %s
+    ),
+    inserted AS (
+        INSERT INTO task_process(date_execute, task_id, task_status_id)
+        SELECT
+            o.date_execute,
+            o.task_id,
+            (SELECT id FROM task_status_varieties WHERE key = %s)
+        FROM occurrences o
+        WHERE o.date_execute >= %s
+        ON CONFLICT (task_id, date_execute) DO NOTHING
+        RETURNING 1
+    ),
+    advanced AS (
+        UPDATE tasks t
+        SET next_occurrence = o.last_n + 1,
+            next_execute = CASE WHEN due.period IS NULL THEN NULL
+                                ELSE due.starts_at + (o.last_n + 1) * due.period END
+        FROM due
+        JOIN (
+            SELECT task_id, MAX(n) AS last_n FROM occurrences GROUP BY task_id
+        ) o ON o.task_id = due.id
+        WHERE t.id = due.id
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM advanced), (SELECT COUNT(*) FROM inserted);
+    """,
+)
+
+
+async def materialize_task_batch(
+    conn: AsyncConnection,
+    *,
+    horizon: datetime,
+    not_before: datetime,
+    batch_size: int,
+    max_occurrences: int,
+    status_key: str,
+) -> tuple[int, int]:
+    '''
+    Функция для разворачивания пачки повторяющихся задач в строки `task_process`
+    до момента `horizon`. Берет не больше `batch_size` задач с самым ранним
+    `next_execute`, пропуская задачи, заблокированные другими процессами,
+    и создает для каждой не больше `max_occurrences` выполнений за вызов.
+    Выполнения раньше `not_before` пропускаются: для них нет секций `task_process`.
+    Возвращает (число обработанных задач, число созданных выполнений)
+    '''
+    await ensure_transaction(conn)
+    async with conn.cursor() as cursor:
+        data = await query_registry.execute(
+            cursor,
+            MATERIALIZE_TASK_BATCH,
+            params=(horizon, batch_size, max_occurrences, horizon, status_key, not_before),
+        )
+        tasks_count, processes_count = await data.fetchone()
+    logger.info(
+        "Tasks materialized. Table=`%s`, tasks=%d, rows=%d",
+        "task_process", tasks_count, processes_count,
+    )
+    return tasks_count, processes_count
+
+
+GET_DUE_TASK_PROCESSES = query_registry.register(
+    "get_due_task_processes",
+    """
+    SELECT p.id, p.date_execute, p.task_id, t.name, t.executor_id
+    FROM task_process p
+    JOIN tasks t ON t.id = p.task_id
+    WHERE p.date_execute >= %s
+      AND p.date_execute < %s
+      AND p.task_status_id = (SELECT id FROM task_status_varieties WHERE key = %s)
+    ORDER BY p.date_execute
+    LIMIT %s;
+    """,
+)
+
+
+async def get_due_task_processes(
+    conn: AsyncConnection,
+    *,
+    since: datetime,
+    until: datetime,
+    status_key: str = "planned",
+    limit: int = 1000,
+) -> list[tuple[int, datetime, int, str, int]]:
+    '''
+    Функция для получения выполнений задач со статусом `status_key`,
+    назначенных на промежуток [since, until).
+    Границы по `date_execute` обязательны: по ним отсекаются ненужные секции `task_process`
+    '''
+    async with conn.cursor() as cursor:
+        data = await query_registry.execute(
+            cursor,
+            GET_DUE_TASK_PROCESSES,
+            params=(since, until, status_key, limit),
+        )
+        return await data.fetchall()
+
+
+CLAIM_DUE_TASK_PROCESSES = query_registry.register(
+    "claim_due_task_processes",
+    """
+    WITH due AS (
+        SELECT id, date_execute
+        FROM task_process
+        WHERE date_execute >= %s
+          AND date_execute < %s
+          AND task_status_id = (SELECT id FROM task_status_varieties WHERE key = %s)
+        ORDER BY date_execute
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE task_process p
+    SET task_status_id = (SELECT id FROM task_status_varieties WHERE key = %s)
+    FROM due, tasks t
+    LEFT JOIN users u ON u.user_id = t.executor_id
+    WHERE p.id = due.id
+      AND p.date_execute = due.date_execute
+      AND t.id = p.task_id
+    RETURNING p.id, p.date_execute, t.name, t.executor_id, u.language;
+    """,
+)
+
+
+async def claim_due_task_processes(
+    conn: AsyncConnection,
+    *,
+    since: datetime,
+    until: datetime,
+    status_key: str = "planned",
+    claimed_status_key: str = "notified",
+    limit: int = 500,
+) -> list[tuple[int, datetime, str, int, str | None]]:
+    '''
+    Функция для выборки выполнений задач со статусом `status_key` на промежуток
+    [since, until) с переводом их в статус `claimed_status_key` одним запросом.
+    Строки, занятые другой копией бота, пропускаются (`SKIP LOCKED`).
+    Возвращает (id, date_execute, название задачи, исполнитель, язык исполнителя)
+    '''
+    async with conn.cursor() as cursor:
+        data = await query_registry.execute(
+            cursor,
+            CLAIM_DUE_TASK_PROCESSES,
+            params=(since, until, status_key, limit, claimed_status_key),
+        )
+        rows = await data.fetchall()
+    if rows:
+        logger.info(
+            "Task processes claimed. Table=`%s`, rows=%d, status=%s",
+            "task_process", len(rows), claimed_status_key,
+        )
+    return rows
+
+
+GET_TASK_HISTORY = query_registry.register(
+    "get_task_history",
+    """
+    SELECT p.id, p.date_execute, s.key
+    FROM task_process p
+    JOIN task_status_varieties s ON s.id = p.task_status_id
+    WHERE p.task_id = %s
+      AND p.date_execute >= %s
+      AND p.date_execute < %s
+    ORDER BY p.date_execute DESC
+    LIMIT %s;
+    """,
+)
+
+
+async def get_task_history(
+    conn: AsyncConnection,
+    *,
+    task_id: int,
+    since: datetime,
+    until: datetime,
+    limit: int = 100,
+) -> list[tuple[int, datetime, str]]:
+    '''
+    Функция для получения истории выполнений задачи за промежуток [since, until).
+    Границы по `date_execute` обязательны: по ним отсекаются ненужные секции `task_process`
+    '''
+    async with conn.cursor() as cursor:
+        data = await query_registry.execute(
+            cursor,
+            GET_TASK_HISTORY,
+            params=(task_id, since, until, limit),
+        )
+        return await data.fetchall()
+
+
+# Колонка-владелец для каждого вида списка задач
+TASK_LIST_SCOPES = {
+    "creator": "creator_id",
+    "executor": "executor_id",
+    "group": "task_group_id",
+}
+
+# Для каждого вида два запроса: к более старым задачам (следующая страница)
+# и к более новым (предыдущая). Оба читают индекс (<владелец>, created_at, id)
+# с позиции курсора, поэтому цена страницы не зависит от ее номера
+LIST_TASKS_OLDER = {
+    scope: query_registry.register(
+        f"list_tasks_{scope}_older",
+        f"""
+        SELECT id, name, created_at, creator_id, executor_id
+        FROM tasks
+        WHERE {column} = %s AND (created_at, id) < (%s, %s)
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s;
+        """,
+    )
+    for scope, column in TASK_LIST_SCOPES.items()
+}
+LIST_TASKS_NEWER = {
+    scope: query_registry.register(
+        f"list_tasks_{scope}_newer",
+        f"""
+        SELECT id, name, created_at, creator_id, executor_id
+        FROM tasks
+        WHERE {column} = %s AND (created_at, id) > (%s, %s)
+        ORDER BY created_at, id
+        LIMIT %s;
+        """,
+    )
+    for scope, column in TASK_LIST_SCOPES.items()
+}
+
+# Курсор первой страницы: позже любой реальной задачи
+_FIRST_PAGE_CURSOR = TaskCursor(created_at=datetime.max.replace(tzinfo=timezone.utc), id=0)
+
+
+async def list_tasks_page(
+    conn: AsyncConnection,
+    *,
+    scope: str,
+    owner_id: int,
+    cursor: TaskCursor | None = None,
+    backward: bool = False,
+    limit: int = 10,
+) -> TasksPage:
+    '''
+    Функция для получения страницы задач создателя, исполнителя или группы
+    (`scope` - "creator", "executor" или "group") от новых к старым.
+    Без курсора возвращает первую страницу; с курсором - страницу после него,
+    а при `backward=True` - перед ним
+    '''
+    if scope not in TASK_LIST_SCOPES:
+        raise ValueError(f"Unknown task list scope `{scope}`")
+    backward = backward and cursor is not None
+    position = cursor or _FIRST_PAGE_CURSOR
+    query = (LIST_TASKS_NEWER if backward else LIST_TASKS_OLDER)[scope]
+    async with conn.cursor(row_factory=class_row(TaskItem)) as db_cursor:
+        data = await query_registry.execute(
+            db_cursor,
+            query,
+            # Лишняя строка показывает, есть ли страница дальше в ту же сторону
+            params=(owner_id, position.created_at, position.id, limit + 1),
+        )
+        items = await data.fetchall()
+
+    has_more = len(items) > limit
+    items = items[:limit]
+    if backward:
+        items.reverse()
+    if not items:
+        return TasksPage(items=[], prev_cursor=None, next_cursor=None)
+
+    first, last = items[0], items[-1]
+    has_newer = has_more if backward else cursor is not None
+    has_older = True if backward else has_more
+    return TasksPage(
+        items=items,
+        prev_cursor=TaskCursor(first.created_at, first.id) if has_newer else None,
+        next_cursor=TaskCursor(last.created_at, last.id) if has_older else None,
+    )
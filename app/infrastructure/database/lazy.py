@@ -0,0 +1,183 @@
+import logging
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from types import TracebackType
+from typing import Any
+
+from app.infrastructure.metrics import pool_wait_seconds
+from psycopg import AsyncConnection, AsyncCursor, AsyncPipeline, AsyncTransaction
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class _LazyCursor:
+    '''
+    Аналог `AsyncConnection.cursor()`: соединение берется из пула при входе в контекст
+    '''
+    def __init__(self, lazy_conn: "LazyConnection", kwargs: dict[str, Any]) -> None:
+        self._lazy_conn = lazy_conn
+        self._kwargs = kwargs
+        self._cursor: AsyncCursor | None = None
+
+    async def __aenter__(self) -> AsyncCursor:
+        connection = await self._lazy_conn.get()
+        self._cursor = connection.cursor(**self._kwargs)
+        return await self._cursor.__aenter__()
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        await self._cursor.__aexit__(exc_type, exc, tb)
+
+
+class LazyConnection:
+    '''
+    Соединение с Postgres, которое берется из пула только при первом обращении.
+    Чтения выполняются в autocommit, транзакция открывается вызовом `begin()`
+    перед первой записью и фиксируется в `close()`.
+    Повторяет ту часть API `AsyncConnection`, которой пользуются функции `db.py`
+    '''
+    def __init__(self, pool: AsyncConnectionPool) -> None:
+        self._pool = pool
+        self._connection: AsyncConnection | None = None
+        self._transaction: AsyncTransaction | None = None
+        self._close_callbacks: list[Callable[[], Awaitable[Any]]] = []
+        self._commit_callbacks: list[Callable[[], Awaitable[Any]]] = []
+        # Время ожидания соединения из пула, секунды (`None` - соединение не понадобилось)
+        self.wait_time: float | None = None
+
+    @property
+    def acquired(self) -> bool:
+        return self._connection is not None
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._transaction is not None
+
+    async def get(self) -> AsyncConnection:
+        if self._connection is None:
+            started = time.perf_counter()
+            connection = await self._pool.getconn()
+            self.wait_time = time.perf_counter() - started
+            pool_wait_seconds.observe(self.wait_time)
+            try:
+                await connection.set_autocommit(True)
+            except Exception:
+                await self._pool.putconn(connection)
+                raise
+            self._connection = connection
+        return self._connection
+
+    async def begin(self) -> AsyncConnection:
+        connection = await self.get()
+        if self._transaction is None:
+            transaction = connection.transaction()
+            await transaction.__aenter__()
+            self._transaction = transaction
+        return connection
+
+    def cursor(self, **kwargs: Any) -> _LazyCursor:
+        return _LazyCursor(self, kwargs)
+
+    @asynccontextmanager
+    async def pipeline(self) -> AsyncIterator[AsyncPipeline]:
+        '''
+        Режим pipeline на время блока: запросы (и BEGIN транзакции, открытой внутри)
+        уходят без ожидания ответов, очередь синхронизируется на выходе из блока
+        '''
+        connection = await self.get()
+        async with connection.pipeline() as pipeline:
+            yield pipeline
+
+    def call_on_close(self, callback: Callable[[], Awaitable[Any]]) -> None:
+        '''
+        Регистрирует корутину, которая выполнится после фиксации или отката транзакции.
+        Если соединение так и не понадобилось, колбэк выполнится сразу в `close()`
+        '''
+        self._close_callbacks.append(callback)
+
+    def call_on_commit(self, callback: Callable[[], Awaitable[Any]]) -> None:
+        '''
+        Регистрирует корутину, которая выполнится только после успешной фиксации транзакции
+        '''
+        self._commit_callbacks.append(callback)
+
+    async def close(self, exc: BaseException | None = None) -> None:
+        '''
+        Фиксирует (или откатывает, если передано исключение) открытую транзакцию
+        и возвращает соединение в пул
+        '''
+        committed = False
+        try:
+            await self._release(exc)
+            committed = exc is None
+        finally:
+            callbacks, self._close_callbacks = self._close_callbacks, []
+            if committed:
+                callbacks += self._commit_callbacks
+            self._commit_callbacks = []
+            for callback in callbacks:
+                try:
+                    await callback()
+                except Exception as e:
+                    logger.warning("Connection close callback failed: %s", e)
+
+    async def _release(self, exc: BaseException | None) -> None:
+        if self._connection is None:
+            return
+
+        connection, transaction = self._connection, self._transaction
+        self._connection = self._transaction = None
+        exc_info = (type(exc), exc, exc.__traceback__) if exc else (None, None, None)
+        try:
+            if transaction is not None:
+                await transaction.__aexit__(*exc_info)
+        finally:
+            try:
+                # Пул не сбрасывает autocommit - возвращаем соединение в исходном режиме
+                await connection.set_autocommit(False)
+            except Exception as e:
+                logger.warning("Failed to reset autocommit before returning connection: %s", e)
+            await self._pool.putconn(connection)
+
+
+async def ensure_transaction(conn: AsyncConnection | LazyConnection) -> None:
+    '''
+    Открывает транзакцию у ленивого соединения перед записью.
+    Для обычного `AsyncConnection` транзакцией управляет вызывающий код
+    '''
+    if isinstance(conn, LazyConnection):
+        await conn.begin()
+
+
+async def after_transaction(
+    conn: AsyncConnection | LazyConnection,
+    callback: Callable[[], Awaitable[Any]],
+) -> None:
+    '''
+    Выполняет `callback` после завершения транзакции ленивого соединения
+    (для обычного `AsyncConnection` - сразу)
+    '''
+    if isinstance(conn, LazyConnection):
+        conn.call_on_close(callback)
+    else:
+        await callback()
+
+
+async def after_commit(
+    conn: AsyncConnection | LazyConnection,
+    callback: Callable[[], Awaitable[Any]],
+) -> None:
+    '''
+    Выполняет `callback` только после успешной фиксации транзакции ленивого соединения
+    (для обычного `AsyncConnection` - сразу: транзакцией управляет вызывающий код)
+    '''
+    if isinstance(conn, LazyConnection):
+        conn.call_on_commit(callback)
+    else:
+        await callback()
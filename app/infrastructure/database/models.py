@@ -0,0 +1,60 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+
+@dataclass(frozen=True, slots=True)
+class UserContext:
+    '''
+    Срез строки таблицы `users`, который нужен middleware, фильтрам и хэндлерам
+    на время обработки одного апдейта
+    '''
+    user_id: int
+    role: str       # значение `UserRole`; сам enum живет в `app.bot` и здесь не импортируется
+    language: str
+    banned: bool
+    is_alive: bool
+    created_at: datetime
+
+
+@dataclass(frozen=True, slots=True)
+class NewUser:
+    '''
+    Данные пользователя для пакетной регистрации (`add_users_bulk`)
+    '''
+    user_id: int
+    firstname: str
+    lastname: str
+    username: str | None = None
+    language: str = "ru"
+    role: str = "user"
+
+
+@dataclass(frozen=True, slots=True)
+class TaskItem:
+    '''
+    Строка списка задач
+    '''
+    id: int
+    name: str
+    created_at: datetime
+    creator_id: int
+    executor_id: int
+
+
+@dataclass(frozen=True, slots=True)
+class TaskCursor:
+    '''
+    Позиция в списке задач: ключ (created_at, id) граничной строки страницы
+    '''
+    created_at: datetime
+    id: int
+
+
+@dataclass(frozen=True, slots=True)
+class TasksPage:
+    '''
+    Страница списка задач (от новых к старым). Курсор `None` - страницы в эту сторону нет
+    '''
+    items: list[TaskItem]
+    prev_cursor: TaskCursor | None
+    next_cursor: TaskCursor | None
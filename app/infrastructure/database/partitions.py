@@ -0,0 +1,209 @@
+import asyncio
+import gzip
+import logging
+import os
+from datetime import datetime, timezone
+
+from psycopg import AsyncConnection, sql
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "task_process"
+PARTITION_PREFIX = "task_process_y"
+
+# Ключ advisory-блокировки: обслуживание секций выполняет только одна копия бота
+MAINTENANCE_LOCK_KEY = 8_135_002_014
+
+
+def _month_start(moment: datetime, shift: int = 0) -> datetime:
+    month_index = moment.year * 12 + moment.month - 1 + shift
+    return datetime(month_index // 12, month_index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month_start: datetime) -> str:
+    return f"{PARTITION_PREFIX}{month_start.year:04d}m{month_start.month:02d}"
+
+
+def partition_month(name: str) -> datetime | None:
+    '''
+    Начало месяца секции по ее имени `task_process_yYYYYmMM`
+    '''
+    suffix = name.removeprefix(PARTITION_PREFIX)
+    if suffix == name or len(suffix) != 7 or suffix[4] != "m":
+        return None
+    try:
+        return datetime(int(suffix[:4]), int(suffix[5:]), 1, tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+async def create_partitions(conn: AsyncConnection, *, months_ahead: int) -> list[str]:
+    '''
+    Функция для создания месячных секций `task_process` с текущего месяца
+    на `months_ahead` месяцев вперед. Возвращает имена созданных секций
+    '''
+    now = datetime.now(timezone.utc)
+    created: list[str] = []
+    for shift in range(months_ahead + 1):
+        start, end = _month_start(now, shift), _month_start(now, shift + 1)
+        name = partition_name(start)
+        cursor = await conn.execute("SELECT to_regclass(%s);", (name,))
+        if (await cursor.fetchone())[0] is not None:
+            continue
+        await conn.execute(
+            sql.SQL(
+                "CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM ({}) TO ({});"
+            ).format(
+                sql.Identifier(name),
+                sql.Identifier(PARENT_TABLE),
+                sql.Literal(start),
+                sql.Literal(end),
+            )
+        )
+        created.append(name)
+    if created:
+        logger.info("Partitions created. Table=`%s`, partitions=%s", PARENT_TABLE, created)
+    return created
+
+
+async def _expired_partitions(conn: AsyncConnection, cutoff: datetime) -> list[tuple[str, bool]]:
+    '''
+    Секции целиком старше `cutoff`: и подключенные, и уже отключенные прошлым
+    незавершенным запуском. Возвращает пары (имя, подключена ли еще секция)
+    '''
+    cursor = await conn.execute(
+        """
+        SELECT c.relname, i.inhrelid IS NOT NULL
+        FROM pg_class c
+        LEFT JOIN pg_inherits i
+            ON i.inhrelid = c.oid AND i.inhparent = %s::regclass
+        WHERE c.relkind = 'r'
+          AND c.relnamespace = current_schema()::regnamespace
+          AND c.relname LIKE %s;
+        """,
+        (PARENT_TABLE, f"{PARTITION_PREFIX}%"),
+    )
+    expired = []
+    for name, attached in await cursor.fetchall():
+        month_start = partition_month(name)
+        if month_start is not None and _month_start(month_start, 1) <= cutoff:
+            expired.append((name, attached))
+    return sorted(expired)
+
+
+async def _detach(conn: AsyncConnection, name: str) -> None:
+    cursor = await conn.execute(
+        "SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = %s::regclass;", (name,)
+    )
+    row = await cursor.fetchone()
+    if row is None:
+        return
+    # Прерванный DETACH ... CONCURRENTLY оставляет секцию в состоянии ожидания
+    action = "FINALIZE" if row[0] else "CONCURRENTLY"
+    await conn.execute(
+        sql.SQL("ALTER TABLE {} DETACH PARTITION {} {};").format(
+            sql.Identifier(PARENT_TABLE), sql.Identifier(name), sql.SQL(action)
+        )
+    )
+
+
+async def _archive(conn: AsyncConnection, name: str, archive_dir: str) -> str:
+    '''
+    Выгружает секцию в `archive_dir/<name>.csv.gz` через COPY.
+    Файл пишется во временный и переименовывается только после полной выгрузки
+    '''
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    tmp_path = f"{path}.part"
+    query = sql.SQL("COPY {} TO STDOUT (FORMAT csv, HEADER true);").format(sql.Identifier(name))
+    archive = await asyncio.to_thread(gzip.open, tmp_path, "wb")
+    try:
+        async with conn.cursor() as cursor:
+            async with cursor.copy(query) as copy:
+                async for chunk in copy:
+                    await asyncio.to_thread(archive.write, chunk)
+    finally:
+        await asyncio.to_thread(archive.close)
+    await asyncio.to_thread(os.replace, tmp_path, path)
+    return path
+
+
+async def archive_expired_partitions(
+    conn: AsyncConnection,
+    *,
+    retention_months: int,
+    archive_dir: str,
+) -> list[str]:
+    '''
+    Функция для отключения, архивации в сжатый CSV и удаления секций
+    `task_process` старше `retention_months` полных месяцев.
+    Соединение должно быть в режиме autocommit: `DETACH ... CONCURRENTLY`
+    не выполняется внутри транзакции. Возвращает пути к архивам
+    '''
+    cutoff = _month_start(datetime.now(timezone.utc), -retention_months)
+    os.makedirs(archive_dir, exist_ok=True)
+    archived: list[str] = []
+    for name, attached in await _expired_partitions(conn, cutoff):
+        if attached:
+            await _detach(conn, name)
+        path = await _archive(conn, name, archive_dir)
+        await conn.execute(sql.SQL("DROP TABLE {};").format(sql.Identifier(name)))
+        logger.info("Partition archived. Table=`%s`, archive=%s", name, path)
+        archived.append(path)
+    return archived
+
+
+class PartitionMaintainer:
+    '''
+    Раз в `interval` секунд создает секции `task_process` наперед
+    и отправляет в архив секции старше срока хранения
+    '''
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        *,
+        months_ahead: int = 3,
+        retention_months: int = 12,
+        archive_dir: str = "archive",
+        interval: float = 3600.0,
+    ) -> None:
+        self._pool = pool
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self.archive_dir = archive_dir
+        self.interval = interval
+
+    async def maintain(self) -> None:
+        async with self._pool.connection() as connection:
+            await connection.set_autocommit(True)
+            try:
+                cursor = await connection.execute(
+                    "SELECT pg_try_advisory_lock(%s);", (MAINTENANCE_LOCK_KEY,)
+                )
+                if not (await cursor.fetchone())[0]:
+                    return
+                try:
+                    await create_partitions(connection, months_ahead=self.months_ahead)
+                    await archive_expired_partitions(
+                        connection,
+                        retention_months=self.retention_months,
+                        archive_dir=self.archive_dir,
+                    )
+                finally:
+                    await connection.execute(
+                        "SELECT pg_advisory_unlock(%s);", (MAINTENANCE_LOCK_KEY,)
+                    )
+            finally:
+                await connection.set_autocommit(False)
+
+    async def run(self, *, delay: float = 0.0) -> None:
+        '''
+        Обслуживает секции раз в `interval` секунд, начиная через `delay` секунд
+        '''
+        await asyncio.sleep(delay)
+        while True:
+            try:
+                await self.maintain()
+            except Exception as e:
+                logger.exception("Failed to maintain `%s` partitions: %s", PARENT_TABLE, e)
+            await asyncio.sleep(self.interval)
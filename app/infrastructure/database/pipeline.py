@@ -0,0 +1,33 @@
+import inspect
+import logging
+from collections.abc import Awaitable
+from typing import Any
+
+from app.infrastructure.database.lazy import LazyConnection
+from psycopg import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+
+async def run_batch(
+    conn: AsyncConnection | LazyConnection,
+    *statements: Awaitable[Any],
+) -> list[Any]:
+    '''
+    Выполняет независимые друг от друга вызовы функций `db.py` в режиме pipeline:
+    запросы уходят на сервер, не дожидаясь ответов на предыдущие, и синхронизируются
+    один раз в конце. Вызов, читающий результат, синхронизирует очередь сам,
+    поэтому чтения лучше передавать последними.
+    Возвращает результаты в порядке передачи вызовов
+    '''
+    try:
+        async with conn.pipeline():
+            results = [await statement for statement in statements]
+    except BaseException:
+        # Не дошедшие до выполнения корутины закрываем, чтобы не было предупреждений
+        for statement in statements:
+            if inspect.iscoroutine(statement):
+                statement.close()
+        raise
+    logger.debug("Pipelined %d statements", len(statements))
+    return results
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from app.infrastructure.metrics import query_seconds
+from psycopg import AsyncConnection, AsyncCursor
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Подготовленных вариантов на запрос в кэше psycopg: вариант зависит от типов
+# параметров (int уходит как smallint, integer или bigint в зависимости от значения)
+PREPARED_PER_QUERY = 4
+
+
+def param_shape(params: Sequence[Any]) -> str:
+    '''
+    Форма параметров запроса без значений: типы и длины строк и массивов
+    '''
+    def shape(value: Any) -> str:
+        if isinstance(value, (str, bytes, list, tuple)):
+            return f"{type(value).__name__}[{len(value)}]"
+        return type(value).__name__
+
+    return "(" + ", ".join(shape(param) for param in params) + ")"
+
+
+@dataclass
+class QueryTrace:
+    '''
+    Запросы, выполненные в рамках одного апдейта
+    '''
+    counts: Counter[str] = field(default_factory=Counter)
+    handler: str | None = None
+
+    @property
+    def total(self) -> int:
+        return self.counts.total()
+
+
+_current_trace: ContextVar[QueryTrace | None] = ContextVar("query_trace", default=None)
+
+
+@dataclass(frozen=True, slots=True)
+class Query:
+    '''
+    Именованный запрос с позиционными плейсхолдерами `%s`.
+    `warm` - наборы параметров, с которыми запрос выполняется на новом соединении,
+    чтобы первый апдейт не платил за подготовку. Для записи - такие, что не
+    затрагивают ни одной строки
+    '''
+    name: str
+    sql: str
+    warm: tuple[tuple[Any, ...], ...] = ()
+
+
+class QueryRegistry:
+    '''
+    Реестр горячих запросов `db.py`. Запросы выполняются как подготовленные
+    на уровне протокола (`prepare=True`): текст разбирается и планируется один раз
+    на соединение, дальше на сервер уходят только имя и параметры.
+    Считает вызовы каждого запроса
+    '''
+    def __init__(self) -> None:
+        self._queries: dict[str, Query] = {}
+        self.calls: Counter[str] = Counter()
+        self.slow_calls: Counter[str] = Counter()
+        self.slow_threshold = 0.0
+        self.explain_interval = 300.0
+        self._explain_pool: AsyncConnectionPool | None = None
+        self._explained_at: dict[str, float] = {}
+        self._explain_tasks: set[asyncio.Task] = set()
+
+    def configure(
+        self,
+        *,
+        slow_threshold: float,
+        explain_pool: AsyncConnectionPool | None = None,
+        explain_interval: float = 300.0,
+    ) -> None:
+        '''
+        `slow_threshold` - порог медленного запроса, секунды (0 - не отслеживать).
+        Если задан `explain_pool`, к медленному запросу в фоне логируется план EXPLAIN,
+        не чаще раза в `explain_interval` секунд для каждого запроса
+        '''
+        self.slow_threshold = slow_threshold
+        self._explain_pool = explain_pool
+        self.explain_interval = explain_interval
+
+    def register(
+        self,
+        name: str,
+        query: str,
+        *,
+        warm: Sequence[tuple[Any, ...]] = (),
+    ) -> Query:
+        if name in self._queries:
+            raise ValueError(f"Query `{name}` is already registered")
+        self._queries[name] = Query(name=name, sql=query, warm=tuple(warm))
+        return self._queries[name]
+
+    def __iter__(self):
+        return iter(self._queries.values())
+
+    async def prepare(self, connection: AsyncConnection) -> None:
+        '''
+        Хук `configure` пула: расширяет кэш подготовленных запросов psycopg под реестр
+        и выполняет запросы с параметрами `warm`. Остальные подготавливаются
+        при первом вызове; ошибка прогрева (например, таблицы еще нет) не мешает соединению
+        '''
+        connection.prepared_max = max(
+            connection.prepared_max, PREPARED_PER_QUERY * len(self._queries)
+        )
+        warmed = 0
+        await connection.set_autocommit(True)
+        try:
+            for query in self._queries.values():
+                for params in query.warm:
+                    try:
+                        await connection.execute(query.sql, params, prepare=True)
+                        warmed += 1
+                    except Exception as e:
+                        logger.warning("Failed to prepare query `%s`: %s", query.name, e)
+        finally:
+            await connection.set_autocommit(False)
+        logger.debug("Prepared %d query variants on a new connection", warmed)
+
+    async def execute(
+        self,
+        cursor: AsyncCursor,
+        query: Query,
+        params: Sequence[Any] = (),
+    ) -> AsyncCursor:
+        self.calls[query.name] += 1
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.counts[query.name] += 1
+        started = time.perf_counter()
+        try:
+            return await cursor.execute(query.sql, params, prepare=True)
+        finally:
+            elapsed = time.perf_counter() - started
+            query_seconds.observe(elapsed, query.name)
+            # Внутри `run_batch` (режим pipeline) `execute` только ставит запрос в очередь,
+            # такие запросы здесь медленными не окажутся
+            if self.slow_threshold and elapsed >= self.slow_threshold:
+                self._on_slow(query, params, elapsed)
+
+    def _on_slow(self, query: Query, params: Sequence[Any], elapsed: float) -> None:
+        self.slow_calls[query.name] += 1
+        logger.warning(
+            "Slow query `%s`: %.1f ms, params %s",
+            query.name, elapsed * 1000, param_shape(params),
+        )
+        if self._explain_pool is None:
+            return
+        now = time.monotonic()
+        if now - self._explained_at.get(query.name, float("-inf")) < self.explain_interval:
+            return
+        self._explained_at[query.name] = now
+        task = asyncio.create_task(self._explain(query, params))
+        self._explain_tasks.add(task)
+        task.add_done_callback(self._explain_tasks.discard)
+
+    async def _explain(self, query: Query, params: Sequence[Any]) -> None:
+        '''
+        Логирует план запроса, полученный на отдельном соединении пула.
+        Без ANALYZE: запрос не выполняется, поэтому так можно смотреть и записи
+        '''
+        try:
+            async with self._explain_pool.connection() as connection:
+                cursor = await connection.execute(f"EXPLAIN {query.sql}", params)
+                plan = "\n".join(row[0] for row in await cursor.fetchall())
+                await connection.rollback()
+        except Exception as e:
+            logger.warning("Failed to explain slow query `%s`: %s", query.name, e)
+            return
+        logger.warning("Plan of slow query `%s`:\n%s", query.name, plan)
+
+    @contextmanager
+    def trace(self) -> Iterator[QueryTrace]:
+        '''
+        Считает запросы, выполненные внутри контекста (в той же задаче asyncio)
+        '''
+        trace = QueryTrace()
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+
+    @staticmethod
+    def current_trace() -> QueryTrace | None:
+        return _current_trace.get()
+
+    async def close(self) -> None:
+        '''
+        Дожидается фоновых EXPLAIN перед закрытием пула
+        '''
+        if self._explain_tasks:
+            await asyncio.gather(*self._explain_tasks, return_exceptions=True)
+
+    def stats(self) -> dict[str, int]:
+        return dict(self.calls)
+
+
+# Реестр уровня процесса: запросы регистрируются при импорте `db.py`
+query_registry = QueryRegistry()
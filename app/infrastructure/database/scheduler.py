@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from app.infrastructure.database.db import materialize_task_batch
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class TaskMaterializer:
+    '''
+    Разворачивает повторяющиеся задачи в строки `task_process` на `horizon` вперед.
+    Каждая пачка - отдельная короткая транзакция с `FOR UPDATE SKIP LOCKED`,
+    поэтому несколько запущенных копий бота делят задачи между собой,
+    а не ждут друг друга и не создают дублей
+    '''
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        horizon: timedelta = timedelta(days=30),
+        interval: float = 300.0,
+        batch_size: int = 1000,
+        max_occurrences: int = 500,
+        status_key: str = "planned",
+    ) -> None:
+        self._pool = pool
+        self.horizon = horizon
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_occurrences = max_occurrences
+        self.status_key = status_key
+
+    async def materialize(self) -> tuple[int, int]:
+        '''
+        Двигает горизонт: обрабатывает пачки, пока есть задачи,
+        у которых следующее выполнение попадает в горизонт.
+        Возвращает суммарное (число обработанных задач, число созданных выполнений)
+        '''
+        now = datetime.now(timezone.utc)
+        horizon = now + self.horizon
+        # Секции `task_process` гарантированно есть начиная с текущего месяца
+        not_before = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        total_tasks = total_rows = 0
+        while True:
+            async with self._pool.connection() as connection:
+                tasks_count, rows_count = await materialize_task_batch(
+                    connection,
+                    horizon=horizon,
+                    not_before=not_before,
+                    batch_size=self.batch_size,
+                    max_occurrences=self.max_occurrences,
+                    status_key=self.status_key,
+                )
+            total_tasks += tasks_count
+            total_rows += rows_count
+            if tasks_count == 0:
+                break
+        return total_tasks, total_rows
+
+    async def run(self) -> None:
+        '''
+        Запускает разворачивание раз в `interval` секунд
+        '''
+        while True:
+            try:
+                tasks_count, rows_count = await self.materialize()
+                if tasks_count:
+                    logger.info(
+                        "Recurring tasks materialized: tasks=%d, rows=%d", tasks_count, rows_count
+                    )
+            except Exception as e:
+                logger.exception("Failed to materialize recurring tasks: %s", e)
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,27 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    '''
+    Флаг готовности процесса принимать апдейты: поднимается после прогрева
+    и запуска приема, опускается в начале остановки
+    '''
+    def __init__(self) -> None:
+        self.ready = False
+        self._started = time.monotonic()
+
+    def set_ready(self, ready: bool) -> None:
+        if ready == self.ready:
+            return
+        self.ready = ready
+        if ready:
+            logger.info("Bot is ready, %.2f s after start", time.monotonic() - self._started)
+        else:
+            logger.info("Bot is not ready")
+
+    async def on_startup(self, **kwargs) -> None:
+        # Хэндлер `dp.startup`: регистрируется последним, после запуска исполнителя и уведомлений
+        self.set_ready(True)
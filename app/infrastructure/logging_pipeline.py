@@ -0,0 +1,220 @@
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Final
+
+from config_data.config import LoggConf
+
+DROP_NEW: Final = "drop_new"
+DROP_OLD: Final = "drop_old"
+DROP_POLICIES: Final = (DROP_NEW, DROP_OLD)
+
+
+def _resolve(name: str, rules: dict[str, float]) -> str | None:
+    '''
+    Самое длинное правило, под которое попадает логгер: правило для
+    `app.infrastructure.database` действует и на `app.infrastructure.database.db`
+    '''
+    while True:
+        if name in rules:
+            return name
+        if "." not in name:
+            return None
+        name = name.rsplit(".", 1)[0]
+
+
+class HotPathFilter(logging.Filter):
+    '''
+    Прореживает записи ниже WARNING от шумных логгеров до постановки в очередь:
+    `sample_rates` - доля сохраняемых записей, `rate_limits` - максимум записей
+    в секунду на правило. Предупреждения и ошибки проходят всегда
+    '''
+    def __init__(
+        self,
+        sample_rates: dict[str, float] | None = None,
+        rate_limits: dict[str, float] | None = None,
+    ) -> None:
+        super().__init__()
+        self.sample_rates = dict(sample_rates or {})
+        self.rate_limits = dict(rate_limits or {})
+        # Правила, найденные для имени логгера
+        self._sample_rules: dict[str, str | None] = {}
+        self._limit_rules: dict[str, str | None] = {}
+        # Правило -> (токены, время последнего пополнения)
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self.sampled_out: Counter[str] = Counter()
+        self.rate_limited: Counter[str] = Counter()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        name = record.name
+        if self.sample_rates:
+            rule = self._sample_rules.get(name, "")
+            if rule == "":
+                rule = self._sample_rules[name] = _resolve(name, self.sample_rates)
+            if rule is not None and random.random() >= self.sample_rates[rule]:
+                self.sampled_out[rule] += 1
+                return False
+
+        if self.rate_limits:
+            rule = self._limit_rules.get(name, "")
+            if rule == "":
+                rule = self._limit_rules[name] = _resolve(name, self.rate_limits)
+            if rule is not None and not self._take(rule):
+                self.rate_limited[rule] += 1
+                return False
+        return True
+
+    def _take(self, rule: str) -> bool:
+        rate = self.rate_limits[rule]
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(rule, (rate, now))
+        # Запас - не больше секунды записей
+        tokens = min(rate, tokens + (now - updated) * rate)
+        if tokens < 1:
+            self._buckets[rule] = (tokens, now)
+            return False
+        self._buckets[rule] = (tokens - 1, now)
+        return True
+
+
+class BoundedQueueHandler(QueueHandler):
+    '''
+    `QueueHandler` для ограниченной очереди: поток, который пишет лог, никогда не ждет.
+    При переполнении отбрасывается новая запись (`drop_new`) или самая старая (`drop_old`);
+    о потерянных записях сообщает предупреждение, как только в очереди появится место
+    '''
+    def __init__(self, log_queue: queue.Queue, policy: str = DROP_NEW) -> None:
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown log queue policy `{policy}`, expected one of {DROP_POLICIES}")
+        super().__init__(log_queue)
+        self.policy = policy
+        self.dropped = 0
+        self._unreported = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        '''
+        Подставляет аргументы в сообщение здесь (они могут измениться после вызова),
+        а время, формат и JSON оставляет потоку `QueueListener`
+        '''
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.policy == DROP_OLD:
+                try:
+                    self.queue.get_nowait()
+                    self.queue.put_nowait(record)
+                except (queue.Empty, queue.Full):
+                    pass
+            self._drop()
+            return
+
+        if self._unreported:
+            self._report_drops()
+
+    def _drop(self) -> None:
+        self.dropped += 1
+        self._unreported += 1
+
+    def _report_drops(self) -> None:
+        report = logging.LogRecord(
+            name=__name__,
+            level=logging.WARNING,
+            pathname=__file__,
+            lineno=0,
+            msg=f"Log queue was full: {self._unreported} records dropped ({self.policy})",
+            args=None,
+            exc_info=None,
+        )
+        try:
+            self.queue.put_nowait(report)
+            self._unreported = 0
+        except queue.Full:
+            pass
+
+
+class JsonFormatter(logging.Formatter):
+    '''
+    Одна запись - одна строка JSON
+    '''
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+@dataclass
+class LoggingPipeline:
+    handler: BoundedQueueHandler
+    listener: QueueListener
+    hot_path_filter: HotPathFilter
+
+    def stats(self) -> dict[str, object]:
+        return {
+            "dropped": self.handler.dropped,
+            "queued": self.handler.queue.qsize(),
+            "sampled_out": dict(self.hot_path_filter.sampled_out),
+            "rate_limited": dict(self.hot_path_filter.rate_limited),
+        }
+
+    def stop(self) -> None:
+        '''
+        Дописывает оставшиеся в очереди записи и возвращает прямой вывод в stderr
+        '''
+        root = logging.getLogger()
+        root.removeHandler(self.handler)
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            root.addHandler(handler)
+
+
+def setup_logging(conf: LoggConf) -> LoggingPipeline:
+    '''
+    Настраивает корневой логгер: записи прореживаются `HotPathFilter`, складываются
+    в ограниченную очередь и пишутся в stderr отдельным потоком `QueueListener`,
+    так что вывод логов не блокирует цикл событий
+    '''
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if conf.json else logging.Formatter(conf.format))
+
+    hot_path_filter = HotPathFilter(conf.sample_rates, conf.rate_limits)
+    handler = BoundedQueueHandler(queue.Queue(maxsize=conf.queue_size), policy=conf.queue_policy)
+    handler.addFilter(hot_path_filter)
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(logging.getLevelName(conf.level))
+
+    listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    listener.start()
+    return LoggingPipeline(handler=handler, listener=listener, hot_path_filter=hot_path_filter)
@@ -0,0 +1,296 @@
+import logging
+from bisect import bisect_left
+from collections.abc import Callable, Sequence
+from typing import Final
+
+from aiohttp import web
+from app.infrastructure.health import Readiness
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек, секунды
+DEFAULT_BUCKETS: Final = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+CONTENT_TYPE: Final = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind: str = ""
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+    ) -> None:
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _check_labels(self, labels: tuple[str, ...]) -> None:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(
+                f"Metric `{self.name}` expects labels {self.labelnames}, got {labels}"
+            )
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self._samples(),
+        ]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        if not self._registry.enabled:
+            return
+        self._check_labels(labels)
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        self._check_labels(labels)
+        self._values[labels] = value
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Histogram(_Metric):
+    '''
+    Гистограмма с фиксированными корзинами: наблюдение - поиск корзины и три сложения,
+    без хранения самих значений
+    '''
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [счетчики по корзинам (последняя - +Inf), сумма, количество]
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not self._registry.enabled:
+            return
+        series = self._series.get(labels)
+        if series is None:
+            self._check_labels(labels)
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        # Граница `le` включительная: значение, равное границе, попадает в эту корзину
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def snapshot(self) -> dict[tuple[str, ...], tuple[list[int], float, int]]:
+        '''
+        Копия серий по меткам: (счетчики по корзинам без накопления, сумма, количество)
+        '''
+        return {
+            labels: (list(counts), total, count)
+            for labels, (counts, total, count) in self._series.items()
+        }
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+                )
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_str} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    '''
+    Метрики процесса в формате Prometheus. Пока реестр выключен (`configure`),
+    гистограммы и счетчики ничего не записывают. Коллекторы - функции,
+    обновляющие датчики непосредственно перед выдачей метрик
+    '''
+    def __init__(self) -> None:
+        self.enabled = False
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], None]] = []
+
+    def configure(self, *, enabled: bool) -> None:
+        self.enabled = enabled
+
+    def _add(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric `{metric.name}` is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(self, name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(self, name, documentation, labelnames, buckets=buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning("Metrics collector failed: %s", e)
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Реестр уровня процесса: включается в `main()`, если задан METRICS_ENABLED
+metrics = MetricsRegistry()
+
+update_seconds = metrics.histogram(
+    "bot_update_seconds", "Full update processing time.", ("event_type",)
+)
+middleware_seconds = metrics.histogram(
+    "bot_middleware_seconds",
+    "Time spent in an update middleware itself, excluding the rest of the chain.",
+    ("middleware",),
+)
+handler_seconds = metrics.histogram(
+    "bot_handler_seconds", "Handler execution time.", ("handler",)
+)
+query_seconds = metrics.histogram(
+    "db_query_seconds",
+    "Named db.py query execution time (queue time only inside run_batch).",
+    ("query",),
+)
+queries_per_update = metrics.histogram(
+    "db_queries_per_update",
+    "Named db.py queries run while processing one update.",
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+pool_wait_seconds = metrics.histogram(
+    "db_pool_wait_seconds", "Time spent waiting for a Postgres pool connection."
+)
+pool_size = metrics.gauge("db_pool_size", "Open Postgres pool connections.")
+pool_available = metrics.gauge("db_pool_available", "Idle Postgres pool connections.")
+pool_requests_waiting = metrics.gauge(
+    "db_pool_requests_waiting", "Clients waiting for a Postgres pool connection."
+)
+bot_api_seconds = metrics.histogram(
+    "bot_api_request_seconds", "Bot API request time.", ("method",)
+)
+bot_api_errors = metrics.counter(
+    "bot_api_errors_total", "Failed Bot API requests.", ("method", "error")
+)
+
+
+ready = metrics.gauge("bot_ready", "1 when the process has warmed up and takes updates.")
+
+
+class MetricsServer:
+    '''
+    Локальный HTTP-сервер, отдающий метрики реестра по GET `path`
+    и, если передан `readiness`, готовность по GET `ready_path` (200 или 503)
+    '''
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        *,
+        host: str,
+        port: int,
+        path: str = "/metrics",
+        readiness: Readiness | None = None,
+        ready_path: str = "/ready",
+    ) -> None:
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.path = path
+        self.readiness = readiness
+        self.ready_path = ready_path
+        self._runner: web.AppRunner | None = None
+        if readiness is not None:
+            registry.add_collector(lambda: ready.set(int(readiness.ready)))
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self.registry.render().encode(),
+            headers={"Content-Type": CONTENT_TYPE},
+        )
+
+    async def handle_ready(self, request: web.Request) -> web.Response:
+        if self.readiness.ready:
+            return web.Response(text="ready")
+        return web.Response(status=503, text="not ready")
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get(self.path, self.handle)
+        if self.readiness is not None:
+            app.router.add_get(self.ready_path, self.handle_ready)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host=self.host, port=self.port).start()
+        logger.info("Metrics are served on %s:%d%s", self.host, self.port, self.path)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
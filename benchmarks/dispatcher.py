@@ -0,0 +1,542 @@
+'''
+Пропускная способность диспетчера: настоящий `Dispatcher` со всеми роутерами и middleware
+(`build_dispatcher`) получает синтетические апдейты через `dp.feed_update`, а запросы
+к Bot API обслуживает заглушка сессии. Postgres и Redis - настоящие, из конфигурации бота.
+
+Сценарии: /start, /help, /lang с выбором языка и сохранением, /ban + /unban от админа,
+эхо обычного текста. Считает апдейты в секунду, p50/p95/p99 задержки, время каждой
+middleware (без вложенных) и каждого хэндлера - по гистограммам метрик бота, которые
+ставит `install_metrics`; результаты сохраняются в JSON, чтобы сравнивать прогоны
+на разных коммитах (--compare).
+
+Бенчмарк создает своих пользователей (user_id от BENCH_USER_BASE) и удаляет их
+по завершении, но запускать его стоит на отдельной БД и базе Redis с примененными миграциями.
+
+Запуск: python -m benchmarks.dispatcher [--updates N] [--concurrency N] [--compare old.json]
+'''
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import subprocess
+import time
+from collections import Counter, defaultdict
+from collections.abc import AsyncGenerator
+from contextlib import suppress
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from itertools import count
+from pathlib import Path
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
+from aiogram.enums import ParseMode
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Message, MessageId, Update
+from app.bot.bot import build_dispatcher
+from app.bot.enums.roles import UserRole
+from app.bot.menus import MENU_KEY_PREFIX
+from app.bot.middlewares.metrics import TimedMiddleware, install_metrics
+from app.infrastructure.cache.active_users import DailyActiveUsers
+from app.infrastructure.cache.fsm import BufferedRedisStorage
+from app.infrastructure.cache.profiles import user_profile_cache
+from app.infrastructure.cache.user_registry import REGISTRY_KEY, user_registry
+from app.infrastructure.database.activity import ActivityBuffer
+from app.infrastructure.database.connection import get_pg_pool
+from app.infrastructure.database.db import add_users_bulk
+from app.infrastructure.database.models import NewUser
+from app.infrastructure.database.queries import query_registry
+from app.infrastructure.metrics import handler_seconds, metrics, middleware_seconds
+from config_data.config import Config, load_config
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+BENCH_USER_BASE = 7_000_000_000
+BOT_TOKEN = "42:BENCHMARK"
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# Доли сценариев в потоке апдейтов; сценарий - последовательность апдейтов одного чата
+SCENARIO_WEIGHTS = {"start": 1, "help": 2, "lang": 1, "ban": 1, "echo": 5}
+
+
+class StubSession(BaseSession):
+    '''
+    Сессия Bot API без сети: отвечает готовыми объектами по типу результата метода
+    и считает вызовы. `latency` имитирует время ответа сервера Telegram
+    '''
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self._message_ids = count(1_000_000)
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod[TelegramType], timeout: int | None = None
+    ) -> TelegramType:
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        returning = method.__returning__
+        if returning is MessageId:
+            return MessageId(message_id=next(self._message_ids))
+        if returning is Message:
+            chat_id = getattr(method, "chat_id", 0)
+            return Message.model_validate(
+                {
+                    "message_id": next(self._message_ids),
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"},
+                    "text": getattr(method, "text", None),
+                },
+                context={"bot": bot},
+            )
+        # bool и объединения вида `Message | bool` (edit_*) - хэндлерам достаточно True
+        return True
+
+    async def stream_content(self, *args: Any, **kwargs: Any) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def middleware_chain(dp: Dispatcher) -> list[str]:
+    '''
+    Имена обернутых `install_metrics` middleware апдейтов в порядке цепочки
+    '''
+    return [
+        middleware.name
+        for manager in (dp.update.outer_middleware, dp.update.middleware)
+        for middleware in manager
+        if isinstance(middleware, TimedMiddleware)
+    ]
+
+
+def bucket_quantile(buckets: tuple[float, ...], counts: list[int], q: float) -> float:
+    '''
+    Квантиль по корзинам гистограммы с линейной интерполяцией внутри корзины,
+    как `histogram_quantile` в Prometheus. Для последней корзины (+Inf) - ее нижняя граница
+    '''
+    rank = q * sum(counts)
+    cumulative = 0
+    for i, bucket_count in enumerate(counts):
+        if bucket_count and cumulative + bucket_count >= rank:
+            if i == len(buckets):
+                return buckets[-1]
+            lower = buckets[i - 1] if i else 0.0
+            return lower + (buckets[i] - lower) * (rank - cumulative) / bucket_count
+        cumulative += bucket_count
+    return buckets[-1]
+
+
+@dataclass
+class Chat:
+    '''
+    Пользователи одного воркера: обычные, админ и цель для /ban
+    '''
+    users: list[int]
+    admin_id: int
+    ban_target_id: int
+    languages: dict[int, str] = field(default_factory=dict)
+
+
+class UpdateFactory:
+    def __init__(self, bot: Bot) -> None:
+        self.bot = bot
+        self._update_ids = count(1)
+        self._message_ids = count(1)
+
+    def _user(self, user_id: int) -> dict[str, Any]:
+        return {
+            "id": user_id,
+            "is_bot": False,
+            "first_name": f"Bench {user_id}",
+            "username": f"bench_{user_id}",
+            "language_code": "ru",
+        }
+
+    def message(self, user_id: int, text: str) -> Update:
+        return Update.model_validate(
+            {
+                "update_id": next(self._update_ids),
+                "message": {
+                    "message_id": next(self._message_ids),
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": self._user(user_id),
+                    "text": text,
+                },
+            },
+            context={"bot": self.bot},
+        )
+
+    def callback(self, user_id: int, data: str) -> Update:
+        return Update.model_validate(
+            {
+                "update_id": next(self._update_ids),
+                "callback_query": {
+                    "id": str(next(self._update_ids)),
+                    "from": self._user(user_id),
+                    "chat_instance": "benchmark",
+                    "data": data,
+                    "message": {
+                        "message_id": next(self._message_ids),
+                        "date": int(time.time()),
+                        "chat": {"id": user_id, "type": "private"},
+                        "from": {"id": 42, "is_bot": True, "first_name": "Bot"},
+                        "text": "lang",
+                    },
+                },
+            },
+            context={"bot": self.bot},
+        )
+
+    def scenario(self, name: str, chat: Chat, rng: random.Random) -> list[Update]:
+        if name == "ban":
+            target = str(chat.ban_target_id)
+            return [
+                self.message(chat.admin_id, f"/ban {target}"),
+                self.message(chat.admin_id, f"/unban {target}"),
+            ]
+        user_id = rng.choice(chat.users)
+        if name == "start":
+            return [self.message(user_id, "/start")]
+        if name == "help":
+            return [self.message(user_id, "/help")]
+        if name == "lang":
+            # Язык чередуется, чтобы сохранение меняло профиль и меню команд
+            language = "en" if chat.languages.get(user_id, "ru") == "ru" else "ru"
+            chat.languages[user_id] = language
+            return [
+                self.message(user_id, "/lang"),
+                self.callback(user_id, language),
+                self.callback(user_id, "save_lang_button_data"),
+            ]
+        return [self.message(user_id, f"echo {rng.random()}")]
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if len(values) < 2:
+        value = values[0] * 1000 if values else 0.0
+        return {"p50": value, "p95": value, "p99": value, "mean": value, "max": value}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {
+        "p50": cuts[49] * 1000,
+        "p95": cuts[94] * 1000,
+        "p99": cuts[98] * 1000,
+        "mean": statistics.fmean(values) * 1000,
+        "max": max(values) * 1000,
+    }
+
+
+def git_revision() -> dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+async def seed(db_pool, chats: list[Chat]) -> list[int]:
+    users = []
+    for chat in chats:
+        users.append(NewUser(user_id=chat.admin_id, firstname="Admin", lastname="", role=UserRole.ADMIN))
+        users.append(NewUser(user_id=chat.ban_target_id, firstname="Target", lastname=""))
+        users.extend(NewUser(user_id=user_id, firstname="User", lastname="") for user_id in chat.users)
+    async with db_pool.connection() as conn:
+        await add_users_bulk(conn, users=users)
+    return [user.user_id for user in users]
+
+
+async def cleanup(db_pool, redis: Redis, storage: BufferedRedisStorage, user_ids: list[int]) -> None:
+    async with db_pool.connection() as conn:
+        for table in ("activity", "activity_totals", "users"):
+            await conn.execute(f"DELETE FROM {table} WHERE user_id = ANY(%s);", (user_ids,))
+    bot_id = int(BOT_TOKEN.split(":")[0])
+    for user_id in user_ids:
+        key = StorageKey(bot_id=bot_id, chat_id=user_id, user_id=user_id)
+        await storage.set_state(key, None)
+        await storage.set_data(key, {})
+    await redis.hdel(REGISTRY_KEY, *map(str, user_ids))
+    await redis.delete(*(f"{MENU_KEY_PREFIX}{user_id}" for user_id in user_ids))
+
+
+async def run(args: argparse.Namespace, config: Config) -> dict[str, Any]:
+    redis = Redis(
+        host=config.redis.host,
+        port=config.redis.port,
+        db=config.redis.db,
+        password=config.redis.password,
+        username=config.redis.username,
+    )
+    storage = BufferedRedisStorage(
+        redis,
+        state_ttl=config.fsm.state_ttl,
+        data_ttl=config.fsm.data_ttl,
+        serializer=config.fsm.serializer,
+    )
+    user_profile_cache.configure(
+        maxsize=config.cache.user_profile_maxsize,
+        ttl=config.cache.user_profile_ttl,
+        redis=redis,
+    )
+    user_registry.configure(redis=redis)
+    db_pool = await get_pg_pool(
+        db_name=config.db.name,
+        host=config.db.host,
+        port=config.db.port,
+        user=config.db.username,
+        password=config.db.password,
+        min_size=config.db.pool_min_size,
+        max_size=config.db.pool_max_size,
+        timeout=config.db.pool_timeout,
+        max_idle=config.db.pool_max_idle,
+        max_lifetime=config.db.pool_max_lifetime,
+        max_waiting=config.db.pool_max_waiting,
+        reconnect_timeout=config.db.pool_reconnect_timeout,
+        open_attempts=config.db.pool_open_attempts,
+        open_backoff=config.db.pool_open_backoff,
+        configure=query_registry.prepare,
+    )
+    query_registry.configure(
+        slow_threshold=config.db.slow_query_threshold,
+        explain_pool=db_pool if config.db.slow_query_explain else None,
+        explain_interval=config.db.slow_query_explain_interval,
+    )
+    active_users = DailyActiveUsers(
+        redis, retention_days=config.statistics.active_users_retention_days
+    )
+    activity_buffer = ActivityBuffer(
+        db_pool,
+        flush_interval=config.statistics.flush_interval,
+        max_batch_size=config.statistics.max_batch_size,
+        active_users=active_users,
+    )
+    activity_flusher = asyncio.create_task(activity_buffer.run())
+
+    dp = build_dispatcher(
+        config,
+        storage=storage,
+        redis=redis,
+        db_pool=db_pool,
+        activity_buffer=activity_buffer,
+        active_users=active_users,
+    )
+    session = StubSession(latency=args.api_latency / 1000)
+    bot = Bot(
+        token=BOT_TOKEN,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    # Время middleware и хэндлеров пишут те же гистограммы, что и в боте;
+    # реестр включается только на время замера
+    install_metrics(dp, bot)
+    latencies: dict[str, list[float]] = defaultdict(list)
+
+    next_id = count(BENCH_USER_BASE)
+    chats = [
+        Chat(
+            users=[next(next_id) for _ in range(args.users)],
+            admin_id=next(next_id),
+            ban_target_id=next(next_id),
+        )
+        for _ in range(args.concurrency)
+    ]
+    user_ids: list[int] = []
+    try:
+        async with db_pool.connection() as conn:
+            await user_registry.build(conn)
+        user_ids = await seed(db_pool, chats)
+
+        factory = UpdateFactory(bot)
+        names = list(SCENARIO_WEIGHTS)
+        weights = list(SCENARIO_WEIGHTS.values())
+
+        async def worker(chat: Chat, budget: int, rng: random.Random) -> None:
+            # Апдейты одного чата идут по порядку, как в `ShardedUpdateExecutor`
+            while budget > 0:
+                name = rng.choices(names, weights)[0]
+                for update in factory.scenario(name, chat, rng):
+                    started = time.perf_counter()
+                    await dp.feed_update(bot, update)
+                    elapsed = time.perf_counter() - started
+                    if metrics.enabled:
+                        latencies[name].append(elapsed)
+                    budget -= 1
+
+        async def phase(total: int, seed_offset: int) -> float:
+            per_worker = -(-total // args.concurrency)
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                worker(chat, per_worker, random.Random(args.seed + seed_offset + i))
+                for i, chat in enumerate(chats)
+            ))
+            return time.perf_counter() - started
+
+        # Прогрев: подготовленные запросы, кэш профилей, соединения пула
+        await phase(args.warmup, seed_offset=10_000)
+        session.calls.clear()
+        queries_before = query_registry.stats()
+
+        metrics.configure(enabled=True)
+        elapsed = await phase(args.updates, seed_offset=0)
+        metrics.configure(enabled=False)
+
+        queries_after = query_registry.stats()
+    finally:
+        activity_flusher.cancel()
+        with suppress(asyncio.CancelledError):
+            await activity_flusher
+        await activity_buffer.close()
+        if user_ids and not args.keep_data:
+            await cleanup(db_pool, redis, storage, user_ids)
+        await query_registry.close()
+        await db_pool.close()
+        await redis.aclose()
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    handled = len(all_latencies)
+    middlewares = {
+        labels[0]: total for labels, (_, total, _) in middleware_seconds.snapshot().items()
+    }
+    handlers = handler_seconds.snapshot()
+    middleware_total = sum(middlewares.values())
+    handler_total = sum(total for _, total, _ in handlers.values())
+    return {
+        **git_revision(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "params": {
+            "updates": args.updates,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "api_latency_ms": args.api_latency,
+            "seed": args.seed,
+            "fsm_serializer": config.fsm.serializer,
+            "pool_max_size": config.db.pool_max_size,
+        },
+        "updates": handled,
+        "elapsed_s": elapsed,
+        "throughput": handled / elapsed,
+        "latency_ms": percentiles(all_latencies),
+        "scenarios": {
+            name: {"count": len(values), **percentiles(values)}
+            for name, values in sorted(latencies.items())
+        },
+        # Суммарное собственное время по всем апдейтам и среднее на апдейт
+        "middlewares_ms": {
+            name: {
+                "total": middlewares.get(name, 0.0) * 1000,
+                "per_update_us": middlewares.get(name, 0.0) / handled * 1e6,
+            }
+            for name in middleware_chain(dp)
+        },
+        # Квантили хэндлеров оценены по корзинам гистограммы, среднее - точное
+        "handlers_ms": {
+            name: {
+                "count": count,
+                "p50": bucket_quantile(handler_seconds.buckets, counts, 0.5) * 1000,
+                "p95": bucket_quantile(handler_seconds.buckets, counts, 0.95) * 1000,
+                "mean": total / count * 1000,
+            }
+            for (name,), (counts, total, count) in sorted(handlers.items())
+        },
+        # Фильтры, поиск хэндлера и прочее время aiogram вне middleware и хэндлеров
+        "dispatch_overhead_ms": (sum(all_latencies) - middleware_total - handler_total) * 1000,
+        "bot_api_calls": dict(session.calls),
+        "queries": {
+            name: calls - queries_before.get(name, 0)
+            for name, calls in queries_after.items()
+            if calls - queries_before.get(name, 0)
+        },
+    }
+
+
+def report(results: dict[str, Any], baseline: dict[str, Any] | None) -> None:
+    def delta(new: float, old: float | None) -> str:
+        if not old:
+            return ""
+        return f" ({(new - old) / old * 100:+.1f}%)"
+
+    latency = results["latency_ms"]
+    base_latency = baseline["latency_ms"] if baseline else {}
+    print(
+        f"updates: {results['updates']}, elapsed: {results['elapsed_s']:.2f}s, "
+        f"throughput: {results['throughput']:.0f} upd/s"
+        + delta(results["throughput"], baseline and baseline["throughput"])
+    )
+    print(
+        "latency ms: "
+        + ", ".join(
+            f"{key} {latency[key]:.2f}{delta(latency[key], base_latency.get(key))}"
+            for key in ("p50", "p95", "p99")
+        )
+    )
+    if baseline:
+        print(f"baseline: {baseline.get('commit')} ({baseline.get('created_at')})")
+
+    print(f"\n{'scenario':<12}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in results["scenarios"].items():
+        print(f"{name:<12}{stats['count']:>8}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}")
+
+    print(f"\n{'middleware':<40}{'total ms':>10}{'us/update':>11}")
+    for name, stats in results["middlewares_ms"].items():
+        print(f"{name:<40}{stats['total']:>10.1f}{stats['per_update_us']:>11.1f}")
+    print(f"{'dispatch overhead':<40}{results['dispatch_overhead_ms']:>10.1f}")
+
+    print(f"\n{'handler':<34}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, stats in results["handlers_ms"].items():
+        print(f"{name:<34}{stats['count']:>8}{stats['p50']:>10.2f}{stats['p95']:>10.2f}")
+
+    print(f"\nBot API calls: {results['bot_api_calls']}")
+    print(f"Queries: {results['queries']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16, help="параллельных чатов-воркеров")
+    parser.add_argument("--users", type=int, default=50, help="пользователей на воркер")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа Bot API, мс")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", default=None, help="путь к .env с настройками Postgres и Redis")
+    parser.add_argument("--output", type=Path, default=None, help="куда сохранить JSON с результатами")
+    parser.add_argument("--compare", type=Path, default=None, help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--keep-data", action="store_true", help="не удалять тестовых пользователей")
+    args = parser.parse_args()
+
+    config = load_config(args.env)
+    logging.basicConfig(level=logging.WARNING, format=config.log.format)
+
+    results = asyncio.run(run(args, config))
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    report(results, baseline)
+
+    output = args.output
+    if output is None:
+        commit = (results["commit"] or "unknown")[:10]
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        output = RESULTS_DIR / f"dispatcher-{commit}-{stamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
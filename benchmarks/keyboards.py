@@ -0,0 +1,81 @@
+'''
+Сравнение сборки клавиатур на каждый апдейт с готовыми объектами из `KeyboardCache`.
+Для каждого варианта считает время и выделенную память на один вызов (tracemalloc).
+
+Запуск: python -m benchmarks.keyboards [--iterations N]
+'''
+import argparse
+import gc
+import time
+import tracemalloc
+from collections.abc import Callable
+
+from app.bot.enums.roles import UserRole
+from app.bot.keyboards.keyboards import get_lang_settings_kb
+from app.bot.keyboards.memo import KeyboardCache
+from app.bot.keyboards.menu_button import get_main_menu_commands
+
+# Тексты не влияют на число создаваемых объектов, поэтому переводы - заглушки
+# с ключами, которые используют клавиатуры и меню команд
+I18N_KEYS = (
+    "ru", "en", "cancel_lang_button_text", "save_lang_button_text",
+    "/start_description", "/lang_description", "/help_description", "/tasks_description",
+    "/ban_description", "/unban_description", "/statistics_description",
+)
+RU = {key: f"ru:{key}" for key in I18N_KEYS}
+EN = {key: f"en:{key}" for key in I18N_KEYS}
+TRANSLATIONS = {"default": "ru", "en": EN, "ru": RU}
+LOCALES = list(TRANSLATIONS)
+
+
+def measure(func: Callable[[], object], iterations: int) -> tuple[float, float, int]:
+    '''
+    Возвращает (мкс на вызов, байт на вызов, пик памяти в байтах)
+    '''
+    func()
+    gc.collect()
+    tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+    results = [func() for _ in range(iterations)]
+    snapshot_after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocated = sum(
+        stat.size_diff for stat in snapshot_after.compare_to(snapshot_before, "filename")
+    )
+    del results
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - started
+    return elapsed / iterations * 1e6, allocated / iterations, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=10_000)
+    args = parser.parse_args()
+
+    keyboards = KeyboardCache(TRANSLATIONS)
+    cases = {
+        "lang_settings_kb: build": lambda: get_lang_settings_kb(
+            i18n=RU, locales=LOCALES, checked="en"
+        ),
+        "lang_settings_kb: cache": lambda: keyboards.lang_settings_kb("ru", checked="en"),
+        "main_menu_commands: build": lambda: get_main_menu_commands(
+            i18n=RU, role=UserRole.ADMIN
+        ),
+        "main_menu_commands: cache": lambda: keyboards.main_menu_commands(
+            "ru", role=UserRole.ADMIN
+        ),
+    }
+
+    print(f"{'case':<28}{'us/call':>10}{'bytes/call':>12}{'peak KiB':>10}")
+    for name, func in cases.items():
+        per_call_us, per_call_bytes, peak = measure(func, args.iterations)
+        print(f"{name:<28}{per_call_us:>10.2f}{per_call_bytes:>12.0f}{peak / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
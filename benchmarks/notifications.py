@@ -0,0 +1,245 @@
+'''
+Проверка `NotificationDispatcher` на фейковой сессии Bot API: сессия записывает время
+каждой отправки, отвечает 429 на каждый `--flood-every` запрос и 403 для заблокировавших
+бота чатов. Проверяет, что лимиты чата и глобальный лимит соблюдены, порядок сообщений
+в чате сохранен, после 429 сообщения отправлены повторно, а заблокировавшие бота чаты
+собраны для пометки `is_alive=False`.
+
+С `--env` заблокировавшие бота пользователи создаются в Postgres из конфигурации бота,
+и после остановки проверяется, что они помечены неактивными (затем удаляются).
+
+Запуск: python -m benchmarks.notifications [--chats N] [--messages N] [--env .env]
+'''
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from collections import defaultdict
+from collections.abc import AsyncGenerator
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Message
+from app.bot.notifications import NotificationDispatcher
+from app.infrastructure.database.connection import get_pg_pool
+from app.infrastructure.database.db import add_users_bulk
+from app.infrastructure.database.models import NewUser
+from config_data.config import load_config
+
+logger = logging.getLogger(__name__)
+
+BENCH_CHAT_BASE = 7_100_000_000
+BOT_TOKEN = "42:NOTIFICATIONS"
+# Допуск на точность таймеров цикла событий при проверке интервалов
+TIMER_SLACK = 0.01
+
+
+class FakeSession(BaseSession):
+    '''
+    Сессия Bot API без сети для `send_message`: записывает (время, текст) отправок
+    по чатам, отвечает 429 на каждый `flood_every` запрос и 403 для чатов из `blocked`
+    '''
+    def __init__(
+        self,
+        *,
+        blocked: set[int],
+        flood_every: int = 0,
+        flood_retry_after: int = 1,
+        latency: float = 0.0,
+    ) -> None:
+        super().__init__()
+        self.blocked = blocked
+        self.flood_every = flood_every
+        self.flood_retry_after = flood_retry_after
+        self.latency = latency
+        self.requests = 0
+        self.floods = 0
+        self.forbidden = 0
+        self.sent: dict[int, list[tuple[float, str]]] = defaultdict(list)
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod[TelegramType], timeout: int | None = None
+    ) -> TelegramType:
+        if not isinstance(method, SendMessage):
+            raise RuntimeError(f"Unexpected Bot API method {type(method).__name__}")
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method.chat_id in self.blocked:
+            self.forbidden += 1
+            raise TelegramForbiddenError(
+                method=method, message="Forbidden: bot was blocked by the user"
+            )
+        if self.flood_every and self.requests % self.flood_every == 0:
+            self.floods += 1
+            raise TelegramRetryAfter(
+                method=method, message="Too Many Requests", retry_after=self.flood_retry_after
+            )
+        self.sent[method.chat_id].append((time.monotonic(), method.text))
+        return Message.model_validate(
+            {
+                "message_id": self.requests,
+                "date": int(time.time()),
+                "chat": {"id": method.chat_id, "type": "private"},
+                "text": method.text,
+            },
+            context={"bot": bot},
+        )
+
+    async def stream_content(self, *args: Any, **kwargs: Any) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def check(args: argparse.Namespace, session: FakeSession, chat_ids: list[int]) -> list[str]:
+    '''
+    Возвращает список нарушений: пропуски и дубли, порядок, интервалы в чате, глобальный лимит
+    '''
+    errors = []
+    chat_interval = 1 / args.chat_rate
+    for chat_id in chat_ids:
+        sent = session.sent.get(chat_id, [])
+        if chat_id in session.blocked:
+            if sent:
+                errors.append(f"chat {chat_id}: {len(sent)} messages sent to a blocked chat")
+            continue
+        texts = [text for _, text in sent]
+        expected = [f"{chat_id}:{i}" for i in range(args.messages)]
+        if texts != expected:
+            errors.append(f"chat {chat_id}: got {texts}, expected {expected}")
+        # Первые `chat_burst` сообщений могут уйти подряд, дальше - не чаще `chat_rate`
+        times = [sent_at for sent_at, _ in sent]
+        for i in range(args.chat_burst, len(times)):
+            gap = times[i] - times[i - args.chat_burst]
+            if gap < args.chat_burst * chat_interval - TIMER_SLACK:
+                errors.append(f"chat {chat_id}: {args.chat_burst + 1} messages within {gap:.3f}s")
+                break
+
+    # Ведро глобального лимита вмещает `global_rate` токенов, поэтому за любую секунду
+    # уходит не больше удвоенного лимита
+    times = sorted(sent_at for sent in session.sent.values() for sent_at, _ in sent)
+    peak = start = 0
+    for end, sent_at in enumerate(times):
+        while sent_at - times[start] >= 1.0:
+            start += 1
+        peak = max(peak, end - start + 1)
+    if peak > 2 * args.global_rate:
+        errors.append(f"{peak} messages within one second, global rate is {args.global_rate}")
+    return errors
+
+
+async def run(args: argparse.Namespace) -> int:
+    chat_ids = [BENCH_CHAT_BASE + i for i in range(args.chats)]
+    blocked = set(chat_ids[::args.block_every]) if args.block_every else set()
+    session = FakeSession(
+        blocked=blocked,
+        flood_every=args.flood_every,
+        flood_retry_after=args.flood_retry_after,
+        latency=args.api_latency / 1000,
+    )
+    bot = Bot(token=BOT_TOKEN, session=session)
+
+    db_pool = None
+    if args.env:
+        config = load_config(args.env)
+        db_pool = await get_pg_pool(
+            db_name=config.db.name,
+            host=config.db.host,
+            port=config.db.port,
+            user=config.db.username,
+            password=config.db.password,
+            min_size=1,
+            max_size=2,
+        )
+        async with db_pool.connection() as conn:
+            await add_users_bulk(
+                conn,
+                users=[NewUser(user_id=chat_id, firstname="Blocked", lastname="") for chat_id in blocked],
+            )
+
+    notifier = NotificationDispatcher(
+        bot,
+        db_pool,
+        workers=args.workers,
+        global_rate=args.global_rate,
+        chat_rate=args.chat_rate,
+        chat_burst=args.chat_burst,
+        max_retries=args.max_retries,
+        flush_interval=1.0,
+    )
+    try:
+        await notifier.start()
+        started = time.perf_counter()
+        # Сообщения чатов перемешаны, как у рассылки по нескольким спискам
+        for i in range(args.messages):
+            for chat_id in chat_ids:
+                await notifier.notify(chat_id, f"{chat_id}:{i}")
+        await notifier.stop()
+        elapsed = time.perf_counter() - started
+
+        errors = check(args, session, chat_ids)
+        stats = notifier.stats()
+        expected_failed = len(blocked) * args.messages
+        if stats["failed"] != expected_failed:
+            errors.append(f"{stats['failed']} failed notifications, expected {expected_failed}")
+        if stats["retried"] < session.floods:
+            errors.append(f"{stats['retried']} retries for {session.floods} flood waits")
+
+        if db_pool is not None and blocked:
+            async with db_pool.connection() as conn:
+                cursor = await conn.execute(
+                    "SELECT count(*) FROM users WHERE user_id = ANY(%s) AND is_alive;",
+                    (list(blocked),),
+                )
+                (alive,) = await cursor.fetchone()
+            if alive:
+                errors.append(f"{alive} of {len(blocked)} blocked users are still alive")
+    finally:
+        if db_pool is not None:
+            async with db_pool.connection() as conn:
+                await conn.execute("DELETE FROM users WHERE user_id = ANY(%s);", (list(blocked),))
+            await db_pool.close()
+        await bot.session.close()
+
+    total = args.chats * args.messages
+    print(f"notifications: {total}, elapsed: {elapsed:.2f}s, rate: {total / elapsed:.1f}/s")
+    print(f"requests: {session.requests}, flood waits: {session.floods}, forbidden: {session.forbidden}")
+    print(f"dispatcher stats: {stats}")
+    if errors:
+        print(f"\nFAILED ({len(errors)}):")
+        for error in errors[:20]:
+            print(f"  {error}")
+        return 1
+    print("\nOK: limits, order, retries and blocked chats are as expected")
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=3, help="сообщений в каждый чат")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--global-rate", type=float, default=100.0)
+    parser.add_argument("--chat-rate", type=float, default=5.0)
+    parser.add_argument("--chat-burst", type=int, default=1)
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--block-every", type=int, default=20, help="каждый N-й чат заблокировал бота")
+    parser.add_argument("--flood-every", type=int, default=250, help="каждый N-й запрос получает 429")
+    parser.add_argument("--flood-retry-after", type=int, default=1)
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа Bot API, мс")
+    parser.add_argument("--env", default=None, help="путь к .env с настройками Postgres")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,39 @@
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from environs import Env
 # import os
 
 
 logger = logging.getLogger(__name__)
 
+# Минимальная длина месяца: столько дней вперед гарантированно покрывает каждая секция task_process
+PARTITION_MIN_DAYS = 28
+
 
 @dataclass
 class BotConf:
     token: str  # Токен для доступа к телеграм-боту
     admin_ids: list[int]  # Список id администраторов бота
+    api_url: str | None = None  # Адрес Bot API сервера (локального или тестового), пусто - api.telegram.org
+
+
+@dataclass
+class WebhookConf:
+    enabled: bool           # Принимать апдейты вебхуком вместо long polling
+    base_url: str | None    # Внешний адрес бота; пусто - вебхук в Telegram не регистрируется
+    path: str               # Путь, на который Telegram присылает апдейты
+    host: str               # Адрес, который слушает локальный aiohttp-сервер
+    port: int               # Порт локального aiohttp-сервера
+    secret_token: str | None    # Секрет для заголовка X-Telegram-Bot-Api-Secret-Token
+    shutdown_timeout: float     # Сколько ждать обработку принятых апдейтов при остановке
+
+
+@dataclass
+class ExecutorConf:
+    shards: int             # Число очередей-воркеров; апдейты одного чата всегда попадают в одну
+    queue_size: int         # Размер каждой очереди; при переполнении поллинг ждет, вебхук отвечает 503
+    shutdown_timeout: float     # Сколько ждать обработку апдейтов из очередей при остановке
+    stats_interval: float   # Период логирования глубины очередей, 0 - не логировать
 
 
 @dataclass
@@ -20,6 +43,21 @@ class DatabaseConf:
     port: int       # порт базы данных
     username: str       # Username пользователя базы данных
     password: str   # Пароль к базе данных
+    pool_min_size: int          # Минимальное число соединений в пуле
+    pool_max_size: int          # Максимальное число соединений в пуле
+    pool_timeout: float         # Сколько ждать свободное соединение, секунды
+    pool_max_idle: float        # Через сколько закрывать простаивающее соединение, секунды
+    pool_max_lifetime: float    # Максимальное время жизни соединения, секунды
+    pool_max_waiting: int       # Предел очереди ожидающих соединение (0 - без ограничения)
+    pool_reconnect_timeout: float   # Сколько пул пытается переподключиться, секунды
+    pool_open_attempts: int     # Число попыток дождаться готовности пула при старте
+    pool_open_backoff: float    # Начальная пауза между попытками, секунды (удваивается)
+    pool_stats_interval: float  # Период отчета о состоянии пула, секунды (0 - отключено)
+    migrations_lock_timeout: str    # lock_timeout для миграций, например '5s'
+    slow_query_threshold: float     # Порог медленного запроса, секунды (0 - не отслеживать)
+    slow_query_explain: bool        # Логировать план EXPLAIN медленных запросов
+    slow_query_explain_interval: float  # Не чаще раза в столько секунд для каждого запроса
+    query_budget: int       # Предупреждать, если апдейт выполнил больше запросов (0 - не считать)
 
 
 @dataclass
@@ -31,17 +69,99 @@ class RedisConf:
     password: str
 
 
+@dataclass
+class FsmConf:
+    state_ttl: int | None   # Время жизни состояния FSM без изменений, секунды (пусто - бессрочно)
+    data_ttl: int | None    # Время жизни данных FSM без изменений, секунды (пусто - бессрочно)
+    serializer: str         # Формат данных FSM в Redis: json или msgpack
+
+
+@dataclass
+class CacheConf:
+    user_profile_maxsize: int   # Максимальное число профилей в LRU-кэше процесса
+    user_profile_ttl: float     # Время жизни профиля в кэше, секунды
+    menu_fingerprint_ttl: float     # Сколько хранить отпечаток меню команд чата в Redis, секунды
+
+
+@dataclass
+class StatisticsConf:
+    flush_interval: float   # Период сброса счетчиков активности в БД, секунды
+    max_batch_size: int     # Максимум строк в одном пакетном запросе
+    active_users_retention_days: int    # Сколько дней хранить счетчики уникальных активных в Redis
+
+
+@dataclass
+class SchedulerConf:
+    enabled: bool           # Разворачивать ли повторяющиеся задачи в этом процессе
+    horizon_days: int       # На сколько дней вперед создавать выполнения задач
+    interval: float         # Период запуска разворачивания, секунды
+    batch_size: int         # Сколько задач обрабатывать одной транзакцией
+    max_occurrences: int    # Сколько выполнений одной задачи создавать за проход
+    status_key: str         # Код статуса, с которым создаются выполнения
+    partitions_ahead: int   # На сколько месяцев вперед создавать секции task_process
+    retention_months: int   # Сколько полных месяцев хранить секции task_process в БД
+    archive_dir: str        # Каталог для архивов отключенных секций (csv.gz)
+    maintenance_interval: float     # Период обслуживания секций, секунды
+
+
+@dataclass
+class NotificationsConf:
+    workers: int            # Число воркеров, отправляющих уведомления
+    global_rate: float      # Максимум сообщений в секунду на весь бот
+    chat_rate: float        # Максимум сообщений в секунду в один чат
+    chat_burst: int         # Сколько сообщений подряд можно отправить в чат без ожидания
+    queue_size: int         # Максимум уведомлений в очереди; при переполнении постановка ждет
+    max_retries: int        # Сколько раз повторять отправку после 429 и сетевых ошибок
+    flush_interval: float   # Период пометки заблокировавших бота пользователей, секунды
+    shutdown_timeout: float     # Сколько ждать отправку очереди при остановке
+    reminders_enabled: bool     # Отправлять ли из этого процесса напоминания о задачах
+    reminder_interval: float    # Период проверки наступивших выполнений задач, секунды
+    reminder_lookback: float    # Насколько старые пропущенные выполнения еще напоминать, секунды
+    reminder_batch_size: int    # Сколько выполнений забирать одним запросом
+
+
+@dataclass
+class MetricsConf:
+    enabled: bool   # Собирать метрики и отдавать их по HTTP в формате Prometheus
+    host: str       # Адрес, который слушает сервер метрик
+    port: int       # Порт сервера метрик
+    path: str       # Путь, по которому отдаются метрики
+    ready_path: str     # Путь проверки готовности (200 - принимает апдейты, 503 - нет)
+
+
+@dataclass
+class WarmupConf:
+    enabled: bool           # Прогревать пул, запросы и кэши до начала приема апдейтов
+    pool_size: int          # Сколько соединений пула открыть заранее (0 - максимум пула)
+    profiles_limit: int     # Сколько профилей самых активных пользователей загрузить в кэш
+    profiles_days: int      # За сколько последних дней учитывать активность
+
+
 @dataclass
 class LoggConf:
     level: str
     format: str
+    json: bool = False          # Писать записи строками JSON вместо `format`
+    queue_size: int = 10_000    # Размер очереди записей перед потоком вывода
+    queue_policy: str = "drop_new"  # Что отбрасывать при переполнении: drop_new или drop_old
+    sample_rates: dict[str, float] = field(default_factory=dict)    # Логгер -> доля записей ниже WARNING
+    rate_limits: dict[str, float] = field(default_factory=dict)     # Логгер -> записей ниже WARNING в секунду
 
 
 @dataclass
 class Config:
     bot: BotConf
+    webhook: WebhookConf
+    executor: ExecutorConf
     db: DatabaseConf
     redis: RedisConf
+    fsm: FsmConf
+    cache: CacheConf
+    statistics: StatisticsConf
+    scheduler: SchedulerConf
+    notifications: NotificationsConf
+    metrics: MetricsConf
+    warmup: WarmupConf
     log: LoggConf
 
 
@@ -57,7 +177,28 @@ def load_config(path: str | None = None) -> Config:
         admin_ids = [int(x) for x in raw_ids]
     except ValueError as e:
         raise ValueError(f"ADMIN_IDS must be integers, got: {raw_ids}") from e
-    bot = BotConf(token=token, admin_ids=admin_ids)
+    bot = BotConf(
+        token=token,
+        admin_ids=admin_ids,
+        api_url=env("BOT_API_URL", default=None) or None,
+    )
+
+    webhook = WebhookConf(
+        enabled=env.bool("WEBHOOK_ENABLED", default=False),
+        base_url=env("WEBHOOK_BASE_URL", default=None) or None,
+        path=env("WEBHOOK_PATH", default="/webhook"),
+        host=env("WEBHOOK_HOST", default="127.0.0.1"),
+        port=env.int("WEBHOOK_PORT", default=8080),
+        secret_token=env("WEBHOOK_SECRET", default=None) or None,
+        shutdown_timeout=env.float("WEBHOOK_SHUTDOWN_TIMEOUT", default=30.0),
+    )
+
+    executor = ExecutorConf(
+        shards=env.int("EXECUTOR_SHARDS", default=8),
+        queue_size=env.int("EXECUTOR_QUEUE_SIZE", default=100),
+        shutdown_timeout=env.float("EXECUTOR_SHUTDOWN_TIMEOUT", default=30.0),
+        stats_interval=env.float("EXECUTOR_STATS_INTERVAL", default=60.0),
+    )
 
     db = DatabaseConf(
         name=env("POSTGRES_DB"),
@@ -65,6 +206,23 @@ def load_config(path: str | None = None) -> Config:
         port=env("POSTGRES_PORT"),
         username=env("POSTGRES_USERNAME"),
         password=env("POSTGRES_PASSWORD"),
+        pool_min_size=env.int("POSTGRES_POOL_MIN_SIZE", default=1),
+        pool_max_size=env.int("POSTGRES_POOL_MAX_SIZE", default=3),
+        pool_timeout=env.float("POSTGRES_POOL_TIMEOUT", default=10.0),
+        pool_max_idle=env.float("POSTGRES_POOL_MAX_IDLE", default=600.0),
+        pool_max_lifetime=env.float("POSTGRES_POOL_MAX_LIFETIME", default=3600.0),
+        pool_max_waiting=env.int("POSTGRES_POOL_MAX_WAITING", default=0),
+        pool_reconnect_timeout=env.float("POSTGRES_POOL_RECONNECT_TIMEOUT", default=300.0),
+        pool_open_attempts=env.int("POSTGRES_POOL_OPEN_ATTEMPTS", default=5),
+        pool_open_backoff=env.float("POSTGRES_POOL_OPEN_BACKOFF", default=1.0),
+        pool_stats_interval=env.float("POSTGRES_POOL_STATS_INTERVAL", default=60.0),
+        migrations_lock_timeout=env("POSTGRES_MIGRATIONS_LOCK_TIMEOUT", default="5s"),
+        slow_query_threshold=env.float("POSTGRES_SLOW_QUERY_THRESHOLD", default=0.1),
+        slow_query_explain=env.bool("POSTGRES_SLOW_QUERY_EXPLAIN", default=True),
+        slow_query_explain_interval=env.float(
+            "POSTGRES_SLOW_QUERY_EXPLAIN_INTERVAL", default=300.0
+        ),
+        query_budget=env.int("POSTGRES_QUERY_BUDGET", default=10),
     )
 
     redis = RedisConf(
@@ -75,16 +233,100 @@ def load_config(path: str | None = None) -> Config:
         password=env("REDIS_PASSWORD"),
     )
 
+    fsm = FsmConf(
+        state_ttl=env.int("FSM_STATE_TTL", default=None) or None,
+        data_ttl=env.int("FSM_DATA_TTL", default=None) or None,
+        serializer=env("FSM_SERIALIZER", default="json"),
+    )
+
+    cache = CacheConf(
+        user_profile_maxsize=env.int("USER_CACHE_MAXSIZE", default=10_000),
+        user_profile_ttl=env.float("USER_CACHE_TTL", default=300.0),
+        menu_fingerprint_ttl=env.float("MENU_FINGERPRINT_TTL", default=30 * 24 * 3600.0),
+    )
+
+    statistics = StatisticsConf(
+        flush_interval=env.float("ACTIVITY_FLUSH_INTERVAL", default=5.0),
+        max_batch_size=env.int("ACTIVITY_MAX_BATCH_SIZE", default=1000),
+        active_users_retention_days=env.int("ACTIVE_USERS_RETENTION_DAYS", default=35),
+    )
+
+    scheduler = SchedulerConf(
+        enabled=env.bool("TASK_SCHEDULER_ENABLED", default=True),
+        horizon_days=env.int("TASK_HORIZON_DAYS", default=30),
+        interval=env.float("TASK_SCHEDULER_INTERVAL", default=300.0),
+        batch_size=env.int("TASK_SCHEDULER_BATCH_SIZE", default=1000),
+        max_occurrences=env.int("TASK_SCHEDULER_MAX_OCCURRENCES", default=500),
+        status_key=env("TASK_INITIAL_STATUS", default="planned"),
+        partitions_ahead=env.int("TASK_PROCESS_PARTITIONS_AHEAD", default=3),
+        retention_months=env.int("TASK_PROCESS_RETENTION_MONTHS", default=12),
+        archive_dir=env("TASK_PROCESS_ARCHIVE_DIR", default="archive"),
+        maintenance_interval=env.float("TASK_PROCESS_MAINTENANCE_INTERVAL", default=3600.0),
+    )
+    # Секции создаются с начала текущего месяца на `partitions_ahead` месяцев вперед,
+    # а в самом коротком случае (конец месяца) от сегодня покрыто не меньше 28 дней на месяц.
+    # Выполнение за последней секцией не вставится: вся пачка материализатора упадет
+    if scheduler.enabled and scheduler.horizon_days > PARTITION_MIN_DAYS * scheduler.partitions_ahead:
+        raise ValueError(
+            f"TASK_HORIZON_DAYS={scheduler.horizon_days} does not fit into "
+            f"TASK_PROCESS_PARTITIONS_AHEAD={scheduler.partitions_ahead} months of partitions: "
+            f"at most {PARTITION_MIN_DAYS} days per month ahead are guaranteed"
+        )
+
+    notifications = NotificationsConf(
+        workers=env.int("NOTIFY_WORKERS", default=4),
+        global_rate=env.float("NOTIFY_GLOBAL_RATE", default=25.0),
+        chat_rate=env.float("NOTIFY_CHAT_RATE", default=1.0),
+        chat_burst=env.int("NOTIFY_CHAT_BURST", default=1),
+        queue_size=env.int("NOTIFY_QUEUE_SIZE", default=10_000),
+        max_retries=env.int("NOTIFY_MAX_RETRIES", default=5),
+        flush_interval=env.float("NOTIFY_FLUSH_INTERVAL", default=5.0),
+        shutdown_timeout=env.float("NOTIFY_SHUTDOWN_TIMEOUT", default=30.0),
+        reminders_enabled=env.bool("NOTIFY_REMINDERS_ENABLED", default=True),
+        reminder_interval=env.float("NOTIFY_REMINDER_INTERVAL", default=60.0),
+        reminder_lookback=env.float("NOTIFY_REMINDER_LOOKBACK", default=3600.0),
+        reminder_batch_size=env.int("NOTIFY_REMINDER_BATCH_SIZE", default=500),
+    )
+
+    metrics = MetricsConf(
+        enabled=env.bool("METRICS_ENABLED", default=False),
+        host=env("METRICS_HOST", default="127.0.0.1"),
+        port=env.int("METRICS_PORT", default=9108),
+        path=env("METRICS_PATH", default="/metrics"),
+        ready_path=env("METRICS_READY_PATH", default="/ready"),
+    )
+
+    warmup = WarmupConf(
+        enabled=env.bool("WARMUP_ENABLED", default=True),
+        pool_size=env.int("WARMUP_POOL_SIZE", default=0),
+        profiles_limit=env.int("WARMUP_PROFILES_LIMIT", default=5000),
+        profiles_days=env.int("WARMUP_PROFILES_DAYS", default=7),
+    )
+
     logg_settings = LoggConf(
         level=env("LOG_LEVEL", default="DEBUG"),
-        format=env("LOG_FORMAT")
+        format=env("LOG_FORMAT"),
+        json=env.bool("LOG_JSON", default=False),
+        queue_size=env.int("LOG_QUEUE_SIZE", default=10_000),
+        queue_policy=env("LOG_QUEUE_POLICY", default="drop_new"),
+        sample_rates=env.dict("LOG_SAMPLE_RATES", subcast_values=float, default={}),
+        rate_limits=env.dict("LOG_RATE_LIMITS", subcast_values=float, default={}),
     )
 
     logger.info("Configuration loaded successfully")
 
     return Config(
         bot=bot,
+        webhook=webhook,
+        executor=executor,
         db=db,
         redis=redis,
+        fsm=fsm,
+        cache=cache,
+        statistics=statistics,
+        scheduler=scheduler,
+        notifications=notifications,
+        metrics=metrics,
+        warmup=warmup,
         log=logg_settings
     )
\ No newline at end of file
@@ -0,0 +1,47 @@
+EN: dict[str, str] = {
+    "/start": "Hi!\nI will help you set tasks and keep track of their completion. "
+            "You can add executors and ask others to assign tasks to you. "
+            "Shall we begin? Press 'Assign a task' to create your own task "
+            "or 'Add a customer' so that someone else can assign a task to you!",
+    "/help": "I help you set tasks and mark them as done.\n\n"
+             "/start - get started\n"
+             "/tasks - your tasks\n"
+             "/lang - interface language\n"
+             "/help - this help",
+    "/help_admin": "Admin commands:\n\n"
+                   "/ban <code>id</code> or <code>@username</code> - ban a user\n"
+                   "/unban <code>id</code> or <code>@username</code> - unban a user\n"
+                   "/statistics - activity statistics",
+    "/lang": "Choose the interface language:",
+    "/start_description": "Restart the bot",
+    "/lang_description": "Interface language",
+    "/help_description": "Help",
+    "/ban_description": "Ban a user",
+    "/unban_description": "Unban a user",
+    "/statistics_description": "Activity statistics",
+    "/tasks_description": "Task list",
+    "ru": "Русский",
+    "en": "English",
+    "cancel_lang_button_text": "Cancel",
+    "save_lang_button_text": "Save",
+    "lang_saved": "Interface language saved",
+    "lang_cancelled": "Changes cancelled, interface language: {}",
+    "no_echo": "I can't repeat this message",
+    "statistics": "<b>Most active users</b>:\n\n{}",
+    "statistics_active_users": "Unique active users:\n"
+                               "today - <b>{}</b>, last 7 days - <b>{}</b>, last 30 days - <b>{}</b>",
+    "empty_ban_answer": "Specify the user's id or @username: /ban <code>id</code>",
+    "empty_unban_answer": "Specify the user's id or @username: /unban <code>id</code>",
+    "incorrect_ban_arg": "A numeric id or @username is required",
+    "incorrect_unban_arg": "A numeric id or @username is required",
+    "no_user": "No such user",
+    "already_banned": "The user is already banned",
+    "not_banned": "The user is not banned",
+    "succesfully_banned": "The user has been banned",
+    "succesfully_unbanned": "The user has been unbanned",
+    "tasks_title": "<b>Your tasks</b>:",
+    "tasks_empty": "You have no tasks yet",
+    "tasks_prev_button": "« Back",
+    "tasks_next_button": "Next »",
+    "task_reminder": "⏰ Task reminder: <b>{}</b>\nDue: {}",
+}
@@ -6,4 +6,45 @@ RU: dict[str, str] = {
             "Начнем? Нажми на кнопку 'Назначить задачу' для создания своей задачи "
             "или 'Добавить заказачика' для того, чтобы другой мог назначить "
             "задачу тебе!",
-}
\ No newline at end of file
+    "/help": "Я помогаю ставить задачи и отмечать их выполнение.\n\n"
+             "/start - начать работу\n"
+             "/tasks - список ваших задач\n"
+             "/lang - язык интерфейса\n"
+             "/help - эта справка",
+    "/help_admin": "Команды администратора:\n\n"
+                   "/ban <code>id</code> или <code>@username</code> - заблокировать пользователя\n"
+                   "/unban <code>id</code> или <code>@username</code> - разблокировать пользователя\n"
+                   "/statistics - статистика активности",
+    "/lang": "Выберите язык интерфейса:",
+    "/start_description": "Перезапустить бота",
+    "/lang_description": "Язык интерфейса",
+    "/help_description": "Справка",
+    "/ban_description": "Заблокировать пользователя",
+    "/unban_description": "Разблокировать пользователя",
+    "/statistics_description": "Статистика активности",
+    "/tasks_description": "Список задач",
+    "ru": "Русский",
+    "en": "English",
+    "cancel_lang_button_text": "Отмена",
+    "save_lang_button_text": "Сохранить",
+    "lang_saved": "Язык интерфейса сохранен",
+    "lang_cancelled": "Изменения отменены, язык интерфейса: {}",
+    "no_echo": "Это сообщение я не могу повторить",
+    "statistics": "<b>Самые активные пользователи</b>:\n\n{}",
+    "empty_ban_answer": "Укажите id или @username пользователя: /ban <code>id</code>",
+    "empty_unban_answer": "Укажите id или @username пользователя: /unban <code>id</code>",
+    "incorrect_ban_arg": "Нужен числовой id или @username пользователя",
+    "incorrect_unban_arg": "Нужен числовой id или @username пользователя",
+    "no_user": "Такого пользователя нет",
+    "already_banned": "Пользователь уже заблокирован",
+    "not_banned": "Пользователь не заблокирован",
+    "succesfully_banned": "Пользователь заблокирован",
+    "succesfully_unbanned": "Пользователь разблокирован",
+    "tasks_title": "<b>Ваши задачи</b>:",
+    "tasks_empty": "У вас пока нет задач",
+    "tasks_prev_button": "« Назад",
+    "tasks_next_button": "Вперед »",
+    "task_reminder": "⏰ Напоминание о задаче <b>{}</b>\nСрок: {}",
+    "statistics_active_users": "Уникальных активных пользователей:\n"
+                               "сегодня - <b>{}</b>, за 7 дней - <b>{}</b>, за 30 дней - <b>{}</b>",
+}
@@ -1,16 +1,17 @@
 import asyncio
 import logging
-import os
-import sys
 
 from app.bot import main
-from config.config import Config, load_config
+from app.infrastructure.logging_pipeline import setup_logging
+from config_data.config import Config, load_config
 
 config: Config = load_config()
 
-logging.basicConfig(
-    level=logging.getLevelName(level=config.log.level),
-    format=config.log.format,
-)
+# Записи логов пишутся в stderr отдельным потоком, цикл событий только кладет их в очередь
+logging_pipeline = setup_logging(config.log)
 
-asyncio.run(main(config))
\ No newline at end of file
+try:
+    asyncio.run(main(config))
+finally:
+    logging.getLogger(__name__).info("Logging stats: %s", logging_pipeline.stats())
+    logging_pipeline.stop()
\ No newline at end of file
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import re
+from dataclasses import dataclass, field
+
+from psycopg import AsyncConnection, errors, sql
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки, чтобы две копии раннера не применяли миграции одновременно
+MIGRATIONS_LOCK_KEY = 8_135_002_013
+
+CONCURRENT_INDEX_RE = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)",
+    re.IGNORECASE,
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    '''
+    Версия схемы БД. Обычная миграция применяется одной транзакцией вместе
+    с записью в `schema_migrations`. Миграция с `concurrently=True` выполняет
+    каждый запрос отдельно вне транзакции - так строятся индексы
+    `CREATE INDEX CONCURRENTLY`, не блокирующие запись в таблицу
+    '''
+    version: int
+    name: str
+    statements: list[str] = field(default_factory=list)
+    concurrently: bool = False
+
+
+async def _ensure_migrations_table(connection: AsyncConnection) -> None:
+    await connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations(
+            version INT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        """
+    )
+
+
+async def _applied_versions(connection: AsyncConnection) -> set[int]:
+    cursor = await connection.execute("SELECT version FROM schema_migrations;")
+    return {row[0] for row in await cursor.fetchall()}
+
+
+async def _record(connection: AsyncConnection, migration: Migration) -> None:
+    await connection.execute(
+        "INSERT INTO schema_migrations(version, name) VALUES (%s, %s) ON CONFLICT DO NOTHING;",
+        (migration.version, migration.name),
+    )
+
+
+async def _drop_invalid_index(connection: AsyncConnection, index_name: str) -> None:
+    '''
+    Прерванный `CREATE INDEX CONCURRENTLY` оставляет невалидный индекс,
+    и `IF NOT EXISTS` при повторе его бы пропустил - удаляем такой индекс заранее
+    '''
+    cursor = await connection.execute(
+        """
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND NOT i.indisvalid;
+        """,
+        (index_name,),
+    )
+    if await cursor.fetchone():
+        logger.warning("Dropping invalid index %s left by an interrupted build", index_name)
+        await connection.execute(
+            sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {};").format(sql.Identifier(index_name))
+        )
+
+
+async def _apply_transactional(
+    connection: AsyncConnection,
+    migration: Migration,
+    lock_timeout: str,
+) -> None:
+    async with connection.transaction():
+        await connection.execute(
+            sql.SQL("SET LOCAL lock_timeout = {};").format(sql.Literal(lock_timeout))
+        )
+        for statement in migration.statements:
+            await connection.execute(statement)
+        await _record(connection, migration)
+
+
+async def _apply_concurrently(
+    connection: AsyncConnection,
+    migration: Migration,
+    lock_timeout: str,
+) -> None:
+    await connection.execute(
+        sql.SQL("SET lock_timeout = {};").format(sql.Literal(lock_timeout))
+    )
+    try:
+        for statement in migration.statements:
+            match = CONCURRENT_INDEX_RE.search(statement)
+            if match:
+                await _drop_invalid_index(connection, match.group(1))
+            await connection.execute(statement)
+        await _record(connection, migration)
+    finally:
+        await connection.execute("RESET lock_timeout;")
+
+
+async def apply_migrations(
+    connection: AsyncConnection,
+    migrations: list[Migration],
+    *,
+    lock_timeout: str = "5s",
+    attempts: int = 5,
+    retry_delay: float = 2.0,
+) -> list[int]:
+    '''
+    Применяет еще не примененные миграции по возрастанию версии.
+    Если запрос не дождался блокировки за `lock_timeout`, миграция повторяется
+    до `attempts` раз - так она не висит в очереди блокировок, задерживая запросы бота.
+    Возвращает список примененных версий
+    '''
+    await connection.set_autocommit(True)
+    await _ensure_migrations_table(connection)
+    await connection.execute("SELECT pg_advisory_lock(%s);", (MIGRATIONS_LOCK_KEY,))
+    try:
+        applied = await _applied_versions(connection)
+        done: list[int] = []
+        for migration in sorted(migrations, key=lambda m: m.version):
+            if migration.version in applied:
+                continue
+            apply = _apply_concurrently if migration.concurrently else _apply_transactional
+            for attempt in range(1, attempts + 1):
+                try:
+                    await apply(connection, migration, lock_timeout)
+                    break
+                except errors.LockNotAvailable:
+                    if attempt == attempts:
+                        raise
+                    logger.warning(
+                        "Migration %04d_%s hit lock_timeout, retrying (%d/%d)",
+                        migration.version, migration.name, attempt, attempts,
+                    )
+                    await asyncio.sleep(retry_delay * attempt)
+            logger.info("Migration %04d_%s applied", migration.version, migration.name)
+            done.append(migration.version)
+        return done
+    finally:
+        await connection.execute("SELECT pg_advisory_unlock(%s);", (MIGRATIONS_LOCK_KEY,))
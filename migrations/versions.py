@@ -0,0 +1,318 @@
+from migrations.runner import Migration
+
+MIGRATIONS: list[Migration] = [
+    Migration(
+        version=1,
+        name="initial_schema",
+        statements=[
+            """
+            CREATE TABLE IF NOT EXISTS users(
+                id SERIAL PRIMARY KEY,
+                user_id BIGINT NOT NULL UNIQUE,
+                username VARCHAR(50),
+                firstname VARCHAR(50) NOT NULL,
+                lastname VARCHAR(50) NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                language VARCHAR(10) NOT NULL,
+                role VARCHAR(10) NOT NULL DEFAULT 'user',
+                is_alive BOOLEAN NOT NULL DEFAULT True,
+                banned BOOLEAN NOT NULL DEFAULT False
+            );
+            COMMENT ON TABLE users IS 'Таблица с пользователями';
+            COMMENT ON COLUMN users.user_id IS 'id пользователя в телеграмме';
+            COMMENT ON COLUMN users.username IS 'ник пользователя в телеграмме';
+            COMMENT ON COLUMN users.firstname IS 'имя пользователя';
+            COMMENT ON COLUMN users.lastname IS 'фамилия пользователя';
+            COMMENT ON COLUMN users.language IS 'язык пользователя';
+            COMMENT ON COLUMN users.role IS 'роль пользователя в боте';
+            COMMENT ON COLUMN users.is_alive IS 'активен ли еще пользователь';
+            COMMENT ON COLUMN users.banned IS 'забанен пользователь или нет';
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS activity(
+                user_id BIGINT NOT NULL REFERENCES users(user_id),
+                activity_date DATE NOT NULL DEFAULT CURRENT_DATE,
+                actions INT NOT NULL DEFAULT 1,
+                PRIMARY KEY (user_id, activity_date)
+            );
+            COMMENT ON TABLE activity IS 'Таблица с дневной активностью пользователей';
+            COMMENT ON COLUMN activity.user_id IS 'id пользователя';
+            COMMENT ON COLUMN activity.activity_date IS 'день активности';
+            COMMENT ON COLUMN activity.actions IS 'число апдейтов от пользователя за день';
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS task_groups(
+                id SERIAL PRIMARY KEY,
+                name VARCHAR(50) NOT NULL,
+                is_active BOOLEAN NOT NULL DEFAULT True
+            );
+            COMMENT ON TABLE task_groups IS 'Таблица с группами под задачи';
+            COMMENT ON COLUMN task_groups.name IS 'наименование группы';
+            COMMENT ON COLUMN task_groups.is_active IS 'активна ли еще группа';
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS user_status_varieties(
+                id SERIAL PRIMARY KEY,
+                name VARCHAR(50) NOT NULL,
+                description TEXT
+            );
+            COMMENT ON TABLE user_status_varieties IS 'Справочник статусов пользователей';
+            COMMENT ON COLUMN user_status_varieties.name IS 'наименование статуса';
+            COMMENT ON COLUMN user_status_varieties.description IS 'подробное описание статуса';
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS user_group(
+                id SERIAL PRIMARY KEY,
+                user_id BIGINT NOT NULL REFERENCES users(user_id),
+                task_group_id INT NOT NULL REFERENCES task_groups(id),
+                user_status_id INT NOT NULL REFERENCES user_status_varieties(id)
+            );
+            COMMENT ON TABLE user_group IS 'Таблица для связки пользователей с группами';
+            COMMENT ON COLUMN user_group.user_id IS 'id пользователя';
+            COMMENT ON COLUMN user_group.task_group_id IS 'id группы';
+            COMMENT ON COLUMN user_group.user_status_id IS 'статус участника группы';
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS task_frequency_varieties(
+                id SERIAL PRIMARY KEY,
+                key VARCHAR(50) NOT NULL UNIQUE,
+                description VARCHAR(50),
+                period INTERVAL
+            );
+            COMMENT ON TABLE task_frequency_varieties IS 'Справочник частотностей задач';
+            COMMENT ON COLUMN task_frequency_varieties.key IS 'код частотности выполнения задачи';
+            COMMENT ON COLUMN task_frequency_varieties.description IS 'описание частотности';
+            COMMENT ON COLUMN task_frequency_varieties.period IS 'шаг повторения задачи, NULL - разовая задача';
+            INSERT INTO task_frequency_varieties(key, period) VALUES
+                ('once', NULL),
+                ('daily', INTERVAL '1 day'),
+                ('weekly', INTERVAL '1 week'),
+                ('monthly', INTERVAL '1 month')
+            ON CONFLICT (key) DO NOTHING;
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS tasks(
+                id SERIAL PRIMARY KEY,
+                name VARCHAR(50) NOT NULL,
+                description TEXT,
+                creator_id BIGINT NOT NULL REFERENCES users(user_id),
+                executor_id BIGINT NOT NULL REFERENCES users(user_id),
+                frequency_id INT NOT NULL REFERENCES task_frequency_varieties(id),
+                created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                is_active BOOLEAN NOT NULL DEFAULT True,
+                starts_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                next_occurrence INT NOT NULL DEFAULT 0,
+                next_execute TIMESTAMPTZ DEFAULT NOW()
+            );
+            COMMENT ON TABLE tasks IS 'Таблица с задачами';
+            COMMENT ON COLUMN tasks.name IS 'наименование задачи';
+            COMMENT ON COLUMN tasks.description IS 'подробное описание задачи';
+            COMMENT ON COLUMN tasks.creator_id IS 'Создатель задачи';
+            COMMENT ON COLUMN tasks.executor_id IS 'Исполнитель задачи';
+            COMMENT ON COLUMN tasks.frequency_id IS 'Частотность задачи';
+            COMMENT ON COLUMN tasks.created_at IS 'Дата создания задачи';
+            COMMENT ON COLUMN tasks.is_active IS 'Нужно ли еще планировать выполнения задачи';
+            COMMENT ON COLUMN tasks.starts_at IS 'Первое выполнение задачи, от него отсчитываются повторы';
+            COMMENT ON COLUMN tasks.next_occurrence IS 'Номер следующего еще не созданного выполнения';
+            COMMENT ON COLUMN tasks.next_execute IS 'Дата следующего еще не созданного выполнения, при создании задачи равна starts_at';
+            CREATE INDEX IF NOT EXISTS tasks_next_execute_idx ON tasks(next_execute) WHERE is_active;
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS task_status_varieties(
+                id SERIAL PRIMARY KEY,
+                key VARCHAR(50) NOT NULL UNIQUE,
+                name VARCHAR(50) NOT NULL,
+                description VARCHAR(250)
+            );
+            COMMENT ON TABLE task_status_varieties IS 'Справочник статусов задач';
+            COMMENT ON COLUMN task_status_varieties.key IS 'код статуса выполнения задачи';
+            COMMENT ON COLUMN task_status_varieties.name IS 'наименование статуса выполнения задачи';
+            COMMENT ON COLUMN task_status_varieties.description IS 'описание статуса';
+            INSERT INTO task_status_varieties(key, name) VALUES ('planned', 'Запланирована')
+            ON CONFLICT (key) DO NOTHING;
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS task_process(
+                id SERIAL PRIMARY KEY,
+                date_execute TIMESTAMPTZ NOT NULL,
+                task_id BIGINT NOT NULL REFERENCES tasks(id),
+                task_status_id INT NOT NULL REFERENCES task_status_varieties(id),
+                UNIQUE (task_id, date_execute)
+            );
+            COMMENT ON TABLE task_process IS 'Таблица со статусами по поставленным задачам';
+            COMMENT ON COLUMN task_process.date_execute IS 'Дата, когда нужно выполнить задачу';
+            COMMENT ON COLUMN task_process.task_id IS 'Задача к выполнению';
+            COMMENT ON COLUMN task_process.task_status_id IS 'Статус выполнения задачи';
+            """,
+        ],
+    ),
+    # Индексы под фильтры запросов бота. Строятся без блокировки записи,
+    # поэтому миграцию можно применять на работающей базе
+    Migration(
+        version=2,
+        name="query_indexes",
+        concurrently=True,
+        statements=[
+            # Выборка выполнений на дату и по статусу
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS task_process_date_execute_status_idx
+            ON task_process(date_execute, task_status_id);
+            """,
+            # Задачи исполнителя и задачи, поставленные пользователем
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS tasks_executor_id_idx
+            ON tasks(executor_id);
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS tasks_creator_id_idx
+            ON tasks(creator_id);
+            """,
+            # Участники группы и группы пользователя
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS user_group_task_group_id_user_id_idx
+            ON user_group(task_group_id, user_id);
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS user_group_user_id_idx
+            ON user_group(user_id);
+            """,
+            # /ban и /unban по @username
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS users_username_idx
+            ON users(username);
+            """,
+        ],
+    ),
+    # task_process растет на каждое выполнение каждой задачи, поэтому делится
+    # на месячные секции по date_execute: запросы с диапазоном дат читают только
+    # нужные секции, а старые секции целиком уходят в архив (см. partitions.py)
+    Migration(
+        version=3,
+        name="partition_task_process",
+        statements=[
+            """
+            CREATE TABLE task_process_partitioned(
+                id BIGINT NOT NULL DEFAULT nextval('task_process_id_seq'),
+                date_execute TIMESTAMPTZ NOT NULL,
+                task_id BIGINT NOT NULL REFERENCES tasks(id),
+                task_status_id INT NOT NULL REFERENCES task_status_varieties(id),
+                CONSTRAINT task_process_part_pkey PRIMARY KEY (id, date_execute),
+                CONSTRAINT task_process_part_task_id_date_execute_key UNIQUE (task_id, date_execute)
+            ) PARTITION BY RANGE (date_execute);
+            """,
+            # Секции под уже накопленные строки и на три месяца вперед
+            """
+            DO $$
+            DECLARE
+                month_start TIMESTAMPTZ;
+                last_month TIMESTAMPTZ;
+            BEGIN
+                SELECT date_trunc('month', COALESCE(MIN(date_execute), NOW()) AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+                INTO month_start FROM task_process;
+                SELECT date_trunc('month', GREATEST(COALESCE(MAX(date_execute), NOW()), NOW() + INTERVAL '3 months') AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+                INTO last_month FROM task_process;
+                WHILE month_start <= last_month LOOP
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF task_process_partitioned FOR VALUES FROM (%L) TO (%L)',
+                        'task_process_' || to_char(month_start AT TIME ZONE 'UTC', '"y"YYYY"m"MM'),
+                        month_start,
+                        month_start + INTERVAL '1 month'
+                    );
+                    month_start := month_start + INTERVAL '1 month';
+                END LOOP;
+            END $$;
+            """,
+            """
+            INSERT INTO task_process_partitioned(id, date_execute, task_id, task_status_id)
+            SELECT id, date_execute, task_id, task_status_id FROM task_process;
+            ALTER SEQUENCE task_process_id_seq AS BIGINT OWNED BY NONE;
+            DROP TABLE task_process;
+            ALTER TABLE task_process_partitioned RENAME TO task_process;
+            ALTER SEQUENCE task_process_id_seq OWNED BY task_process.id;
+            ALTER TABLE task_process RENAME CONSTRAINT task_process_part_pkey TO task_process_pkey;
+            ALTER TABLE task_process RENAME CONSTRAINT task_process_part_task_id_date_execute_key
+                TO task_process_task_id_date_execute_key;
+            CREATE INDEX task_process_date_execute_status_idx ON task_process(date_execute, task_status_id);
+            COMMENT ON TABLE task_process IS 'Таблица со статусами по поставленным задачам, секции по месяцам date_execute';
+            COMMENT ON COLUMN task_process.date_execute IS 'Дата, когда нужно выполнить задачу';
+            COMMENT ON COLUMN task_process.task_id IS 'Задача к выполнению';
+            COMMENT ON COLUMN task_process.task_status_id IS 'Статус выполнения задачи';
+            """,
+        ],
+    ),
+    Migration(
+        version=4,
+        name="tasks_group",
+        statements=[
+            """
+            ALTER TABLE tasks ADD COLUMN IF NOT EXISTS task_group_id INT REFERENCES task_groups(id);
+            COMMENT ON COLUMN tasks.task_group_id IS 'Группа, в которой поставлена задача';
+            """,
+        ],
+    ),
+    # Списки задач листаются по ключу (created_at, id): индекс с фильтром
+    # по владельцу впереди отдает любую страницу одним коротким сканированием.
+    # Прежние индексы только по creator_id/executor_id ими покрываются
+    Migration(
+        version=5,
+        name="tasks_keyset_indexes",
+        concurrently=True,
+        statements=[
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS tasks_creator_id_created_at_id_idx
+            ON tasks(creator_id, created_at, id);
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS tasks_executor_id_created_at_id_idx
+            ON tasks(executor_id, created_at, id);
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS tasks_task_group_id_created_at_id_idx
+            ON tasks(task_group_id, created_at, id) WHERE task_group_id IS NOT NULL;
+            """,
+            "DROP INDEX CONCURRENTLY IF EXISTS tasks_creator_id_idx;",
+            "DROP INDEX CONCURRENTLY IF EXISTS tasks_executor_id_idx;",
+        ],
+    ),
+    # Итоги активности для /statistics: пополняются тем же запросом, что пишет `activity`,
+    # и отдают топ пользователей по индексу, не агрегируя всю историю.
+    # Блокировка на время заполнения не дает потерять начисления, сделанные параллельно
+    Migration(
+        version=6,
+        name="activity_totals",
+        statements=[
+            """
+            CREATE TABLE IF NOT EXISTS activity_totals(
+                user_id BIGINT PRIMARY KEY REFERENCES users(user_id),
+                total_actions BIGINT NOT NULL DEFAULT 0
+            );
+            COMMENT ON TABLE activity_totals IS 'Суммарная активность пользователей за все время';
+            COMMENT ON COLUMN activity_totals.user_id IS 'id пользователя';
+            COMMENT ON COLUMN activity_totals.total_actions IS 'всего действий пользователя';
+            CREATE INDEX IF NOT EXISTS activity_totals_total_actions_idx
+            ON activity_totals(total_actions DESC, user_id);
+            """,
+            """
+            LOCK TABLE activity IN SHARE MODE;
+            INSERT INTO activity_totals(user_id, total_actions)
+            SELECT user_id, SUM(actions)
+            FROM activity
+            GROUP BY user_id
+            ON CONFLICT (user_id) DO NOTHING;
+            """,
+        ],
+    ),
+    # Напоминание о выполнении отправляется один раз: отправленные выполнения
+    # переводятся в этот статус в той же транзакции, в которой выбираются
+    Migration(
+        version=7,
+        name="task_reminders",
+        statements=[
+            """
+            INSERT INTO task_status_varieties(key, name, description)
+            VALUES ('notified', 'Напоминание отправлено', 'Исполнителю отправлено напоминание о задаче')
+            ON CONFLICT (key) DO NOTHING;
+            """,
+        ],
+    ),
+]
@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import logging
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from app.bot.keyboards.memo import KeyboardCache
+from app.bot.menus import ChatMenus
+from app.i18n.translator import get_translations
+from app.infrastructure.cache.profiles import user_profile_cache
+from app.infrastructure.database.connection import get_pg_connection
+from app.infrastructure.logging_pipeline import setup_logging
+from config_data.config import Config, load_config
+from psycopg import AsyncConnection, Error
+from redis.asyncio import Redis
+
+config: Config = load_config()
+
+logging_pipeline = setup_logging(config.log)
+logger = logging.getLogger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Пересылает меню команд в чаты всех активных пользователей"
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=config.notifications.global_rate,
+        help="максимум запросов set_my_commands в секунду",
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="отправить меню и в чаты с актуальным отпечатком",
+    )
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace):
+    redis = Redis(
+        host=config.redis.host,
+        port=config.redis.port,
+        db=config.redis.db,
+        password=config.redis.password,
+        username=config.redis.username,
+    )
+    # Профили здесь не кэшируются, но инвалидации после пометки
+    # заблокировавших бота пользователей должны дойти до запущенных копий бота
+    user_profile_cache.configure(maxsize=0, ttl=0, redis=redis)
+
+    session = None
+    if config.bot.api_url:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.bot.api_url))
+    bot = Bot(token=config.bot.token, session=session)
+
+    menus = ChatMenus(
+        KeyboardCache(get_translations()),
+        redis=redis,
+        ttl=config.cache.menu_fingerprint_ttl,
+    )
+    connection: AsyncConnection | None = None
+
+    try:
+        connection = await get_pg_connection(
+            db_name=config.db.name,
+            host=config.db.host,
+            port=config.db.port,
+            user=config.db.username,
+            password=config.db.password,
+        )
+        await connection.set_autocommit(True)
+        stats = await menus.resync_all(
+            bot,
+            connection,
+            rate=args.rate,
+            batch_size=args.batch_size,
+            force=args.force,
+        )
+        logger.info("Menu resync finished: %s", stats)
+    except Error as db_error:
+        logger.exception("Database error: %s", db_error)
+    except Exception as e:
+        logger.exception("Unhandled error: %s", e)
+    finally:
+        if connection:
+            await connection.close()
+            logger.info("Connection to Postgres closed")
+        await bot.session.close()
+        await redis.aclose()
+
+
+try:
+    asyncio.run(main(parse_args()))
+finally:
+    logging_pipeline.stop()